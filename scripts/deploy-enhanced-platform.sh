@@ -94,7 +94,7 @@ EOF
 )
 
 echo "📦 Building and deploying LLM Inference Service..."
-docker build -t llm-inference:latest services/llm-inference/
+docker build -t llm-inference:latest -f services/llm-inference/Dockerfile services/
 kubectl apply -f k8s/llm-inference-deployment.yml
 
 echo "📦 Building and deploying LlamaIndex Service..."
@@ -24,6 +24,9 @@ get_metrics() {
     
     # Get average CPU/GPU usage (simplified)
     echo "Current replicas: $REPLICAS"
+
+    # Ready pods llm-inference routes to (see GET /metrics/routing for per-replica load)
+    kubectl get endpoints llama3-70b-replicas -n $NAMESPACE -o jsonpath='{range .subsets[*].addresses[*]}{.ip}{"\n"}{end}'
     
     # Check if we need to scale based on pending requests or load
     # This is a simplified version - in production, use metrics from Prometheus
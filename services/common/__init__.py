@@ -0,0 +1 @@
+"""Helpers shared by the Python services; each image copies this package next to its app.py."""
@@ -0,0 +1,135 @@
+"""
+Request hedging shared by the services that race duplicate calls.
+
+If a call has not answered within a percentile of recent latencies, send one
+duplicate and take whichever answers first; the loser is cancelled. Every
+primary call earns `ratio` of a hedge token from a shared budget, so hedges
+stay within that share of extra load.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+
+class HedgeSettings:
+    """Hedge tuning for one service. Hedgers hold a reference, so changes apply to all of them."""
+
+    def __init__(self, enabled: bool, percentile: float, window: int, min_samples: int, min_delay_ms: float):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay_ms = min_delay_ms
+
+
+class HedgeBudget:
+    """Token bucket shared by every hedger: each primary call deposits `ratio`, each hedge spends 1."""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self, amount: Optional[float] = None):
+        self.tokens = min(self.burst, self.tokens + (self.ratio if amount is None else amount))
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Hedger:
+    """Hedges one kind of call using a percentile of its own recent latencies as the delay."""
+
+    def __init__(self, name: str, budget: HedgeBudget, settings: HedgeSettings):
+        self.name = name
+        self.budget = budget
+        self.settings = settings
+        self._latencies: List[float] = []
+        self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "budget_exhausted": 0, "no_hedge_target": 0, "latency_saved_ms": 0.0}
+
+    def delay_ms(self) -> Optional[float]:
+        if len(self._latencies) < self.settings.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.settings.percentile / 100))
+        return max(self.settings.min_delay_ms, ordered[index])
+
+    def _observe(self, latency_ms: float):
+        self._latencies.append(latency_ms)
+        if len(self._latencies) > self.settings.window:
+            del self._latencies[:len(self._latencies) - self.settings.window]
+
+    def _estimate_saved(self, elapsed_ms: float) -> float:
+        # The primary was cancelled, so estimate its latency as the mean of past calls slower than `elapsed_ms`
+        slower = [latency for latency in self._latencies if latency > elapsed_ms]
+        return sum(slower) / len(slower) - elapsed_ms if slower else 0.0
+
+    async def run(self, primary, hedge=None):
+        """
+        Await `primary()`. After the hedge delay, call `hedge()` for a duplicate
+        (it may raise if there is nowhere to send one) and return the first success.
+        """
+        self._stats["requests"] += 1
+        self.budget.deposit()
+        start = time.perf_counter()
+        delay = self.delay_ms() if self.settings.enabled and hedge is not None else None
+        primary_task = asyncio.ensure_future(primary())
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary_task}, timeout=delay / 1000)
+                if not done:
+                    if not self.budget.withdraw():
+                        self._stats["budget_exhausted"] += 1
+                    else:
+                        try:
+                            hedge_call = hedge()
+                        except Exception:
+                            self.budget.deposit(1.0)
+                            self._stats["no_hedge_target"] += 1
+                        else:
+                            return await self._race(primary_task, hedge_call, start)
+            result = await primary_task
+        except asyncio.CancelledError:
+            primary_task.cancel()
+            raise
+        self._observe((time.perf_counter() - start) * 1000)
+        return result
+
+    async def _race(self, primary_task: asyncio.Future, hedge_call, start: float):
+        self._stats["hedged"] += 1
+        hedge_task = asyncio.ensure_future(hedge_call)
+        pending = {primary_task, hedge_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    if task is hedge_task:
+                        self._stats["hedge_wins"] += 1
+                        self._stats["latency_saved_ms"] += self._estimate_saved(elapsed_ms)
+                    self._observe(elapsed_ms)
+                    return task.result()
+            # Both failed: surface the primary's error
+            return primary_task.result()
+        finally:
+            for task in (primary_task, hedge_task):
+                if not task.done():
+                    task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        requests, hedged = self._stats["requests"], self._stats["hedged"]
+        delay = self.delay_ms()
+        return {
+            **self._stats,
+            "latency_saved_ms": round(self._stats["latency_saved_ms"], 1),
+            "hedge_rate": round(hedged / requests, 4) if requests else 0.0,
+            "hedge_win_rate": round(self._stats["hedge_wins"] / hedged, 4) if hedged else 0.0,
+            "delay_ms": round(delay, 1) if delay is not None else None,
+            "samples": len(self._latencies),
+        }
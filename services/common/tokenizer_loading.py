@@ -0,0 +1,41 @@
+"""
+Tokenizer loading shared by the services that count tokens locally.
+
+Exact counts need the `tokenizers` package and the model's tokenizer: a local
+tokenizer.json, or a Hugging Face download (the Llama 3 repos are gated and need
+HF_TOKEN). Callers fall back to estimates when loading fails.
+"""
+
+import os
+from typing import Optional, Tuple
+
+try:
+    from tokenizers import Tokenizer  # type: ignore
+    TOKENIZERS_AVAILABLE = True
+except ModuleNotFoundError:
+    Tokenizer = None
+    TOKENIZERS_AVAILABLE = False
+
+HF_TOKEN = os.getenv("HF_TOKEN") or os.getenv("HUGGING_FACE_HUB_TOKEN")
+
+
+def load_tokenizer(name: Optional[str]) -> Tuple[Optional["Tokenizer"], Optional[str]]:
+    """
+    Load a tokenizer from a tokenizer.json path or a Hugging Face model id.
+    Returns (tokenizer, None), or (None, reason) when it cannot be loaded.
+    Blocking (file or network IO).
+    """
+    if not name:
+        return None, "no tokenizer is configured"
+    if not TOKENIZERS_AVAILABLE:
+        return None, "the `tokenizers` package is not installed"
+    try:
+        if os.path.isfile(name):
+            return Tokenizer.from_file(name), None
+        # revision, auth token: positional, the keyword was renamed after tokenizers 0.15
+        return Tokenizer.from_pretrained(name, "main", HF_TOKEN), None
+    except Exception as e:
+        reason = f"loading {name} failed: {e}"
+        if not os.path.isfile(name) and not HF_TOKEN:
+            reason += " (gated Hugging Face repos need HF_TOKEN)"
+        return None, reason
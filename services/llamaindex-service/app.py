@@ -1,26 +1,71 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from starlette.datastructures import UploadFile
+from typing import TYPE_CHECKING, Any, Iterator, List, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import hashlib
+import json
+import math
 import os
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Document
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.vector_stores.weaviate import WeaviateVectorStore
-import chromadb
-import weaviate
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
 
-app = FastAPI(title="LlamaIndex RAG Service", version="1.0.0")
+# Cold-start timings, reported by /health
+COLD_START: Dict[str, Any] = {"import_started": time.perf_counter()}
+
+# llama-index, the vector-store clients and their integrations are imported on first
+# use (or by the startup warm-up) so the server can bind its port without them
+if TYPE_CHECKING:
+    from llama_index.core import VectorStoreIndex, Document
+    from llama_index.core.node_parser import SentenceSplitter
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    COLD_START["startup_ms"] = round((time.perf_counter() - COLD_START["import_started"]) * 1000, 2)
+    warmup = None
+    if WARM_VECTOR_STORES:
+        # Connect required stores in the background so the port opens immediately
+        warmup = asyncio.create_task(asyncio.to_thread(warm_vector_stores))
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+
+app = FastAPI(title="LlamaIndex RAG Service", version="1.0.0", lifespan=lifespan)
 
 class IngestRequest(BaseModel):
     documents: List[Dict[str, str]]  # [{"id": "...", "content": "..."}]
     namespace: str = "default"
     collection: str = "documents"
+    store: str = "chromadb"
+    sync: bool = False  # Treat the request as the full corpus and remove missing documents
 
 class SearchRequest(BaseModel):
     query: str
     namespace: str = "default"
     top_k: int = 5
     collection: str = "documents"
+    mode: str = "vector"  # vector | sparse | hybrid
+    vector_weight: float = 1.0
+    sparse_weight: float = 1.0
+    rrf_k: int = 60
+    store: str = "chromadb"
+    stores: Optional[List[str]] = None  # Federated search across several stores
+    store_timeout_ms: Optional[int] = None
+
+class NamespaceRequest(BaseModel):
+    namespace: str
+    collection: str = "documents"
 
 class SearchResult(BaseModel):
     id: str
@@ -29,26 +74,122 @@ class SearchResult(BaseModel):
     metadata: Dict
 
 # Vector store configurations
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
+WEAVIATE_POOL_CONNECTIONS = int(os.getenv("WEAVIATE_POOL_CONNECTIONS", "10"))
+WEAVIATE_POOL_MAXSIZE = int(os.getenv("WEAVIATE_POOL_MAXSIZE", "50"))
+WEAVIATE_STARTUP_PERIOD = int(os.getenv("WEAVIATE_STARTUP_PERIOD", "2"))
+VECTOR_STORE_RETRY_INTERVAL = float(os.getenv("VECTOR_STORE_RETRY_INTERVAL", "10"))
+REQUIRED_VECTOR_STORES = [name for name in os.getenv("REQUIRED_VECTOR_STORES", "chromadb").split(",") if name]
+WARM_VECTOR_STORES = os.getenv("WARM_VECTOR_STORES", "true").lower() == "true"
+
+def _create_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+def _create_weaviate_client():
+    import weaviate
+    from weaviate.config import Config, ConnectionConfig
+    return weaviate.Client(
+        WEAVIATE_URL,
+        startup_period=WEAVIATE_STARTUP_PERIOD,
+        additional_config=Config(connection_config=ConnectionConfig(
+            session_pool_connections=WEAVIATE_POOL_CONNECTIONS,
+            session_pool_maxsize=WEAVIATE_POOL_MAXSIZE
+        ))
+    )
+
+class LazyStoreClient:
+    """
+    Process-wide vector-store client created on first use. Creation happens once
+    under a lock; a failed attempt is remembered for VECTOR_STORE_RETRY_INTERVAL
+    seconds so callers fail fast with 503 instead of each waiting on a dead store.
+    Coroutines use aget(), which connects in a worker thread so the event loop
+    keeps serving while a store is slow to answer.
+    """
+
+    def __init__(self, name: str, factory, store_kind: str):
+        self.name = name
+        self.type = store_kind
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+        self._error: Optional[str] = None
+        self._failed_at = 0.0
+        self._init_ms: Optional[float] = None
+
+    def get(self):
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            if self._error and time.monotonic() - self._failed_at < VECTOR_STORE_RETRY_INTERVAL:
+                raise HTTPException(status_code=503, detail=f"Vector store {self.name} unavailable: {self._error}")
+            started = time.perf_counter()
+            try:
+                self._client = self._factory()
+            except Exception as e:
+                self._error = str(e) or type(e).__name__
+                self._failed_at = time.monotonic()
+                raise HTTPException(status_code=503, detail=f"Vector store {self.name} unavailable: {self._error}")
+            self._error = None
+            self._init_ms = round((time.perf_counter() - started) * 1000, 2)
+            return self._client
+
+    async def aget(self):
+        """get() for coroutines: one waiting coroutine at a time runs the connect in a worker thread."""
+        client = self._client
+        if client is not None:
+            return client
+        async with self._async_lock:
+            return await asyncio.to_thread(self.get)
+
+    def status(self) -> Dict[str, Any]:
+        if self._client is not None:
+            state = "ready"
+        elif self._error:
+            state = "unavailable"
+        else:
+            state = "not_initialized"
+        return {
+            "status": state,
+            "type": self.type,
+            "required": self.name in REQUIRED_VECTOR_STORES,
+            "init_ms": self._init_ms,
+            "error": self._error
+        }
+
 VECTOR_STORES = {
-    "chromadb": {
-        "client": chromadb.PersistentClient(path="./chroma_db"),
-        "type": "chroma"
-    },
-    "weaviate": {
-        "client": weaviate.Client(os.getenv("WEAVIATE_URL", "http://localhost:8080")),
-        "type": "weaviate"
-    }
+    "chromadb": LazyStoreClient("chromadb", _create_chroma_client, "chroma"),
+    "weaviate": LazyStoreClient("weaviate", _create_weaviate_client, "weaviate")
 }
 
+def warm_vector_stores():
+    """Load llama-index and connect the required stores ahead of the first request."""
+    started = time.perf_counter()
+    import llama_index.core  # noqa: F401
+    for name in REQUIRED_VECTOR_STORES:
+        if name in VECTOR_STORES:
+            try:
+                VECTOR_STORES[name].get()
+            except HTTPException:
+                pass
+    COLD_START["warmup_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
 def get_vector_store(store_type: str = "chromadb", collection_name: str = "documents"):
     """Get vector store instance"""
     if store_type == "chromadb":
-        chroma_client = VECTOR_STORES["chromadb"]["client"]
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+        chroma_client = VECTOR_STORES["chromadb"].get()
         chroma_collection = chroma_client.get_or_create_collection(collection_name)
         return ChromaVectorStore(chroma_collection=chroma_collection)
     
     elif store_type == "weaviate":
-        weaviate_client = VECTOR_STORES["weaviate"]["client"]
+        from llama_index.vector_stores.weaviate import WeaviateVectorStore
+        weaviate_client = VECTOR_STORES["weaviate"].get()
         return WeaviateVectorStore(
             weaviate_client=weaviate_client,
             index_name=collection_name.title()
@@ -57,11 +198,881 @@ def get_vector_store(store_type: str = "chromadb", collection_name: str = "docum
     else:
         raise ValueError(f"Unsupported vector store: {store_type}")
 
+def check_store(store_type: str) -> str:
+    if store_type not in VECTOR_STORES:
+        raise HTTPException(status_code=400, detail=f"Unsupported vector store: {store_type}")
+    return store_type
+
+# Namespace partitions
+# Lowercase only: Weaviate title-cases class names, so "Acme" and "acme" would share a class
+NAMESPACE_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+# Partitions are named "<collection><separator><namespace>". The separator is rejected in
+# collection and namespace names, and namespaces cannot start with "-" or "_", so the last
+# separator in a name is always the one between collection and namespace.
+PARTITION_SEPARATORS = {"chromadb": "--", "weaviate": "__"}
+# Weaviate class names allow only letters, digits and "_": escape the namespace's "_" and "-"
+WEAVIATE_NAMESPACE_ESCAPES = {"_": "_u", "-": "_h"}
+WEAVIATE_NAMESPACE_UNESCAPES = {code[1]: char for char, code in WEAVIATE_NAMESPACE_ESCAPES.items()}
+
+def _valid_namespace(namespace: str) -> bool:
+    return (bool(NAMESPACE_PATTERN.match(namespace))
+            and not any(separator in namespace for separator in PARTITION_SEPARATORS.values()))
+
+def partition_name(store_type: str, collection: str, namespace: str) -> str:
+    """
+    Physical partition holding one namespace of a logical collection: a Chroma
+    collection "<collection>--<namespace>" or a Weaviate class "<Collection>__<Namespace>"
+    with the namespace's "_" and "-" escaped as "_u" and "_h". The "default" namespace
+    maps to the bare collection.
+    """
+    if not _valid_namespace(namespace):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid namespace: {namespace} (lowercase letters, digits, '-' and '_'; no '--' or '__')"
+        )
+    separator = PARTITION_SEPARATORS.get(store_type)
+    if separator and separator in collection:
+        raise HTTPException(status_code=400, detail=f"Invalid collection: {collection} (may not contain '{separator}')")
+    if namespace == "default":
+        return collection
+    if store_type == "weaviate":
+        encoded = "".join(WEAVIATE_NAMESPACE_ESCAPES.get(char, char) for char in namespace)
+        return f"{collection}{separator}{encoded}"
+    return f"{collection}{separator}{namespace}"
+
+def _partition_namespace(store_type: str, collection: str, name: str) -> Optional[str]:
+    """Namespace held by a store collection or class, or None if it is not a partition of collection."""
+    base = collection.title() if store_type == "weaviate" else collection
+    if name == base:
+        return "default"
+    head, separator, tail = name.rpartition(PARTITION_SEPARATORS[store_type])
+    if not separator or head != base:
+        return None
+    namespace = tail
+    if store_type == "weaviate":
+        namespace = re.sub(r"_(.)", lambda m: WEAVIATE_NAMESPACE_UNESCAPES.get(m.group(1), "/"), tail.lower())
+    if namespace == "default" or not _valid_namespace(namespace):
+        return None
+    partition = partition_name(store_type, collection, namespace)
+    return namespace if (partition.title() if store_type == "weaviate" else partition) == name else None
+
+def list_partitions(store_type: str, collection: str) -> List[Dict]:
+    """List the namespace partitions that exist for a collection."""
+    partition_name(store_type, collection, "default")  # rejects collection names containing the separator
+    if store_type == "chromadb":
+        names = [getattr(col, "name", col) for col in VECTOR_STORES["chromadb"].get().list_collections()]
+    elif store_type == "weaviate":
+        names = [cls["class"] for cls in VECTOR_STORES["weaviate"].get().schema.get().get("classes", [])]
+    else:
+        raise ValueError(f"Unsupported vector store: {store_type}")
+    partitions = []
+    for name in names:
+        namespace = _partition_namespace(store_type, collection, name)
+        if namespace is not None:
+            partitions.append({"namespace": namespace, "partition": name})
+    return partitions
+
+def drop_partition(store_type: str, partition: str) -> bool:
+    """Delete a partition and everything in it. Returns False if it did not exist."""
+    try:
+        if store_type == "chromadb":
+            VECTOR_STORES["chromadb"].get().delete_collection(partition)
+        elif store_type == "weaviate":
+            VECTOR_STORES["weaviate"].get().schema.delete_class(partition.title())
+        else:
+            raise ValueError(f"Unsupported vector store: {store_type}")
+    except (ValueError, HTTPException):
+        raise
+    except Exception:
+        return False
+    sparse_index.drop(store_type, partition)
+    return True
+
+NAMESPACE_MIGRATION_BATCH = int(os.getenv("NAMESPACE_MIGRATION_BATCH", "500"))
+
+def _legacy_chroma_page(collection: str, offset: int) -> List[Dict]:
+    client = VECTOR_STORES["chromadb"].get()
+    if collection not in [getattr(col, "name", col) for col in client.list_collections()]:
+        return []
+    page = client.get_collection(collection).get(
+        where={"namespace": {"$ne": "default"}}, limit=NAMESPACE_MIGRATION_BATCH, offset=offset,
+        include=["embeddings", "documents", "metadatas"]
+    )
+    return [
+        {"id": row_id, "namespace": metadata.get("namespace"), "text": document, "metadata": metadata,
+         "embedding": list(embedding)}
+        for row_id, embedding, document, metadata in zip(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+    ]
+
+def _move_chroma_rows(collection: str, partition: str, rows: List[Dict]):
+    client = VECTOR_STORES["chromadb"].get()
+    client.get_or_create_collection(partition).upsert(
+        ids=[row["id"] for row in rows],
+        embeddings=[row["embedding"] for row in rows],
+        documents=[row["text"] for row in rows],
+        metadatas=[row["metadata"] for row in rows]
+    )
+    client.get_collection(collection).delete(ids=[row["id"] for row in rows])
+
+def _legacy_weaviate_page(collection: str, offset: int) -> List[Dict]:
+    client = VECTOR_STORES["weaviate"].get()
+    source = collection.title()
+    if not client.schema.exists(source):
+        return []
+    properties = [prop["name"] for prop in client.schema.get(source).get("properties", [])]
+    result = (
+        client.query.get(source, properties)
+        .with_where({"path": ["namespace"], "operator": "NotEqual", "valueText": "default"})
+        .with_additional(["id", "vector"])
+        .with_limit(NAMESPACE_MIGRATION_BATCH)
+        .with_offset(offset)
+        .do()
+    )
+    rows = []
+    for obj in result["data"]["Get"][source]:
+        additional = obj.pop("_additional")
+        rows.append({"id": additional["id"], "namespace": obj.get("namespace"), "text": obj.get("text", ""),
+                     "metadata": obj, "embedding": additional["vector"]})
+    return rows
+
+def _move_weaviate_rows(collection: str, partition: str, rows: List[Dict]):
+    client = VECTOR_STORES["weaviate"].get()
+    index_registry.get_vector_store("weaviate", partition)  # creates the class with the llama-index schema
+    with client.batch as batch:
+        for row in rows:
+            batch.add_data_object(row["metadata"], partition.title(), uuid=row["id"], vector=row["embedding"])
+    for row in rows:
+        client.data_object.delete(row["id"], class_name=collection.title())
+
+def migrate_legacy_namespaces(store_type: str, collection: str) -> Dict[str, Any]:
+    """
+    Move chunks stored before namespace partitions existed into their partitions.
+    Back then every namespace lived in the bare collection, told apart only by the
+    "namespace" metadata, so those chunks are invisible to namespaced searches until
+    moved. Embeddings are copied as-is (nothing is re-embedded) and the sparse index
+    follows the chunks. Chunks whose namespace is not a valid name stay put and are
+    reported. Safe to run again: moved chunks are no longer in the bare collection.
+    """
+    from llama_index.core.vector_stores.utils import metadata_dict_to_node
+    partition_name(store_type, collection, "default")
+    if store_type == "chromadb":
+        fetch, move = _legacy_chroma_page, _move_chroma_rows
+    elif store_type == "weaviate":
+        fetch, move = _legacy_weaviate_page, _move_weaviate_rows
+    else:
+        raise ValueError(f"Unsupported vector store: {store_type}")
+    moved: Dict[str, int] = {}
+    skipped: Dict[str, int] = {}
+    offset = 0
+    while True:
+        rows = fetch(collection, offset)
+        if not rows:
+            break
+        groups: Dict[str, List[Dict]] = {}
+        for row in rows:
+            namespace = row["namespace"]
+            if isinstance(namespace, str) and _valid_namespace(namespace):
+                groups.setdefault(namespace, []).append(row)
+            else:
+                skipped[str(namespace)] = skipped.get(str(namespace), 0) + 1
+                # Moved rows leave the source, so the next page starts after the ones left behind
+                offset += 1
+        for namespace, group in groups.items():
+            partition = partition_name(store_type, collection, namespace)
+            move(collection, partition, group)
+            node_ids = [row["id"] for row in group]
+            sparse_index.delete(store_type, collection, node_ids)
+            sparse_index.add(store_type, partition, [metadata_dict_to_node(row["metadata"], text=row["text"]) for row in group])
+            index_registry.invalidate(store_type, partition)
+            moved[namespace] = moved.get(namespace, 0) + len(group)
+    index_registry.invalidate(store_type, collection)
+    return {"moved": moved, "skipped": skipped}
+
+# Index handle registry
+INDEX_CACHE_MAX = int(os.getenv("INDEX_CACHE_MAX", "256"))
+
+class IndexRegistry:
+    """
+    Process-wide LRU of ready-to-query indexes keyed by (store type, collection).
+    Each entry holds the store wrapper, the VectorStoreIndex and the retrievers and
+    query engines built from it (per top_k), so they are constructed once and reused.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _entry(self, store_type: str, collection: str) -> Dict:
+        key = (store_type, collection)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry
+            self._stats["misses"] += 1
+        from llama_index.core import VectorStoreIndex
+        # Built outside the lock so a slow store connection does not stall other collections
+        vector_store = get_vector_store(store_type, collection)
+        entry = {
+            "vector_store": vector_store,
+            "index": VectorStoreIndex.from_vector_store(vector_store),
+            "retrievers": {},
+            "query_engines": {}
+        }
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            return entry
+
+    def get_vector_store(self, store_type: str, collection: str):
+        return self._entry(store_type, collection)["vector_store"]
+
+    def get_index(self, store_type: str, collection: str) -> "VectorStoreIndex":
+        return self._entry(store_type, collection)["index"]
+
+    def get_retriever(self, store_type: str, collection: str, top_k: int):
+        entry = self._entry(store_type, collection)
+        with self._lock:
+            retriever = entry["retrievers"].get(top_k)
+            if retriever is None:
+                retriever = entry["index"].as_retriever(
+                    similarity_top_k=top_k,
+                    vector_store_query_mode="default"
+                )
+                entry["retrievers"][top_k] = retriever
+            return retriever
+
+    def get_query_engine(self, store_type: str, collection: str, top_k: int):
+        entry = self._entry(store_type, collection)
+        with self._lock:
+            engine = entry["query_engines"].get(top_k)
+            if engine is None:
+                engine = entry["index"].as_query_engine(
+                    similarity_top_k=top_k,
+                    vector_store_query_mode="default"
+                )
+                entry["query_engines"][top_k] = engine
+            return engine
+
+    def invalidate(self, store_type: Optional[str] = None, collection: Optional[str] = None) -> int:
+        """Drop cached handles matching store type and/or collection (all when both are None)."""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (store_type is None or key[0] == store_type) and (collection is None or key[1] == collection)
+            ]
+            for key in keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+index_registry = IndexRegistry(INDEX_CACHE_MAX)
+
+# Ingestion pipeline
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1024"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "200"))
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2"))
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", tempfile.gettempdir())
+INGEST_TEXT_SEGMENT_CHARS = int(os.getenv("INGEST_TEXT_SEGMENT_CHARS", "1000000"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "./ingest_manifest.db")
+
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+ingest_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_ingest_tasks = set()
+_ingest_job_slots: Optional[asyncio.Semaphore] = None
+
+def _new_progress() -> Dict[str, Any]:
+    return {
+        "documents_read": 0,
+        "documents_added": 0,
+        "documents_updated": 0,
+        "documents_skipped": 0,
+        "documents_removed": 0,
+        "chunks_created": 0,
+        "chunks_skipped": 0,
+        "chunks_removed": 0,
+        "chunks_embedded": 0,
+        "chunks_upserted": 0
+    }
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class IngestManifest:
+    """
+    SQLite record of what has been ingested per (store, namespace, collection): a
+    content hash per document and, per chunk, its hash and vector-store node id.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+            if columns and "store" not in columns:
+                # Manifests written before the store was part of the key: rows came from the default store
+                self._conn.execute("ALTER TABLE documents RENAME TO documents_unkeyed")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "store TEXT, namespace TEXT, collection TEXT, doc_id TEXT, doc_hash TEXT, chunks TEXT, updated_at TEXT, "
+                "PRIMARY KEY (store, namespace, collection, doc_id))"
+            )
+            if columns and "store" not in columns:
+                self._conn.execute("INSERT INTO documents SELECT 'chromadb', * FROM documents_unkeyed")
+                self._conn.execute("DROP TABLE documents_unkeyed")
+
+    def get_document(self, store_type: str, namespace: str, collection: str, doc_id: str):
+        """Return (doc_hash, {chunk_hash: node_id}) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_hash, chunks FROM documents WHERE store = ? AND namespace = ? AND collection = ? AND doc_id = ?",
+                (store_type, namespace, collection, doc_id)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put_document(self, store_type: str, namespace: str, collection: str, doc_id: str, doc_hash: str, chunks: Dict[str, str]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (store_type, namespace, collection, doc_id, doc_hash, json.dumps(chunks), datetime.utcnow().isoformat())
+            )
+
+    def delete_document(self, store_type: str, namespace: str, collection: str, doc_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM documents WHERE store = ? AND namespace = ? AND collection = ? AND doc_id = ?",
+                (store_type, namespace, collection, doc_id)
+            )
+
+    def delete_namespace(self, store_type: str, namespace: str, collection: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM documents WHERE store = ? AND namespace = ? AND collection = ?",
+                (store_type, namespace, collection)
+            )
+
+    def document_ids(self, store_type: str, namespace: str, collection: str) -> set:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id FROM documents WHERE store = ? AND namespace = ? AND collection = ?",
+                (store_type, namespace, collection)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+ingest_manifest = IngestManifest(INGEST_MANIFEST_PATH)
+
+# Sparse (BM25) index
+SPARSE_INDEX_PATH = os.getenv("SPARSE_INDEX_PATH", "./sparse_index.db")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./:§][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to was were will with".split()
+)
+
+def sparse_terms(text: str) -> List[str]:
+    """
+    Lexical terms for BM25. Compound tokens such as part numbers ("PN-4471-B")
+    and citations ("17.2.3", "u.s.c") are kept whole and also split into parts.
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower().replace("§", " § ")):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        parts = re.split(r"[-./:§]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part and part not in _STOPWORDS)
+    return terms
+
+class SparseIndex:
+    """
+    SQLite inverted index kept alongside each vector-store partition. Chunks are
+    added and removed with the same node ids as the vector store, and queries are
+    scored with Okapi BM25 over the postings of the query terms only.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "store TEXT, partition TEXT, node_id TEXT, doc_id TEXT, length INTEGER, content TEXT, metadata TEXT, "
+                "PRIMARY KEY (store, partition, node_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "store TEXT, partition TEXT, term TEXT, node_id TEXT, tf INTEGER, "
+                "PRIMARY KEY (store, partition, term, node_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "store TEXT, partition TEXT, chunks INTEGER, total_length INTEGER, "
+                "PRIMARY KEY (store, partition))"
+            )
+
+    def _remove(self, store_type: str, partition: str, node_ids: List[str]):
+        removed, length = 0, 0
+        for node_id in node_ids:
+            row = self._conn.execute(
+                "SELECT length FROM chunks WHERE store = ? AND partition = ? AND node_id = ?",
+                (store_type, partition, node_id)
+            ).fetchone()
+            if row is None:
+                continue
+            self._conn.execute(
+                "DELETE FROM chunks WHERE store = ? AND partition = ? AND node_id = ?", (store_type, partition, node_id)
+            )
+            self._conn.execute(
+                "DELETE FROM postings WHERE store = ? AND partition = ? AND node_id = ?", (store_type, partition, node_id)
+            )
+            removed += 1
+            length += row[0]
+        return removed, length
+
+    def _update_stats(self, store_type: str, partition: str, chunks: int, length: int):
+        self._conn.execute("INSERT OR IGNORE INTO stats VALUES (?, ?, 0, 0)", (store_type, partition))
+        self._conn.execute(
+            "UPDATE stats SET chunks = chunks + ?, total_length = total_length + ? WHERE store = ? AND partition = ?",
+            (chunks, length, store_type, partition)
+        )
+
+    def add(self, store_type: str, partition: str, nodes):
+        rows, postings, total = [], [], 0
+        for node in nodes:
+            content = node.get_content()
+            counts: Dict[str, int] = {}
+            for term in sparse_terms(content):
+                counts[term] = counts.get(term, 0) + 1
+            length = sum(counts.values())
+            total += length
+            rows.append((store_type, partition, node.node_id, node.ref_doc_id, length, content,
+                         json.dumps(node.metadata, default=str)))
+            postings.extend((store_type, partition, term, node.node_id, tf) for term, tf in counts.items())
+        with self._lock, self._conn:
+            removed, removed_length = self._remove(store_type, partition, [row[2] for row in rows])
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?, ?)", postings)
+            self._update_stats(store_type, partition, len(rows) - removed, total - removed_length)
+
+    def delete(self, store_type: str, partition: str, node_ids: List[str]):
+        with self._lock, self._conn:
+            removed, length = self._remove(store_type, partition, node_ids)
+            self._update_stats(store_type, partition, -removed, -length)
+
+    def contains(self, store_type: str, partition: str, node_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM chunks WHERE store = ? AND partition = ? AND node_id = ?",
+                (store_type, partition, node_id)
+            ).fetchone() is not None
+
+    def drop(self, store_type: str, partition: str):
+        with self._lock, self._conn:
+            for table in ("chunks", "postings", "stats"):
+                self._conn.execute(f"DELETE FROM {table} WHERE store = ? AND partition = ?", (store_type, partition))
+
+    def search(self, store_type: str, partition: str, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Return up to top_k chunks ranked by BM25 score."""
+        terms = set(sparse_terms(query))
+        if not terms:
+            return []
+        with self._lock:
+            stats = self._conn.execute(
+                "SELECT chunks, total_length FROM stats WHERE store = ? AND partition = ?", (store_type, partition)
+            ).fetchone()
+            if not stats or stats[0] <= 0:
+                return []
+            n_chunks, avg_length = stats[0], max(stats[1] / stats[0], 1.0)
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._conn.execute(
+                    "SELECT p.node_id, p.tf, c.length FROM postings p JOIN chunks c "
+                    "ON c.store = p.store AND c.partition = p.partition AND c.node_id = p.node_id "
+                    "WHERE p.store = ? AND p.partition = ? AND p.term = ?",
+                    (store_type, partition, term)
+                ).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+                for node_id, tf, length in postings:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[node_id] = scores.get(node_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            results = []
+            for node_id, score in ranked:
+                doc_id, content, metadata = self._conn.execute(
+                    "SELECT doc_id, content, metadata FROM chunks WHERE store = ? AND partition = ? AND node_id = ?",
+                    (store_type, partition, node_id)
+                ).fetchone()
+                results.append({
+                    "node_id": node_id,
+                    "doc_id": doc_id,
+                    "content": content,
+                    "metadata": json.loads(metadata),
+                    "score": score
+                })
+        return results
+
+sparse_index = SparseIndex(SPARSE_INDEX_PATH)
+
+class IncrementalIngest:
+    """
+    Per-run change detection against the manifest. Unchanged documents are
+    skipped, only new or modified chunks are returned for embedding, and chunks
+    that no longer exist are deleted from the vector store. A document's
+    manifest entry is committed once all of its new chunks are upserted.
+    """
+
+    def __init__(self, vector_store, store_type: str, partition: str, namespace: str, collection: str, progress: Dict[str, Any]):
+        self.vector_store = vector_store
+        self.store_type = store_type
+        self.partition = partition
+        self.namespace = namespace
+        self.collection = collection
+        self.progress = progress
+        self.seen = set()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def plan_document(self, document: "Document", splitter: "SentenceSplitter") -> list:
+        doc_id = document.doc_id
+        self.seen.add(doc_id)
+        doc_hash = _content_hash(document.text + json.dumps(document.metadata, sort_keys=True, default=str))
+        existing = ingest_manifest.get_document(self.store_type, self.namespace, self.collection, doc_id)
+        if existing and existing[0] == doc_hash:
+            self.progress["documents_skipped"] += 1
+            self.progress["chunks_skipped"] += len(existing[1])
+            node_ids = list(existing[1].values())
+            if node_ids and not sparse_index.contains(self.store_type, self.partition, node_ids[0]):
+                # Ingested before the sparse index existed: backfill it without re-embedding
+                sparse_index.add(self.store_type, self.partition, self._chunk(document, splitter, {})[1])
+            return []
+
+        old_chunks = existing[1] if existing else {}
+        chunks, new_nodes = self._chunk(document, splitter, old_chunks)
+        self.progress["chunks_created"] += len(chunks)
+        self.progress["chunks_skipped"] += len(chunks) - len(new_nodes)
+
+        stale = [node_id for chunk_hash, node_id in old_chunks.items() if chunk_hash not in chunks]
+        if stale:
+            self.vector_store.delete_nodes(stale)
+            sparse_index.delete(self.store_type, self.partition, stale)
+            self.progress["chunks_removed"] += len(stale)
+        self.progress["documents_updated" if existing else "documents_added"] += 1
+
+        if new_nodes:
+            with self._lock:
+                self._pending[doc_id] = {"remaining": len(new_nodes), "doc_hash": doc_hash, "chunks": chunks}
+        else:
+            ingest_manifest.put_document(self.store_type, self.namespace, self.collection, doc_id, doc_hash, chunks)
+        return new_nodes
+
+    @staticmethod
+    def _chunk(document: "Document", splitter: "SentenceSplitter", old_chunks: Dict[str, str]):
+        """Split a document and return ({chunk_hash: node_id}, nodes not in old_chunks) with deterministic ids."""
+        from llama_index.core.schema import MetadataMode
+        doc_id = document.doc_id
+        chunks: Dict[str, str] = {}
+        new_nodes = []
+        for node in splitter.get_nodes_from_documents([document]):
+            chunk_hash = _content_hash(node.get_content(metadata_mode=MetadataMode.EMBED))
+            while chunk_hash in chunks:
+                # Same text repeated within one document
+                chunk_hash = _content_hash(chunk_hash)
+            if chunk_hash in old_chunks:
+                chunks[chunk_hash] = old_chunks[chunk_hash]
+                continue
+            node.id_ = f"{doc_id}:{chunk_hash[:32]}"
+            chunks[chunk_hash] = node.id_
+            new_nodes.append(node)
+        return chunks, new_nodes
+
+    def chunks_upserted(self, nodes):
+        completed = []
+        with self._lock:
+            for node in nodes:
+                pending = self._pending.get(node.ref_doc_id)
+                if pending is None:
+                    continue
+                pending["remaining"] -= 1
+                if pending["remaining"] == 0:
+                    completed.append((node.ref_doc_id, self._pending.pop(node.ref_doc_id)))
+        for doc_id, pending in completed:
+            ingest_manifest.put_document(self.store_type, self.namespace, self.collection, doc_id, pending["doc_hash"], pending["chunks"])
+
+    def prune_unseen(self):
+        """Full-sync mode: remove documents that were not part of this run."""
+        for doc_id in ingest_manifest.document_ids(self.store_type, self.namespace, self.collection) - self.seen:
+            entry = ingest_manifest.get_document(self.store_type, self.namespace, self.collection, doc_id)
+            node_ids = list(entry[1].values()) if entry else []
+            if node_ids:
+                self.vector_store.delete_nodes(node_ids)
+                sparse_index.delete(self.store_type, self.partition, node_ids)
+            ingest_manifest.delete_document(self.store_type, self.namespace, self.collection, doc_id)
+            self.progress["documents_removed"] += 1
+            self.progress["chunks_removed"] += len(node_ids)
+
+def _iter_node_batches(documents, splitter: "SentenceSplitter", batch_size: int, progress: Dict[str, Any], plan: IncrementalIngest):
+    """Chunk documents one at a time and yield new or changed nodes in embedding-sized batches."""
+    batch = []
+    for document in documents:
+        progress["documents_read"] += 1
+        nodes = plan.plan_document(document, splitter)
+        for node in nodes:
+            batch.append(node)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def _raise_if_batch_failed(task: asyncio.Task) -> None:
+    """Re-raise a finished batch's error; a batch cancelled out from under the job fails it."""
+    if task.cancelled():
+        raise RuntimeError("Embedding batch was cancelled")
+    if task.exception():
+        raise task.exception()
+
+async def run_ingest_pipeline(
+    documents,
+    store_type: str,
+    collection: str,
+    namespace: str,
+    progress: Dict[str, Any],
+    sync: bool = False
+) -> Dict[str, Any]:
+    """
+    Chunk, embed and upsert documents without blocking the event loop.
+    Chunking runs on the ingest worker pool; up to INGEST_WORKERS embedding
+    batches are in flight at once, and each batch is upserted in bulk.
+    Chunks are indexed in the partition's BM25 index alongside the vectors.
+    Only chunks that changed since the last ingest are embedded. With sync=True
+    the run is treated as the full corpus and unseen documents are removed.
+    """
+    loop = asyncio.get_running_loop()
+    partition = partition_name(store_type, collection, namespace)
+    await VECTOR_STORES[store_type].aget()
+    vector_store = await loop.run_in_executor(ingest_executor, index_registry.get_vector_store, store_type, partition)
+    from llama_index.core import Settings
+    from llama_index.core.node_parser import SentenceSplitter
+    from llama_index.core.schema import MetadataMode
+    embed_model = Settings.embed_model
+    splitter = SentenceSplitter(chunk_size=INGEST_CHUNK_SIZE, chunk_overlap=INGEST_CHUNK_OVERLAP)
+    plan = IncrementalIngest(vector_store, store_type, partition, namespace, collection, progress)
+    batches = _iter_node_batches(documents, splitter, INGEST_EMBED_BATCH_SIZE, progress, plan)
+    slots = asyncio.Semaphore(INGEST_WORKERS)
+    tasks = []
+
+    async def embed_and_upsert(nodes):
+        try:
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+            embeddings = await loop.run_in_executor(ingest_executor, embed_model.get_text_embedding_batch, texts)
+            for node, embedding in zip(nodes, embeddings):
+                node.embedding = embedding
+            progress["chunks_embedded"] += len(nodes)
+            await loop.run_in_executor(ingest_executor, vector_store.add, nodes)
+            await loop.run_in_executor(ingest_executor, sparse_index.add, store_type, partition, nodes)
+            progress["chunks_upserted"] += len(nodes)
+            await loop.run_in_executor(ingest_executor, plan.chunks_upserted, nodes)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            nodes = await loop.run_in_executor(ingest_executor, next, batches, None)
+            if nodes is None:
+                break
+            await slots.acquire()
+            tasks.append(asyncio.create_task(embed_and_upsert(nodes)))
+            # Surface failures early instead of chunking the rest of the corpus
+            for task in tasks:
+                if task.done():
+                    _raise_if_batch_failed(task)
+            tasks = [task for task in tasks if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks)
+        for task in tasks:
+            _raise_if_batch_failed(task)
+        if sync:
+            await loop.run_in_executor(ingest_executor, plan.prune_unseen)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        index_registry.invalidate(store_type, partition)
+    return progress
+
+def _iter_spooled_documents(path: str, fmt: str, filename: str, namespace: str) -> Iterator["Document"]:
+    """Read documents lazily from a spooled upload: NDJSON records or a plain-text file."""
+    from llama_index.core import Document
+    with open(path, encoding="utf-8", errors="replace") as f:
+        if fmt == "ndjson":
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield Document(
+                    text=record["content"],
+                    doc_id=str(record.get("id") or f"{filename}:{line_no}"),
+                    metadata={**record.get("metadata", {}), "namespace": namespace}
+                )
+        else:
+            segment = 0
+            while True:
+                text = f.read(INGEST_TEXT_SEGMENT_CHARS)
+                if not text:
+                    break
+                yield Document(
+                    text=text,
+                    doc_id=f"{filename}#{segment}" if segment else filename,
+                    metadata={"namespace": namespace, "source": filename, "segment": segment}
+                )
+                segment += 1
+
+def _spool_path(job_id: str, n: int) -> str:
+    return os.path.join(INGEST_SPOOL_DIR, f"ingest-{job_id}-{n}")
+
+def _upload_format(filename: str, content_type: Optional[str]) -> str:
+    if filename.endswith((".ndjson", ".jsonl")) or (content_type or "").startswith(("application/x-ndjson", "application/jsonl")):
+        return "ndjson"
+    return "text"
+
+async def _run_ingest_job(job: Dict[str, Any], spooled: List[tuple], namespace: str, store_type: str, sync: bool):
+    global _ingest_job_slots
+    if _ingest_job_slots is None:
+        _ingest_job_slots = asyncio.Semaphore(INGEST_MAX_CONCURRENT_JOBS)
+    try:
+        async with _ingest_job_slots:
+            job["status"] = "running"
+            job["started_at"] = datetime.utcnow().isoformat()
+
+            def documents():
+                for path, fmt, filename in spooled:
+                    yield from _iter_spooled_documents(path, fmt, filename, namespace)
+
+            await run_ingest_pipeline(documents(), store_type, job["collection"], namespace, job["progress"], sync=sync)
+            job["status"] = "completed"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = e.detail if isinstance(e, HTTPException) else str(e)
+    finally:
+        job["finished_at"] = datetime.utcnow().isoformat()
+        for path, _, _ in spooled:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+@app.post("/ingest/jobs", status_code=202)
+async def create_ingest_job(
+    request: Request,
+    namespace: str = "default",
+    collection: str = "documents",
+    store: str = "chromadb",
+    sync: bool = False
+):
+    """
+    Start a bulk ingestion job from an NDJSON body ({"id", "content", "metadata"} per line)
+    or a multipart upload of .ndjson/.jsonl or plain-text files. The upload is spooled to
+    disk as it streams in; chunking, embedding and upserts run in the background.
+    With sync=true the upload is the full corpus and documents missing from it are removed.
+    """
+    partition_name(check_store(store), collection, namespace)
+    job_id = uuid.uuid4().hex
+    spooled = []
+    bytes_received = 0
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            for _, value in form.multi_items():
+                if not isinstance(value, UploadFile):
+                    continue
+                path = _spool_path(job_id, len(spooled))
+                with open(path, "wb") as out:
+                    await asyncio.to_thread(shutil.copyfileobj, value.file, out)
+                    bytes_received += out.tell()
+                filename = value.filename or f"upload-{len(spooled)}"
+                spooled.append((path, _upload_format(filename, value.content_type), filename))
+            await form.close()
+        else:
+            path = _spool_path(job_id, 0)
+            out = await asyncio.to_thread(open, path, "wb")
+            spooled.append((path, "ndjson", "body"))
+            try:
+                async for chunk in request.stream():
+                    await asyncio.to_thread(out.write, chunk)
+                    bytes_received += len(chunk)
+            finally:
+                await asyncio.to_thread(out.close)
+    except Exception as e:
+        for path, _, _ in spooled:
+            os.remove(path)
+        raise HTTPException(status_code=400, detail=f"Could not read upload: {str(e)}")
+    if not spooled:
+        raise HTTPException(status_code=400, detail="No documents uploaded")
+
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "namespace": namespace,
+        "collection": collection,
+        "store": store,
+        "sync": sync,
+        "bytes_received": bytes_received,
+        "files": [filename for _, _, filename in spooled],
+        "progress": _new_progress(),
+        "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+        "started_at": None,
+        "finished_at": None
+    }
+    ingest_jobs[job_id] = job
+    while len(ingest_jobs) > INGEST_JOB_HISTORY:
+        ingest_jobs.popitem(last=False)
+    task = asyncio.create_task(_run_ingest_job(job, spooled, namespace, store, sync))
+    _ingest_tasks.add(task)
+    task.add_done_callback(_ingest_tasks.discard)
+    return {"job_id": job_id, "status": job["status"], "status_url": f"/ingest/jobs/{job_id}"}
+
+@app.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Poll the progress of an ingestion job"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
+
+@app.get("/ingest/jobs")
+async def list_ingest_jobs():
+    """List recent ingestion jobs"""
+    return {"jobs": list(reversed(ingest_jobs.values()))}
+
 @app.post("/ingest")
 async def ingest_documents(request: IngestRequest):
     """Ingest documents using LlamaIndex"""
+    check_store(request.store)
     try:
         # Convert documents to LlamaIndex Document objects
+        from llama_index.core import Document
         documents = []
         for doc in request.documents:
             documents.append(Document(
@@ -70,83 +1081,327 @@ async def ingest_documents(request: IngestRequest):
                 metadata={"namespace": request.namespace}
             ))
         
-        # Create vector store and index
-        vector_store = get_vector_store("chromadb", request.collection)
-        index = VectorStoreIndex.from_documents(
-            documents,
-            vector_store=vector_store
+        # Chunk, embed and upsert changed chunks on the ingest worker pool
+        progress = await run_ingest_pipeline(
+            documents, request.store, request.collection, request.namespace, _new_progress(), sync=request.sync
         )
         
         return {
             "status": "success",
             "documents_ingested": len(documents),
+            "chunks_ingested": progress["chunks_upserted"],
+            "documents_skipped": progress["documents_skipped"],
+            "documents_updated": progress["documents_updated"],
+            "documents_removed": progress["documents_removed"],
+            "chunks_skipped": progress["chunks_skipped"],
+            "chunks_removed": progress["chunks_removed"],
             "namespace": request.namespace,
-            "collection": request.collection
+            "collection": request.collection,
+            "store": request.store
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
 
+def to_search_results(nodes) -> List[SearchResult]:
+    """Convert retrieved NodeWithScore objects to API results"""
+    return [
+        SearchResult(
+            id=node.node.ref_doc_id or node.node.node_id,
+            content=node.node.get_content(),
+            score=node.score if node.score is not None else 0.0,
+            metadata=node.node.metadata
+        )
+        for node in nodes
+    ]
+
+def sparse_search_results(hits: List[Dict[str, Any]]) -> List[SearchResult]:
+    """Convert BM25 hits to API results"""
+    return [
+        SearchResult(id=hit["doc_id"] or hit["node_id"], content=hit["content"], score=hit["score"], metadata=hit["metadata"])
+        for hit in hits
+    ]
+
+def reciprocal_rank_fusion(rankings: List[tuple], rrf_k: int, top_k: int) -> List[SearchResult]:
+    """
+    Fuse ranked lists of (node_id, SearchResult) with weighted reciprocal-rank fusion:
+    score = sum(weight / (rrf_k + rank)). Rankings are given as (weight, list) pairs.
+    """
+    fused: Dict[str, float] = {}
+    results: Dict[str, SearchResult] = {}
+    for weight, ranking in rankings:
+        for rank, (node_id, result) in enumerate(ranking, 1):
+            fused[node_id] = fused.get(node_id, 0.0) + weight / (rrf_k + rank)
+            results.setdefault(node_id, result)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [results[node_id].model_copy(update={"score": score}) for node_id, score in ranked]
+
+def retrieve_nodes(store_type: str, partition: str, top_k: int, query: str):
+    """
+    Dense retrieval from a partition. Blocking: building the index handle may connect
+    to the store, and the store clients query synchronously, so call it in a thread.
+    """
+    return index_registry.get_retriever(store_type, partition, top_k).retrieve(query)
+
+async def hybrid_search(store_type: str, partition: str, request: SearchRequest) -> List[SearchResult]:
+    """Query the vector and BM25 indexes concurrently and fuse the rankings with RRF."""
+    candidates = max(request.top_k, HYBRID_CANDIDATES)
+    nodes, hits = await asyncio.gather(
+        asyncio.to_thread(retrieve_nodes, store_type, partition, candidates, request.query),
+        asyncio.to_thread(sparse_index.search, store_type, partition, request.query, candidates)
+    )
+    dense = list(zip([node.node.node_id for node in nodes], to_search_results(nodes)))
+    sparse = list(zip([hit["node_id"] for hit in hits], sparse_search_results(hits)))
+    return reciprocal_rank_fusion(
+        [(request.vector_weight, dense), (request.sparse_weight, sparse)], request.rrf_k, request.top_k
+    )
+
+# Federated search
+FEDERATED_STORE_TIMEOUT = float(os.getenv("FEDERATED_STORE_TIMEOUT", "2.0"))
+
+async def search_store(store_type: str, request: SearchRequest) -> List[SearchResult]:
+    """Run a vector, sparse or hybrid search against one store's partition for the namespace."""
+    partition = partition_name(store_type, request.collection, request.namespace)
+    if request.mode != "sparse":
+        await VECTOR_STORES[store_type].aget()
+    if request.mode == "hybrid":
+        return await hybrid_search(store_type, partition, request)
+    if request.mode == "sparse":
+        hits = await asyncio.to_thread(sparse_index.search, store_type, partition, request.query, request.top_k)
+        return sparse_search_results(hits)
+    # In a worker thread so the caller's deadline (see federated_search) can fire
+    return to_search_results(await asyncio.to_thread(retrieve_nodes, store_type, partition, request.top_k, request.query))
+
+def normalize_scores(results: List[SearchResult], request: SearchRequest) -> List[SearchResult]:
+    """
+    Map one store's scores onto [0, 1] so rankings from different stores are comparable.
+    Each score is scaled on its own, never against the other results, so a single or
+    flat result list keeps its real strength: vector similarities are clamped, hybrid
+    RRF scores are divided by the best possible fused score, and BM25 scores, which
+    have no upper bound, are squashed with s / (s + 1).
+    """
+    if request.mode == "hybrid":
+        best = (request.vector_weight + request.sparse_weight) / (request.rrf_k + 1)
+        scores = [result.score / best if best > 0 else 0.0 for result in results]
+    elif request.mode == "sparse":
+        scores = [result.score / (result.score + 1) if result.score > 0 else 0.0 for result in results]
+    else:
+        scores = [result.score for result in results]
+    return [
+        result.model_copy(update={"score": min(max(score, 0.0), 1.0)})
+        for result, score in zip(results, scores)
+    ]
+
+async def federated_search(stores: List[str], request: SearchRequest):
+    """
+    Query several stores in parallel, each under its own deadline. Store calls run in
+    worker threads, so a slow store cannot hold up the others. Stores that fail or
+    miss the deadline are reported and left out; the rest are score-normalized
+    per store and merged into a single top_k ranking.
+    """
+    timeout = request.store_timeout_ms / 1000 if request.store_timeout_ms else FEDERATED_STORE_TIMEOUT
+
+    async def timed(store_type: str):
+        started = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(search_store(store_type, request), timeout)
+            status = {"status": "ok", "results": len(results)}
+        except asyncio.TimeoutError:
+            results, status = [], {"status": "timeout"}
+        except HTTPException as e:
+            if e.status_code != 503:
+                raise
+            results, status = [], {"status": "unavailable", "error": e.detail}
+        except Exception as e:
+            results, status = [], {"status": "error", "error": str(e)}
+        status["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return store_type, results, status
+
+    outcomes = await asyncio.gather(*(timed(store_type) for store_type in stores))
+    merged = []
+    for store_type, results, _ in outcomes:
+        merged.extend(
+            result.model_copy(update={"metadata": {**result.metadata, "store": store_type}})
+            for result in normalize_scores(results, request)
+        )
+    merged.sort(key=lambda result: result.score, reverse=True)
+    return merged[:request.top_k], {store_type: status for store_type, _, status in outcomes}
+
 @app.post("/search")
 async def search_documents(request: SearchRequest):
-    """Search documents using LlamaIndex"""
+    """
+    Retrieve the top_k best chunks from the namespace's partition, no LLM call.
+    mode=vector is dense retrieval, mode=sparse is BM25, and mode=hybrid runs both
+    concurrently and fuses them with weighted reciprocal-rank fusion.
+    store selects the vector store; stores=[...] searches several stores in parallel
+    and merges their normalized results.
+    """
+    if request.mode not in ("vector", "sparse", "hybrid"):
+        raise HTTPException(status_code=400, detail=f"Unsupported search mode: {request.mode}")
+    stores = [check_store(store_type) for store_type in dict.fromkeys(request.stores or [request.store])]
     try:
-        # Get vector store and create retriever
-        vector_store = get_vector_store("chromadb", request.collection)
-        index = VectorStoreIndex.from_vector_store(vector_store)
-        
-        # Create query engine with retrieval
-        query_engine = index.as_query_engine(
-            similarity_top_k=request.top_k,
-            vector_store_query_mode="default"
-        )
+        response = {"query": request.query, "namespace": request.namespace, "mode": request.mode}
+        if len(stores) > 1:
+            results, store_status = await federated_search(stores, request)
+            if not any(status["status"] == "ok" for status in store_status.values()):
+                raise HTTPException(status_code=503, detail={"message": "No store answered", "stores": store_status})
+            response["stores"] = store_status
+        else:
+            results = await search_store(stores[0], request)
+            response["store"] = stores[0]
         
-        # Execute query
-        response = query_engine.query(request.query)
-        
-        # Extract source documents and scores
-        results = []
-        for node in response.source_nodes:
-            results.append(SearchResult(
-                id=node.node.doc_id,
-                content=node.node.text,
-                score=node.score if hasattr(node, 'score') else 0.0,
-                metadata=node.node.metadata
-            ))
+        return {"results": results, **response}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@app.post("/query")
+async def query_documents(request: SearchRequest):
+    """Retrieve and synthesize an answer with the configured LLM (response synthesis mode)"""
+    partition = partition_name(check_store(request.store), request.collection, request.namespace)
+    try:
+        await VECTOR_STORES[request.store].aget()
+        query_engine = await asyncio.to_thread(index_registry.get_query_engine, request.store, partition, request.top_k)
+        response = await query_engine.aquery(request.query)
         
         return {
-            "results": results,
+            "answer": str(response),
+            "results": to_search_results(response.source_nodes),
             "query": request.query,
             "namespace": request.namespace
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "vector_stores": list(VECTOR_STORES.keys())
+        "vector_stores": list(VECTOR_STORES.keys()),
+        "cold_start": {key: value for key, value in COLD_START.items() if key != "import_started"}
     }
 
+@app.get("/ready")
+async def readiness_check(connect: bool = False):
+    """
+    Per-store readiness. Returns 503 until every store in REQUIRED_VECTOR_STORES is
+    connected; optional stores are reported but do not affect readiness.
+    With connect=true, stores that are not initialized yet are connected first.
+    """
+    if connect:
+        for client in VECTOR_STORES.values():
+            try:
+                await client.aget()
+            except HTTPException:
+                pass
+    stores = {name: client.status() for name, client in VECTOR_STORES.items()}
+    ready = all(status["status"] == "ready" for status in stores.values() if status["required"])
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "vector_stores": stores}
+    )
+
+@app.get("/index-cache")
+async def index_cache_metrics():
+    """Index registry hit/miss and eviction counters"""
+    return index_registry.metrics()
+
+@app.post("/collections/{collection}/invalidate")
+async def invalidate_collection(collection: str, store: Optional[str] = None):
+    """Drop cached index handles for a collection"""
+    return {"status": "success", "collection": collection, "removed": index_registry.invalidate(store, collection)}
+
+@app.post("/namespaces", status_code=201)
+async def create_namespace(request: NamespaceRequest, store: str = "chromadb"):
+    """Create the physical partition for a namespace"""
+    partition = partition_name(check_store(store), request.collection, request.namespace)
+    try:
+        await VECTOR_STORES[store].aget()
+        await asyncio.to_thread(index_registry.get_vector_store, store, partition)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not create namespace: {str(e)}")
+    return {"status": "success", "namespace": request.namespace, "collection": request.collection, "partition": partition}
+
+@app.post("/namespaces/migrate")
+async def migrate_namespaces(collection: str = "documents", store: str = "chromadb"):
+    """Move chunks ingested before namespace partitions into their namespaces' partitions"""
+    check_store(store)
+    try:
+        await VECTOR_STORES[store].aget()
+        result = await asyncio.to_thread(migrate_legacy_namespaces, store, collection)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not migrate namespaces: {str(e)}")
+    return {"status": "success", "collection": collection, "store": store, **result}
+
+@app.get("/namespaces")
+async def list_namespaces(collection: str = "documents", store: str = "chromadb"):
+    """List namespace partitions of a collection"""
+    check_store(store)
+    try:
+        partitions = await asyncio.to_thread(list_partitions, store, collection)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not list namespaces: {str(e)}")
+    return {"collection": collection, "store": store, "namespaces": partitions}
+
+@app.delete("/namespaces/{namespace}")
+async def delete_namespace(namespace: str, collection: str = "documents", store: str = "chromadb"):
+    """Drop a namespace partition, its cached handles and its ingest manifest"""
+    partition = partition_name(check_store(store), collection, namespace)
+    try:
+        dropped = await asyncio.to_thread(drop_partition, store, partition)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not drop namespace: {str(e)}")
+    if not dropped:
+        raise HTTPException(status_code=404, detail=f"Namespace {namespace} not found in {collection}")
+    index_registry.invalidate(store, partition)
+    await asyncio.to_thread(ingest_manifest.delete_namespace, store, namespace, collection)
+    return {"status": "success", "namespace": namespace, "collection": collection, "partition": partition}
+
 @app.get("/collections")
 async def list_collections():
     """List available collections"""
     collections = []
     try:
         # ChromaDB collections
-        chroma_client = VECTOR_STORES["chromadb"]["client"]
-        chroma_collections = chroma_client.list_collections()
-        for col in chroma_collections:
+        chroma_client = await VECTOR_STORES["chromadb"].aget()
+        chroma_collections = await asyncio.to_thread(
+            lambda: [(col.name, col.count()) for col in chroma_client.list_collections()]
+        )
+        for name, count in chroma_collections:
             collections.append({
-                "name": col.name,
+                "name": name,
                 "type": "chromadb",
-                "count": col.count()
+                "count": count
             })
     except Exception as e:
         print(f"Error listing ChromaDB collections: {e}")
+    try:
+        # Weaviate classes
+        weaviate_client = await VECTOR_STORES["weaviate"].aget()
+        schema = await asyncio.to_thread(weaviate_client.schema.get)
+        for cls in schema.get("classes", []):
+            collections.append({
+                "name": cls["class"],
+                "type": "weaviate"
+            })
+    except Exception as e:
+        print(f"Error listing Weaviate classes: {e}")
     
     return {"collections": collections}
 
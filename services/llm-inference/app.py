@@ -1,26 +1,85 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
+import json
 import httpx
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from datetime import datetime
 import asyncio
+import logging
+import random
+import re
+import socket
+import sys
+import threading
+import time
 
-app = FastAPI(title="LLM Inference Service", version="1.0.0")
+# Shared helpers: services/common in the repo, copied next to app.py in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import tokenizer_loading
+from common.hedging import HedgeBudget, HedgeSettings, Hedger
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background tasks on boot and stop them on shutdown."""
+    refresher = asyncio.create_task(_refresh_model_status()) if MODEL_STATUS_REFRESH_INTERVAL > 0 else None
+    discovery = asyncio.create_task(_refresh_replicas())
+    try:
+        yield
+    finally:
+        await close_vllm_client()
+        for task in (refresher, discovery):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+app = FastAPI(title="LLM Inference Service", version="1.0.0", lifespan=lifespan)
+
+# Model cascade defaults (see run_cascade)
+CASCADE_SMALL_MODEL = os.getenv("CASCADE_SMALL_MODEL", "mistral-7b")
+CASCADE_LARGE_MODEL = os.getenv("CASCADE_LARGE_MODEL", "llama3-70b")
+CASCADE_MIN_MEAN_LOGPROB = float(os.getenv("CASCADE_MIN_MEAN_LOGPROB", "-1.0"))
+CASCADE_MIN_ANSWER_CHARS = int(os.getenv("CASCADE_MIN_ANSWER_CHARS", "20"))
+
+class CascadePolicy(BaseModel):
+    """Answer with `small_model` unless its answer fails a quality check, then with `large_model`."""
+    small_model: str = CASCADE_SMALL_MODEL
+    large_model: str = CASCADE_LARGE_MODEL
+    min_mean_logprob: Optional[float] = CASCADE_MIN_MEAN_LOGPROB
+    min_answer_chars: int = CASCADE_MIN_ANSWER_CHARS
+    refusal_check: bool = True
+    label: Optional[str] = None  # e.g. the domain; escalation rates are reported per label
 
 class GenerateRequest(BaseModel):
-    prompt: str
+    prompt: str  # The user turn: the question, or the whole prompt when no system prompt or context is given
+    system_prompt: Optional[str] = None
+    context: Optional[str] = None  # Retrieved passages, placed between the system prompt and the question
     max_tokens: int = 256
     temperature: float = 0.7
     top_k: int = 50
     top_p: float = 0.9
     model: str = "llama3-70b"
+    tenant_id: Optional[str] = None
+    cascade: Optional[CascadePolicy] = None  # When set, `model` is ignored
 
 class GenerateResponse(BaseModel):
     text: str
     tokens_used: int
     model: str
     latency_ms: int
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    token_source: str = "estimate"
+    cascade: Optional[dict] = None
 
 # Model endpoints configuration
 MODEL_ENDPOINTS = {
@@ -29,57 +88,455 @@ MODEL_ENDPOINTS = {
     "gemini-2.5-pro": "api"  # External API
 }
 
+# Prompt layout
+# Requests with a system prompt or context are rendered in one canonical order:
+# the model's chat template with the static system prompt first, then the
+# retrieved context, then the question. Everything up to the context is then
+# byte-identical for every request of a domain, so vLLM's automatic prefix
+# caching (--enable-prefix-caching) reuses its KV cache instead of re-running
+# prefill. Requests with only `prompt` are sent as-is, as before.
+PROMPT_TEMPLATES = {
+    "llama3-70b": {
+        # vLLM's tokenizer adds <|begin_of_text|> itself
+        "begin": "",
+        "system": "<|start_header_id|>system<|end_header_id|>\n\n{system}<|eot_id|>",
+        "user": "<|start_header_id|>user<|end_header_id|>\n\n{user}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+    },
+    "mistral-7b": {
+        # Mistral has no system role; the system prompt opens the first [INST] block
+        "begin": "[INST] ",
+        "system": "{system}\n\n",
+        "user": "{user} [/INST]"
+    }
+}
+
+def user_message(request: GenerateRequest) -> str:
+    """The user turn: retrieved context first, then the question."""
+    if not request.context:
+        return request.prompt
+    return f"Context:\n{request.context}\n\nQuestion: {request.prompt}\n\nAnswer:"
+
+def render_prompt(request: GenerateRequest) -> str:
+    """Render the completion prompt for a self-hosted model in the canonical layout."""
+    if not request.system_prompt and not request.context:
+        return request.prompt
+    template = PROMPT_TEMPLATES.get(request.model)
+    if template is None:
+        system = f"{request.system_prompt}\n\n" if request.system_prompt else ""
+        return system + user_message(request)
+    system = template["system"].format(system=request.system_prompt) if request.system_prompt else ""
+    return template["begin"] + system + template["user"].format(user=user_message(request))
+
+def gemini_payload(request: GenerateRequest) -> dict:
+    """Gemini request body; the system prompt goes in systemInstruction, ahead of the contents."""
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": user_message(request)}]}],
+        "generationConfig": {
+            "temperature": request.temperature,
+            "maxOutputTokens": request.max_tokens
+        }
+    }
+    if request.system_prompt:
+        payload["systemInstruction"] = {"parts": [{"text": request.system_prompt}]}
+    return payload
+
 @app.post("/generate", response_model=GenerateResponse)
-async def generate_text(request: GenerateRequest):
-    """Generate text using specified LLM model"""
+async def generate_text(request: GenerateRequest, stream: bool = False, x_tenant_id: Optional[str] = Header(None)):
+    """Generate text using specified LLM model. With ?stream=true, relay tokens as server-sent events."""
     start_time = asyncio.get_event_loop().time()
     
-    if request.model not in MODEL_ENDPOINTS:
-        raise HTTPException(status_code=400, detail=f"Model {request.model} not supported")
+    models = [request.cascade.small_model, request.cascade.large_model] if request.cascade else [request.model]
+    for model in models:
+        if model not in MODEL_ENDPOINTS:
+            raise HTTPException(status_code=400, detail=f"Model {model} not supported")
+    request.tenant_id = request.tenant_id or x_tenant_id or "default"
     
-    endpoint = MODEL_ENDPOINTS[request.model]
+    if stream:
+        if request.cascade:
+            raise HTTPException(status_code=400, detail="cascade is not supported with stream=true")
+        return StreamingResponse(stream_generation(request), media_type="text/event-stream")
     
     try:
-        if endpoint == "api":
-            # Handle external API models (Gemini, etc.)
-            result = await call_external_api(request)
+        cascade = None
+        if request.cascade:
+            request, result, cascade = await run_cascade(request)
         else:
-            # Handle self-hosted models (vLLM endpoints)
-            result = await call_vllm_endpoint(endpoint, request)
+            result = await run_model(request)
         
+        usage = await token_usage(request, result["text"], result.get("usage"))
         latency = int((asyncio.get_event_loop().time() - start_time) * 1000)
         
         return GenerateResponse(
             text=result["text"],
-            tokens_used=result.get("tokens_used", len(result["text"]) // 4),
+            tokens_used=usage["total_tokens"],
             model=request.model,
-            latency_ms=latency
+            latency_ms=latency,
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            token_source=usage["source"],
+            cascade=cascade
         )
     
+    except HTTPException:
+        raise
+    except NoReplicaAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(BREAKER_OPEN_SECONDS))})
+    except httpx.TimeoutException as e:
+        raise HTTPException(status_code=504, detail=f"Generation timed out: {type(e).__name__}")
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code if e.response.status_code < 500 else 502
+        raise HTTPException(status_code=status, detail=f"Generation failed: {e.response.text[:500]}")
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Generation failed: {type(e).__name__}: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
-async def call_vllm_endpoint(endpoint: str, request: GenerateRequest):
-    """Call vLLM-compatible endpoint"""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            f"{endpoint}/v1/completions",
-            json={
-                "model": request.model,
-                "prompt": request.prompt,
-                "max_tokens": request.max_tokens,
-                "temperature": request.temperature,
-                "top_k": request.top_k,
-                "top_p": request.top_p
-            }
+# Shared keep-alive client for self-hosted model endpoints
+_vllm_client: Optional[httpx.AsyncClient] = None
+
+def vllm_client() -> httpx.AsyncClient:
+    global _vllm_client
+    if _vllm_client is None or _vllm_client.is_closed:
+        _vllm_client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
         )
-        response.raise_for_status()
-        data = response.json()
+    return _vllm_client
+
+async def close_vllm_client():
+    global _vllm_client
+    if _vllm_client is not None:
+        await _vllm_client.aclose()
+        _vllm_client = None
+
+# Request hedging
+# If a call has not answered within the HEDGE_PERCENTILE latency of the model's
+# recent calls, send one duplicate (to another replica for self-hosted models)
+# and take whichever answers first; the loser is cancelled, which makes vLLM
+# abort it. Every primary call earns HEDGE_BUDGET_RATIO of a hedge token, so
+# hedges stay within that share of extra load across all models (common.hedging).
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_EXTERNAL_APIS = os.getenv("HEDGE_EXTERNAL_APIS", "false").lower() == "true"  # duplicates are billed
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "10"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "1000"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+
+hedge_settings = HedgeSettings(HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_WINDOW, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY_MS)
+hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST)
+
+external_hedgers: Dict[str, Hedger] = {
+    model: Hedger(model, hedge_budget, hedge_settings) for model, endpoint in MODEL_ENDPOINTS.items() if endpoint == "api"
+}
+
+# Replica routing
+# Each self-hosted model can be served by several vLLM replicas. <MODEL>_ENDPOINTS
+# takes a comma-separated list of base URLs; a "dns+http://host:port" entry is
+# re-resolved every REPLICA_DISCOVERY_INTERVAL seconds so that pods behind a
+# headless Service are picked up as the deployment scales.
+MODEL_REPLICAS = {
+    "llama3-70b": os.getenv("LLAMA3_ENDPOINTS", MODEL_ENDPOINTS["llama3-70b"]),
+    "mistral-7b": os.getenv("MISTRAL_ENDPOINTS", MODEL_ENDPOINTS["mistral-7b"]),
+}
+ROUTING_POLICY = os.getenv("ROUTING_POLICY", "ewma")  # ewma | least_outstanding
+ROUTING_EWMA_ALPHA = float(os.getenv("ROUTING_EWMA_ALPHA", "0.3"))
+ROUTING_MAX_ATTEMPTS = int(os.getenv("ROUTING_MAX_ATTEMPTS", "2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_REQUESTS = int(os.getenv("BREAKER_HALF_OPEN_REQUESTS", "1"))
+REPLICA_DISCOVERY_INTERVAL = float(os.getenv("REPLICA_DISCOVERY_INTERVAL", "15"))
+
+class NoReplicaAvailable(Exception):
+    """Every replica of a model is ejected by its circuit breaker."""
+
+def is_replica_failure(error: Exception) -> bool:
+    """Connection errors, timeouts and 5xx count against a replica; 4xx are the request's fault."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+class Replica:
+    """One upstream endpoint with passive health and a circuit breaker (closed -> open -> half_open)."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.state = "closed"
+        self.outstanding = 0
+        self.ewma_ms: Optional[float] = None
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._stats = {"picks": 0, "successes": 0, "failures": 0, "breaker_opens": 0}
+
+    def available(self, now: float) -> bool:
+        if self.state == "open" and now - self.opened_at >= BREAKER_OPEN_SECONDS:
+            self.state = "half_open"
+        if self.state == "half_open":
+            return self.outstanding < BREAKER_HALF_OPEN_REQUESTS
+        return self.state == "closed"
+
+    def score(self, policy: str, prior_ms: float) -> float:
+        if policy == "ewma":
+            # Expected wait: observed latency scaled by queued work. New replicas start
+            # at the best observed latency so a scale-up is not flooded before it answers.
+            return (self.ewma_ms if self.ewma_ms is not None else prior_ms) * (self.outstanding + 1)
+        return self.outstanding
+
+    def record_success(self, latency_ms: float):
+        self._stats["successes"] += 1
+        self.consecutive_failures = 0
+        self.ewma_ms = latency_ms if self.ewma_ms is None else ROUTING_EWMA_ALPHA * latency_ms + (1 - ROUTING_EWMA_ALPHA) * self.ewma_ms
+        if self.state != "closed":
+            logger.info(f"Replica {self.url} recovered; closing circuit breaker")
+            self.state = "closed"
+
+    def record_failure(self, error: Exception):
+        self._stats["failures"] += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:200]
+        if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD):
+            logger.warning(f"Opening circuit breaker for {self.url} after {self.consecutive_failures} consecutive failures ({self.last_error})")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._stats["breaker_opens"] += 1
+
+    def metrics(self) -> dict:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            **self._stats,
+        }
+
+class ReplicaPool:
+    """
+    Routes one model's requests across its replicas by least outstanding
+    requests or EWMA latency, skipping replicas whose breaker is open. A
+    request that fails on a replica (connection error, timeout, 5xx) is retried
+    on another one, up to ROUTING_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, model: str, sources: str, policy: str):
+        self.model = model
+        self.sources = [source.strip() for source in sources.split(",") if source.strip()]
+        self.policy = policy
+        self.replicas: Dict[str, Replica] = {}
+        self.hedger = Hedger(model, hedge_budget, hedge_settings)
+        self._stats = {"requests": 0, "retries": 0, "rejected": 0, "discovery_errors": 0}
+        self._set_urls([self._fallback_url(source) for source in self.sources])
+
+    @staticmethod
+    def _fallback_url(source: str) -> str:
+        return source[len("dns+"):] if source.startswith("dns+") else source
+
+    def _set_urls(self, urls: List[str]):
+        # Keep the breaker and latency state of replicas that are still present
+        self.replicas = {url: self.replicas.get(url) or Replica(url) for url in dict.fromkeys(urls)}
+
+    async def refresh(self):
+        """Re-resolve dns+ sources into one replica per address."""
+        if not any(source.startswith("dns+") for source in self.sources):
+            return
+        loop = asyncio.get_running_loop()
+        urls = []
+        for source in self.sources:
+            if not source.startswith("dns+"):
+                urls.append(source)
+                continue
+            parsed = httpx.URL(self._fallback_url(source))
+            try:
+                infos = await loop.getaddrinfo(parsed.host, parsed.port, type=socket.SOCK_STREAM)
+            except OSError as e:
+                self._stats["discovery_errors"] += 1
+                logger.warning(f"Replica discovery for {self.model} failed ({e}); keeping {len(self.replicas)} known replicas")
+                return
+            for address in sorted({info[4][0] for info in infos}):
+                host = f"[{address}]" if ":" in address else address
+                urls.append(str(parsed.copy_with(host=host)).rstrip("/"))
+        if urls and set(urls) != set(self.replicas):
+            logger.info(f"{self.model} replicas: {', '.join(urls)}")
+            self._set_urls(urls)
+
+    def pick(self, exclude: Optional[set] = None) -> Replica:
+        now = time.monotonic()
+        candidates = [r for r in self.replicas.values() if r.available(now) and r.url not in (exclude or ())]
+        if not candidates:
+            raise NoReplicaAvailable(f"No healthy replica for {self.model}")
+        prior_ms = min((r.ewma_ms for r in candidates if r.ewma_ms is not None), default=1.0)
+        scores = {candidate.url: candidate.score(self.policy, prior_ms) for candidate in candidates}
+        best = min(scores.values())
+        replica = random.choice([candidate for candidate in candidates if scores[candidate.url] == best])
+        replica._stats["picks"] += 1
+        return replica
+
+    async def call(self, send):
+        """
+        Run `await send(url)` on the best replica, failing over to another
+        replica on replica errors and hedging to another one when it runs slow.
+        """
+        self._stats["requests"] += 1
+        tried: set = set()
+
+        def hedge():
+            replica = self.pick(tried)
+            tried.add(replica.url)
+            return self._send_to(replica, send)
+
+        return await self.hedger.run(lambda: self._call_with_failover(send, tried), hedge if len(self.replicas) > 1 else None)
+
+    async def _call_with_failover(self, send, tried: set):
+        for attempt in range(ROUTING_MAX_ATTEMPTS):
+            try:
+                replica = self.pick(tried)
+            except NoReplicaAvailable:
+                if attempt == 0:
+                    self._stats["rejected"] += 1
+                raise
+            tried.add(replica.url)
+            if attempt:
+                self._stats["retries"] += 1
+            try:
+                return await self._send_to(replica, send)
+            except Exception as e:
+                if not is_replica_failure(e) or attempt + 1 >= ROUTING_MAX_ATTEMPTS or len(tried) >= len(self.replicas):
+                    raise
+                logger.warning(f"{self.model} request failed on {replica.url} ({type(e).__name__}); retrying on another replica")
+
+    async def _send_to(self, replica: Replica, send):
+        replica.outstanding += 1
+        start = time.perf_counter()
+        try:
+            result = await send(replica.url)
+        except Exception as e:
+            if is_replica_failure(e):
+                replica.record_failure(e)
+            raise
+        finally:
+            replica.outstanding -= 1
+        replica.record_success((time.perf_counter() - start) * 1000)
+        return result
+
+    async def stream(self, open_stream):
+        """
+        Relay `open_stream(url)` chunks from the best replica. Fails over to
+        another replica only until the first chunk has been relayed.
+        """
+        self._stats["requests"] += 1
+        tried: set = set()
+        for attempt in range(ROUTING_MAX_ATTEMPTS):
+            try:
+                replica = self.pick(tried)
+            except NoReplicaAvailable:
+                if attempt == 0:
+                    self._stats["rejected"] += 1
+                raise
+            tried.add(replica.url)
+            if attempt:
+                self._stats["retries"] += 1
+            replica.outstanding += 1
+            start = time.perf_counter()
+            relayed = False
+            try:
+                async for chunk in open_stream(replica.url):
+                    relayed = True
+                    yield chunk
+            except Exception as e:
+                if not is_replica_failure(e):
+                    raise
+                replica.record_failure(e)
+                if relayed or attempt + 1 >= ROUTING_MAX_ATTEMPTS or len(tried) >= len(self.replicas):
+                    raise
+                logger.warning(f"{self.model} stream failed on {replica.url} ({type(e).__name__}); retrying on another replica")
+                continue
+            finally:
+                replica.outstanding -= 1
+            replica.record_success((time.perf_counter() - start) * 1000)
+            return
+
+    def metrics(self) -> dict:
         return {
-            "text": data["choices"][0]["text"],
-            "tokens_used": data.get("usage", {}).get("total_tokens", 0)
+            "policy": self.policy,
+            "sources": self.sources,
+            **self._stats,
+            "replicas": [replica.metrics() for replica in self.replicas.values()],
         }
 
+replica_pools: Dict[str, ReplicaPool] = {
+    model: ReplicaPool(model, sources, ROUTING_POLICY)
+    for model, sources in MODEL_REPLICAS.items()
+    if MODEL_ENDPOINTS.get(model, "api") != "api"
+}
+
+async def _refresh_replicas():
+    while True:
+        for pool in replica_pools.values():
+            try:
+                await pool.refresh()
+            except Exception as e:
+                logger.warning(f"Replica refresh for {pool.model} failed: {e}")
+        await asyncio.sleep(REPLICA_DISCOVERY_INTERVAL)
+
+@app.get("/metrics/hedging")
+async def hedging_metrics():
+    """Per-model hedge rate, hedge wins and estimated latency saved, plus the shared hedge budget."""
+    hedgers = {**{model: pool.hedger for model, pool in replica_pools.items()}, **external_hedgers}
+    return {
+        "enabled": hedge_settings.enabled,
+        "percentile": hedge_settings.percentile,
+        "budget": {"ratio": HEDGE_BUDGET_RATIO, "tokens": round(hedge_budget.tokens, 2), "burst": HEDGE_BUDGET_BURST},
+        "models": {model: hedger.metrics() for model, hedger in hedgers.items()}
+    }
+
+@app.get("/metrics/routing")
+async def routing_metrics():
+    """Per-model replica routing: picks, failures, breaker state, outstanding requests and EWMA latency."""
+    return {"models": {model: pool.metrics() for model, pool in replica_pools.items()}}
+
+async def run_model(request: GenerateRequest, logprobs: bool = False):
+    """Generate with `request.model` via the external API, the micro-batcher or a replica."""
+    endpoint = MODEL_ENDPOINTS[request.model]
+    if endpoint == "api":
+        # Handle external API models (Gemini, etc.)
+        return await external_hedgers[request.model].run(
+            lambda: call_external_api(request),
+            (lambda: call_external_api(request)) if HEDGE_EXTERNAL_APIS else None
+        )
+    if request.model in batchers:
+        # Self-hosted models go through the micro-batching scheduler
+        return await batchers[request.model].submit(request, logprobs)
+    # Handle self-hosted models (vLLM endpoints)
+    return await replica_pools[request.model].call(lambda url: call_vllm_endpoint(url, request, logprobs))
+
+def choice_logprobs(choice: dict) -> Optional[List[float]]:
+    """Per-token logprobs of a vLLM completion choice, when requested."""
+    return ((choice.get("logprobs") or {}).get("token_logprobs")) or None
+
+async def call_vllm_endpoint(endpoint: str, request: GenerateRequest, logprobs: bool = False):
+    """Call vLLM-compatible endpoint"""
+    payload = {
+        "model": request.model,
+        "prompt": render_prompt(request),
+        "max_tokens": request.max_tokens,
+        "temperature": request.temperature,
+        "top_k": request.top_k,
+        "top_p": request.top_p
+    }
+    if logprobs:
+        payload["logprobs"] = 1
+    response = await vllm_client().post(f"{endpoint}/v1/completions", json=payload)
+    response.raise_for_status()
+    data = response.json()
+    return {
+        "text": data["choices"][0]["text"],
+        "usage": data.get("usage"),
+        "logprobs": choice_logprobs(data["choices"][0])
+    }
+
 async def call_external_api(request: GenerateRequest):
     """Call external API models like Gemini"""
     if request.model == "gemini-2.5-pro":
@@ -90,45 +547,578 @@ async def call_external_api(request: GenerateRequest):
         async with httpx.AsyncClient() as client:
             response = await client.post(
                 f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-pro:generateContent?key={api_key}",
-                json={
-                    "contents": [{"parts": [{"text": request.prompt}]}],
-                    "generationConfig": {
-                        "temperature": request.temperature,
-                        "maxOutputTokens": request.max_tokens
-                    }
-                }
+                json=gemini_payload(request)
             )
             response.raise_for_status()
             data = response.json()
             text = data["candidates"][0]["content"]["parts"][0]["text"]
-            return {"text": text, "tokens_used": len(text) // 4}
+            return {"text": text, "usage": gemini_usage(data.get("usageMetadata"))}
+
+# Token accounting
+# Counts come from the upstream when it reports exact per-request usage (unbatched
+# vLLM, Gemini usageMetadata), otherwise from the model's tokenizer loaded locally
+# with the `tokenizers` package, and only as a last resort from a chars/4 estimate.
+# Hugging Face model id or local tokenizer.json per model. The Llama 3 repos are
+# gated, so downloads need HF_TOKEN. Gemini has no public tokenizer; set
+# GEMINI_TOKENIZER to a proxy (e.g. a Gemma tokenizer) if needed.
+MODEL_TOKENIZERS = {
+    "llama3-70b": os.getenv("LLAMA3_TOKENIZER", "meta-llama/Meta-Llama-3-70B-Instruct"),
+    "mistral-7b": os.getenv("MISTRAL_TOKENIZER", "mistralai/Mistral-7B-Instruct-v0.2"),
+    "gemini-2.5-pro": os.getenv("GEMINI_TOKENIZER", ""),
+}
+TOKENIZER_RETRY_INTERVAL = float(os.getenv("TOKENIZER_RETRY_INTERVAL", "300"))
+
+class TokenizerCache:
+    """
+    Loads each model's tokenizer on first use and shares it across requests. Models
+    without a tokenizer are recorded with the reason, logged, and counted by estimate.
+    """
+
+    def __init__(self):
+        self._tokenizers: Dict[str, object] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._estimated: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _estimate(self, model: str, reason: str):
+        if self._estimated.get(model) != reason:
+            logger.warning(
+                f"Token usage for {model} is ESTIMATED at 4 chars/token: {reason}. "
+                "Set HF_TOKEN or point the model's *_TOKENIZER at a tokenizer.json."
+            )
+        self._estimated[model] = reason
+
+    def get(self, model: str):
+        tokenizer = self._tokenizers.get(model)
+        if tokenizer is not None:
+            return tokenizer
+        with self._lock:
+            if model in self._tokenizers:
+                return self._tokenizers[model]
+            if time.monotonic() - self._failed_at.get(model, -TOKENIZER_RETRY_INTERVAL) < TOKENIZER_RETRY_INTERVAL:
+                return None
+            tokenizer, reason = tokenizer_loading.load_tokenizer(MODEL_TOKENIZERS.get(model))
+            if tokenizer is None:
+                self._estimate(model, reason)
+                self._failed_at[model] = time.monotonic()
+                return None
+            self._tokenizers[model] = tokenizer
+            self._estimated.pop(model, None)
+            return tokenizer
+
+    def count(self, model: str, *texts: str) -> Optional[List[int]]:
+        tokenizer = self.get(model)
+        if tokenizer is None:
+            return None
+        return [len(encoding.ids) for encoding in tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+    def loaded(self) -> Dict[str, str]:
+        return {model: MODEL_TOKENIZERS[model] for model in self._tokenizers}
+
+    def estimated(self) -> Dict[str, str]:
+        """Models whose usage is currently estimated, with the reason."""
+        return dict(self._estimated)
+
+tokenizer_cache = TokenizerCache()
+
+def gemini_usage(metadata: Optional[dict]) -> Optional[dict]:
+    """Map Gemini usageMetadata to prompt/completion/total token counts."""
+    if not metadata or "promptTokenCount" not in metadata:
+        return None
+    prompt_tokens = metadata.get("promptTokenCount", 0)
+    completion_tokens = metadata.get("candidatesTokenCount", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": metadata.get("totalTokenCount", prompt_tokens + completion_tokens)
+    }
+
+class TenantUsage:
+    """In-process per-tenant, per-model token totals (per replica; scrape and sum across replicas)."""
+
+    def __init__(self):
+        self._usage: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.since = datetime.utcnow().isoformat()
+
+    def record(self, tenant_id: str, model: str, usage: dict):
+        totals = self._usage.setdefault(tenant_id, {}).setdefault(model, {
+            "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated_requests": 0
+        })
+        totals["requests"] += 1
+        totals["prompt_tokens"] += usage["prompt_tokens"]
+        totals["completion_tokens"] += usage["completion_tokens"]
+        totals["total_tokens"] += usage["total_tokens"]
+        if usage["source"] == "estimate":
+            totals["estimated_requests"] += 1
+
+    def tenant(self, tenant_id: str) -> Dict[str, Dict[str, int]]:
+        return self._usage.get(tenant_id, {})
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        return {tenant: dict(models) for tenant, models in self._usage.items()}
+
+tenant_usage = TenantUsage()
+
+async def token_usage(request: GenerateRequest, text: str, upstream: Optional[dict] = None) -> dict:
+    """Work out prompt/completion tokens for one generation and add them to the tenant's totals."""
+    if upstream and upstream.get("prompt_tokens") is not None and upstream.get("completion_tokens") is not None:
+        usage = {
+            "prompt_tokens": upstream["prompt_tokens"],
+            "completion_tokens": upstream["completion_tokens"],
+            "source": "upstream"
+        }
+    else:
+        prompt = render_prompt(request)
+        counts = await asyncio.to_thread(tokenizer_cache.count, request.model, prompt, text)
+        if counts is not None:
+            usage = {"prompt_tokens": counts[0], "completion_tokens": counts[1], "source": "tokenizer"}
+        else:
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "source": "estimate"}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    tenant_usage.record(request.tenant_id or "default", request.model, usage)
+    return usage
+
+@app.get("/usage/tenants")
+async def usage_by_tenant():
+    """Token totals per tenant and model since this replica started."""
+    return {
+        "since": tenant_usage.since,
+        "tenants": tenant_usage.snapshot(),
+        "tokenizers": tokenizer_cache.loaded(),
+        "estimated_models": tokenizer_cache.estimated()
+    }
+
+@app.get("/usage/tenants/{tenant_id}")
+async def usage_for_tenant(tenant_id: str):
+    """Token totals for one tenant, per model."""
+    return {"tenant_id": tenant_id, "since": tenant_usage.since, "models": tenant_usage.tenant(tenant_id)}
+
+# Micro-batching scheduler
+def _batch_config(model: str, window_ms: float, max_batch_size: int, max_queue_depth: int):
+    """Batching settings for a model, overridable via <MODEL>_BATCH_* env vars (e.g. LLAMA3_70B_BATCH_WINDOW_MS)."""
+    prefix = model.upper().replace("-", "_").replace(".", "_")
+    return {
+        "enabled": os.getenv(f"{prefix}_BATCH_ENABLED", os.getenv("BATCHING_ENABLED", "true")).lower() == "true",
+        "window_ms": float(os.getenv(f"{prefix}_BATCH_WINDOW_MS", window_ms)),
+        "max_batch_size": int(os.getenv(f"{prefix}_BATCH_MAX_SIZE", max_batch_size)),
+        "max_queue_depth": int(os.getenv(f"{prefix}_BATCH_MAX_QUEUE", max_queue_depth)),
+    }
+
+BATCH_CONFIG = {
+    "llama3-70b": _batch_config("llama3-70b", window_ms=5.0, max_batch_size=16, max_queue_depth=512),
+    "mistral-7b": _batch_config("mistral-7b", window_ms=3.0, max_batch_size=32, max_queue_depth=1024),
+}
+
+class MicroBatcher:
+    """
+    Collects concurrent /generate calls for one model and sends them as a single
+    multi-prompt /v1/completions request. A batch is flushed when the window
+    elapses or max_batch_size requests are waiting. Only requests with identical
+    sampling parameters share a batch, since vLLM applies them per call. A batch
+    rejected with a 4xx is retried one request at a time, so one bad prompt only
+    fails its own caller.
+    """
+
+    def __init__(self, model: str, pool: ReplicaPool, window_ms: float, max_batch_size: int, max_queue_depth: int):
+        self.model = model
+        self.pool = pool
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_queue_depth = max_queue_depth
+        self._pending: Dict[Tuple, List[Tuple[GenerateRequest, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        self._queued = 0
+        self._in_flight = 0
+        self._stats = {
+            "requests": 0, "batches": 0, "rejected": 0, "errors": 0, "split_batches": 0, "largest_batch": 0, "peak_queue_depth": 0
+        }
+
+    async def submit(self, request: GenerateRequest, logprobs: bool = False):
+        if self._queued + self._in_flight >= self.max_queue_depth:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail=f"Batch queue for {self.model} is full")
+        loop = asyncio.get_running_loop()
+        key = (request.max_tokens, request.temperature, request.top_k, request.top_p, logprobs)
+        future = loop.create_future()
+        bucket = self._pending.setdefault(key, [])
+        bucket.append((request, future))
+        self._queued += 1
+        self._stats["requests"] += 1
+        self._stats["peak_queue_depth"] = max(self._stats["peak_queue_depth"], self._queued + self._in_flight)
+        if len(bucket) >= self.max_batch_size:
+            self._dispatch(key)
+        elif len(bucket) == 1:
+            self._timers[key] = loop.call_later(self.window, self._dispatch, key)
+        return await future
+
+    def _dispatch(self, key: Tuple):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        bucket = self._pending.pop(key, None)
+        if bucket:
+            self._queued -= len(bucket)
+            self._in_flight += len(bucket)
+            asyncio.create_task(self._send(bucket, logprobs=key[-1]))
+
+    async def _send(self, bucket: List[Tuple[GenerateRequest, asyncio.Future]], logprobs: bool = False):
+        first = bucket[0][0]
+        prompts = [render_prompt(req) for req, _ in bucket]
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(bucket))
+        payload = {
+            "model": self.model,
+            "prompt": prompts if len(prompts) > 1 else prompts[0],
+            "max_tokens": first.max_tokens,
+            "temperature": first.temperature,
+            "top_k": first.top_k,
+            "top_p": first.top_p
+        }
+        if logprobs:
+            payload["logprobs"] = 1
+
+        async def send(endpoint: str):
+            response = await vllm_client().post(f"{endpoint}/v1/completions", json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        try:
+            data = await self.pool.call(send)
+            choices = sorted(data["choices"], key=lambda c: c.get("index", 0))
+            # vLLM reports usage for the whole batch, so per-request counts come from token_usage()
+            for (req, future), choice in zip(bucket, choices):
+                if not future.done():
+                    future.set_result({"text": choice["text"], "logprobs": choice_logprobs(choice)})
+        except httpx.HTTPStatusError as e:
+            if len(bucket) > 1 and 400 <= e.response.status_code < 500:
+                # vLLM rejects the whole batch for one bad prompt (e.g. longer than the
+                # context window); resend each request alone so only that one fails
+                self._stats["split_batches"] += 1
+                await asyncio.gather(*(self._send_one(req, future, logprobs) for req, future in bucket))
+            else:
+                self._fail(bucket, e)
+        except Exception as e:
+            self._fail(bucket, e)
+        finally:
+            self._in_flight -= len(bucket)
+
+    async def _send_one(self, request: GenerateRequest, future: asyncio.Future, logprobs: bool):
+        try:
+            result = await self.pool.call(lambda url: call_vllm_endpoint(url, request, logprobs))
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            self._fail([(request, future)], e)
+
+    def _fail(self, bucket: List[Tuple[GenerateRequest, asyncio.Future]], error: Exception):
+        self._stats["errors"] += 1
+        for _, future in bucket:
+            if not future.done():
+                future.set_exception(error)
+
+    def metrics(self):
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "queue_depth": self._queued,
+            "in_flight": self._in_flight,
+            "avg_batch_size": round(self._stats["requests"] / batches, 2) if batches else None,
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+batchers: Dict[str, MicroBatcher] = {
+    model: MicroBatcher(model, replica_pools[model], cfg["window_ms"], cfg["max_batch_size"], cfg["max_queue_depth"])
+    for model, cfg in BATCH_CONFIG.items()
+    if cfg["enabled"] and model in replica_pools
+}
+
+@app.get("/metrics/batching")
+async def batching_metrics():
+    """Per-model micro-batching counters and queue depth."""
+    return {"models": {model: batcher.metrics() for model, batcher in batchers.items()}}
+
+# Model cascade
+# Cheap checks on the small model's answer decide whether to pay for the large one.
+REFUSAL_PATTERN = re.compile(
+    r"\b(?:i (?:do not|don't|cannot|can't|am unable to) (?:know|answer|help|determine|find|say)"
+    r"|i'm (?:not sure|unable to)|i am not sure|as an ai\b"
+    r"|(?:does not|doesn't|do not|don't) (?:contain|provide|include|mention|specify) (?:enough |sufficient |any )?(?:information|details)"
+    r"|(?:not enough|insufficient) (?:information|context))",
+    re.IGNORECASE
+)
+
+def cascade_checks(result: dict, policy: CascadePolicy) -> Tuple[List[str], Optional[float]]:
+    """Return the failed quality checks for a small-model answer, plus its mean token logprob."""
+    text = result["text"].strip()
+    reasons = []
+    if len(text) < policy.min_answer_chars:
+        reasons.append("too_short")
+    if policy.refusal_check and REFUSAL_PATTERN.search(text[:500]):
+        reasons.append("refusal")
+    token_logprobs = [lp for lp in result.get("logprobs") or [] if lp is not None]
+    mean_logprob = sum(token_logprobs) / len(token_logprobs) if token_logprobs else None
+    if policy.min_mean_logprob is not None and mean_logprob is not None and mean_logprob < policy.min_mean_logprob:
+        reasons.append("low_logprob")
+    return reasons, mean_logprob
+
+class CascadeStats:
+    """Per-label counts of answers kept from the small model vs escalated, and why."""
+
+    def __init__(self):
+        self._labels: Dict[str, Dict] = {}
+
+    def record(self, label: str, escalated: bool, reasons: List[str]):
+        stats = self._labels.setdefault(label, {"requests": 0, "small_accepted": 0, "escalated": 0, "reasons": {}})
+        stats["requests"] += 1
+        stats["escalated" if escalated else "small_accepted"] += 1
+        for reason in reasons:
+            stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            label: {**stats, "reasons": dict(stats["reasons"]), "escalation_rate": round(stats["escalated"] / stats["requests"], 4)}
+            for label, stats in self._labels.items()
+        }
+
+cascade_stats = CascadeStats()
+
+async def run_cascade(request: GenerateRequest):
+    """
+    Generate with the cascade's small model and escalate to the large model
+    when the answer is too short, reads as a refusal, has a low mean token
+    logprob, or the small model fails. Returns (request for the model that
+    answered, result, cascade report).
+    """
+    policy = request.cascade
+    small = request.model_copy(update={"model": policy.small_model, "cascade": None})
+    start = time.perf_counter()
+    try:
+        result = await run_model(small, logprobs=True)
+        reasons, mean_logprob = cascade_checks(result, policy)
+    except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code < 500:
+            raise
+        logger.warning(f"Cascade small model {policy.small_model} failed ({type(e).__name__}); escalating")
+        result, reasons, mean_logprob = None, ["small_error"], None
+    small_ms = round((time.perf_counter() - start) * 1000, 1)
+    report = {
+        "models_tried": [policy.small_model],
+        "escalated": bool(reasons),
+        "reasons": reasons,
+        "small_mean_logprob": round(mean_logprob, 3) if mean_logprob is not None else None,
+        "small_latency_ms": small_ms,
+    }
+    cascade_stats.record(policy.label or "default", bool(reasons), reasons)
+    if not reasons:
+        return small, result, report
+    if result is not None:
+        # The rejected draft still consumed tokens
+        await token_usage(small, result["text"], result.get("usage"))
+    large = request.model_copy(update={"model": policy.large_model, "cascade": None})
+    report["models_tried"].append(policy.large_model)
+    return large, await run_model(large), report
+
+@app.get("/metrics/cascade")
+async def cascade_metrics():
+    """Per-label cascade counts: answers kept from the small model, escalations and their reasons."""
+    return {"labels": cascade_stats.snapshot()}
+
+# Streaming generation
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _iter_sse_data(response: httpx.Response):
+    """Yield decoded JSON payloads from an upstream SSE response until [DONE]."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            break
+        if payload:
+            yield json.loads(payload)
+
+async def stream_vllm_endpoint(endpoint: str, request: GenerateRequest):
+    """Stream a vLLM-compatible completion, yielding {"text": ...} chunks and a final {"usage": ...}."""
+    async with vllm_client().stream(
+        "POST",
+        f"{endpoint}/v1/completions",
+        json={
+            "model": request.model,
+            "prompt": render_prompt(request),
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "top_k": request.top_k,
+            "top_p": request.top_p,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+    ) as response:
+        response.raise_for_status()
+        async for data in _iter_sse_data(response):
+            choices = data.get("choices") or []
+            if choices and choices[0].get("text"):
+                yield {"text": choices[0]["text"]}
+            if data.get("usage"):
+                yield {"usage": data["usage"]}
+
+async def stream_external_api(request: GenerateRequest):
+    """Stream external API models like Gemini, yielding {"text": ...} chunks and a final {"usage": ...}."""
+    if request.model == "gemini-2.5-pro":
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="Gemini API key not configured")
+        
+        usage = None
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            async with client.stream(
+                "POST",
+                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-pro:streamGenerateContent?alt=sse&key={api_key}",
+                json=gemini_payload(request)
+            ) as response:
+                response.raise_for_status()
+                async for data in _iter_sse_data(response):
+                    parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+                    text = "".join(part.get("text", "") for part in parts)
+                    if text:
+                        yield {"text": text}
+                    if data.get("usageMetadata"):
+                        usage = gemini_usage(data["usageMetadata"])
+        if usage:
+            yield {"usage": usage}
+
+async def stream_generation(request: GenerateRequest):
+    """
+    SSE stream for /generate?stream=true: `token` events with text deltas, then a
+    `done` event carrying tokens_used, time to first token and total latency.
+    """
+    start_time = asyncio.get_event_loop().time()
+    endpoint = MODEL_ENDPOINTS[request.model]
+    ttft_ms = None
+    text = []
+    chunks = 0
+    upstream_usage = None
+    try:
+        if endpoint == "api":
+            upstream = stream_external_api(request)
+        else:
+            upstream = replica_pools[request.model].stream(lambda url: stream_vllm_endpoint(url, request))
+        async for chunk in upstream:
+            if "usage" in chunk:
+                upstream_usage = chunk["usage"]
+                continue
+            if ttft_ms is None:
+                ttft_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
+            chunks += 1
+            text.append(chunk["text"])
+            yield sse_event("token", {"text": chunk["text"]})
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else (str(e) or type(e).__name__)
+        yield sse_event("error", {"detail": f"Generation failed: {detail}"})
+        return
+    usage = await token_usage(request, "".join(text), upstream_usage)
+    latency = int((asyncio.get_event_loop().time() - start_time) * 1000)
+    logger.info(f"Streamed {request.model}: ttft_ms={ttft_ms} latency_ms={latency}")
+    yield sse_event("done", {
+        "model": request.model,
+        "tokens_used": usage["total_tokens"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "token_source": usage["source"],
+        "chunks": chunks,
+        "ttft_ms": ttft_ms,
+        "latency_ms": latency
+    })
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "models": list(MODEL_ENDPOINTS.keys())}
 
-@app.get("/models")
-async def list_models():
-    """List available models"""
-    models = []
-    for model, endpoint in MODEL_ENDPOINTS.items():
-        status = "healthy"
+# Model health probing
+MODEL_PROBE_TIMEOUT = float(os.getenv("MODEL_PROBE_TIMEOUT", "2.0"))
+MODEL_PROBE_DEADLINE = float(os.getenv("MODEL_PROBE_DEADLINE", "3.0"))
+MODEL_STATUS_REFRESH_INTERVAL = float(os.getenv("MODEL_STATUS_REFRESH_INTERVAL", "15.0"))
+
+# Last known result of probe_models(), refreshed in the background
+model_status = {"models": None, "checked_at": None}
+
+async def _probe_endpoint(client: httpx.AsyncClient, endpoint: str) -> str:
+    try:
+        response = await client.get(f"{endpoint}/health")
+        return "healthy" if response.status_code == 200 else "unhealthy"
+    except Exception:
+        return "unhealthy"
+
+async def _probe_model(client: httpx.AsyncClient, model: str, endpoint: str):
+    start = time.perf_counter()
+    status = "healthy"
+    replicas = None
+    if endpoint != "api":
+        pool = replica_pools.get(model)
+        urls = list(pool.replicas) if pool else [endpoint]
+        results = await asyncio.gather(*(_probe_endpoint(client, url) for url in urls))
+        healthy = results.count("healthy")
+        status = "healthy" if healthy == len(urls) else "degraded" if healthy else "unhealthy"
+        if pool:
+            replicas = [
+                {"url": url, "status": result, "breaker": pool.replicas[url].state}
+                for url, result in zip(urls, results) if url in pool.replicas
+            ]
+    return {
+        "name": model,
+        "endpoint": endpoint,
+        "status": status,
+        "type": "external" if endpoint == "api" else "self-hosted",
+        "replicas": replicas,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+async def probe_models():
+    """Probe every model endpoint concurrently under one shared deadline."""
+    async with httpx.AsyncClient(timeout=MODEL_PROBE_TIMEOUT) as client:
+        tasks = {
+            model: asyncio.create_task(_probe_model(client, model, endpoint))
+            for model, endpoint in MODEL_ENDPOINTS.items()
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=MODEL_PROBE_DEADLINE)
+        for task in pending:
+            task.cancel()
+        models = []
+        for model, task in tasks.items():
+            if task in done:
+                models.append(task.result())
+            else:
+                endpoint = MODEL_ENDPOINTS[model]
+                models.append({
+                    "name": model,
+                    "endpoint": endpoint,
+                    "status": "timeout",
+                    "type": "external" if endpoint == "api" else "self-hosted",
+                    "latency_ms": MODEL_PROBE_DEADLINE * 1000
+                })
+    model_status["models"] = models
+    model_status["checked_at"] = datetime.utcnow()
+    return models
+
+async def _refresh_model_status():
+    while True:
         try:
-            if endpoint != "api":
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    await client.get(f"{endpoint}/health")
-        except:
-            status = "unhealthy"
-        
-        models.append({
-            "name": model,
-            "endpoint": endpoint,
-            "status": status,
-            "type": "external" if endpoint == "api" else "self-hosted"
-        })
-    
-    return {"models": models}
+            await probe_models()
+        except Exception as e:
+            logger.warning(f"Background model status refresh failed: {e}")
+        await asyncio.sleep(MODEL_STATUS_REFRESH_INTERVAL)
+
+@app.get("/models")
+async def list_models(cached: bool = False):
+    """List available models. With ?cached=true, answer from the last background probe."""
+    if cached:
+        return {"models": model_status["models"] or [], "cached": True, "checked_at": model_status["checked_at"]}
+    models = await probe_models()
+    return {"models": models, "cached": False, "checked_at": model_status["checked_at"]}
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,27 +1,266 @@
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
 import httpx
 import json
+import math
 import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
 from datetime import datetime
 import logging
+from starlette.datastructures import Headers
 from starlette.middleware.base import BaseHTTPMiddleware
 from supabase import create_client, Client
 
+# Shared helpers: services/common in the repo, copied next to app.py in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common import tokenizer_loading
+from common.hedging import HedgeBudget, HedgeSettings, Hedger
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Advisor Orchestration API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start shared resources on boot and release them on shutdown."""
+    await http_clients.start()
+    await audit_log.start()
+    await domain_config_listener.start()
+    await service_health.start()
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        await job_queue.close()
+        await service_health.close()
+        await domain_config_listener.close()
+        await audit_log.close()
+        await http_clients.close()
+
+app = FastAPI(title="AI Advisor Orchestration API", version="1.0.0", lifespan=lifespan)
 
 # -------------------------------------------------------------------
-# Audit Logging Middleware
+# Audit Logging
 # -------------------------------------------------------------------
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_MAX_RETRIES = int(os.getenv("AUDIT_MAX_RETRIES", "3"))
+AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "./audit_spill.jsonl")
+AUDIT_QUARANTINE_PATH = os.getenv("AUDIT_QUARANTINE_PATH", f"{AUDIT_SPILL_PATH}.rejected")
+AUDIT_UUID_COLUMNS = ("tenant_id", "user_id", "resource_id")
+
+def is_permanent_audit_error(error: Exception) -> bool:
+    """True when Supabase rejected the rows themselves, so retrying the same batch cannot succeed."""
+    code = str(getattr(error, "code", "") or "")
+    if code[:2] in ("22", "23", "42") or code.startswith("PGRST"):
+        # Postgres data exception / integrity violation / bad column, or a PostgREST request error
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+def _is_uuid(value: Any) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+class AuditLogWriter:
+    """
+    Non-blocking writer for Supabase.audit_logs.
+
+    Request handlers only enqueue rows; a background task bulk-inserts them in
+    batches (by size or flush interval) off the event loop. When the queue is
+    full rows are dropped and counted. Batches that still fail after retries are
+    appended to a JSONL spill file, which is replayed on the next startup.
+    A batch rejected outright (bad value, constraint violation) is split until
+    the offending rows are isolated; those go to a quarantine file, not the spill.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, max_retries: int, spill_path: str,
+                 quarantine_path: str):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self.quarantine_path = quarantine_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: List[Dict[str, Any]] = []
+        self._stopping = False
+        self._stats = {
+            "enqueued": 0, "written": 0, "dropped": 0, "failed_batches": 0, "spilled": 0, "replayed": 0,
+            "split_batches": 0, "quarantined": 0
+        }
+
+    def enqueue(self, row: Dict[str, Any]):
+        """Queue an audit row without waiting on Supabase. Never raises."""
+        if not supabase:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        row.setdefault("created_at", datetime.utcnow().isoformat())
+        for column in AUDIT_UUID_COLUMNS:
+            # Keep labels such as tenant "default" without breaking the UUID column
+            if row.get(column) is not None and not _is_uuid(row[column]):
+                row["details"] = {**(row.get("details") or {}), column: row[column]}
+                row[column] = None
+        try:
+            self._queue.put_nowait(row)
+            self._stats["enqueued"] += 1
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            if self._stats["dropped"] % 1000 == 1:
+                logger.warning(f"Audit queue full ({self.max_queue}); dropped {self._stats['dropped']} rows so far.")
+
+    async def start(self):
+        # Bind the queue to the running loop, keeping rows queued before startup
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        while self._queue is not None and not self._queue.empty():
+            queue.put_nowait(self._queue.get_nowait())
+        self._queue = queue
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flusher and write out whatever is still queued."""
+        self._stopping = True
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.flush_interval + 30.0)
+            except Exception as e:
+                logger.warning(f"Audit flusher did not stop cleanly ({e!r}); flushing remaining rows directly.")
+                if self._flushing:
+                    # The batch being written when the flusher was cancelled; replayed on next startup
+                    await asyncio.to_thread(self._spill, self._flushing)
+                    self._flushing = []
+            self._task = None
+        if self._queue is not None:
+            remaining = []
+            while not self._queue.empty():
+                remaining.append(self._queue.get_nowait())
+            for i in range(0, len(remaining), self.batch_size):
+                await self._flush(remaining[i:i + self.batch_size])
+
+    async def _run(self):
+        if supabase:
+            await self._replay_spill()
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            batch = []
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._flushing = batch
+            await self._flush(batch)
+            self._flushing = []
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        supabase.table("audit_logs").insert(rows).execute()
+
+    async def _flush(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        for attempt in range(self.max_retries):
+            try:
+                await asyncio.to_thread(self._insert, rows)
+                self._stats["written"] += len(rows)
+                return
+            except Exception as e:
+                if is_permanent_audit_error(e):
+                    await self._isolate_rejected(rows, e)
+                    return
+                logger.warning(f"Audit batch insert failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                await asyncio.sleep(min(2 ** attempt * 0.5, 5.0))
+        self._stats["failed_batches"] += 1
+        await asyncio.to_thread(self._spill, rows)
+
+    async def _isolate_rejected(self, rows: List[Dict[str, Any]], error: Exception):
+        """Split a rejected batch so the good rows are written and only the bad ones are quarantined."""
+        if len(rows) == 1:
+            logger.error(f"Audit row rejected by Supabase, quarantined: {error}")
+            await asyncio.to_thread(self._spill, rows, self.quarantine_path, "quarantined")
+            return
+        self._stats["split_batches"] += 1
+        middle = len(rows) // 2
+        await self._flush(rows[:middle])
+        await self._flush(rows[middle:])
+
+    def _spill(self, rows: List[Dict[str, Any]], path: Optional[str] = None, stat: str = "spilled"):
+        path = path or self.spill_path
+        try:
+            with open(path, "a") as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=str) + "\n")
+            self._stats[stat] += len(rows)
+        except OSError as e:
+            self._stats["dropped"] += len(rows)
+            logger.error(f"Failed to write {len(rows)} audit rows to {path}: {e}")
+
+    async def _replay_spill(self):
+        """Re-insert rows spilled by a previous run. Rows that fail again are re-spilled."""
+        replay_path = f"{self.spill_path}.replay"
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+        try:
+            with open(replay_path) as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read audit spill file {replay_path}: {e}")
+            return
+        for i in range(0, len(rows), self.batch_size):
+            await self._flush(rows[i:i + self.batch_size])
+        self._stats["replayed"] += len(rows)
+        os.remove(replay_path)
+        logger.info(f"Replayed {len(rows)} spilled audit rows.")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_max": self.max_queue,
+        }
+
+audit_log = AuditLogWriter(
+    AUDIT_QUEUE_MAX, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_MAX_RETRIES, AUDIT_SPILL_PATH, AUDIT_QUARANTINE_PATH
+)
+
+def audit_event(user: dict, action: str, resource_type: str, details: Dict[str, Any]):
+    """Queue an audit_logs row for the current user."""
+    audit_log.enqueue({
+        "tenant_id": user.get("tenant_id", "default"),
+        "user_id": user.get("user_id"),
+        "action": action,
+        "resource_type": resource_type,
+        "details": details
+    })
+
 class AuditLoggerMiddleware(BaseHTTPMiddleware):
-    """Middleware that stores request/response metadata into Supabase.audit_logs"""
+    """Middleware that queues request/response metadata for Supabase.audit_logs"""
 
     async def dispatch(self, request, call_next):
         response = None
@@ -32,28 +271,291 @@ class AuditLoggerMiddleware(BaseHTTPMiddleware):
             status = "error"
             raise exc
         finally:
-            # Persist minimal audit info – do not block if Supabase unreachable
-            if supabase:
-                try:
-                    tenant_id = request.headers.get("X-Tenant-Id", "default")
-                    user_id = request.headers.get("X-User-Id")
-                    supabase.table("audit_logs").insert({
-                        "tenant_id": tenant_id,
-                        "user_id": user_id,
-                        "action": request.method,
-                        "resource_type": "api",
-                        "resource_id": None,
-                        "details": {
-                            "path": str(request.url.path),
-                            "status": status,
-                            "status_code": response.status_code if response else 500
-                        }
-                    }).execute()
-                except Exception as log_err:
-                    logger.warning(f"Failed to write audit log: {log_err}")
+            # Queue minimal audit info – the background writer persists it
+            audit_log.enqueue({
+                "tenant_id": request.headers.get("X-Tenant-Id"),
+                "user_id": request.headers.get("X-User-Id"),
+                "action": request.method,
+                "resource_type": "api",
+                "resource_id": None,
+                "details": {
+                    "path": str(request.url.path),
+                    "status": status,
+                    "status_code": response.status_code if response else 500
+                }
+            })
         return response
 
-# Register the middleware
+# -------------------------------------------------------------------
+# Admission control
+# -------------------------------------------------------------------
+# Requests to ADMISSION_PATHS are admitted per tenant (X-Tenant-Id): a
+# requests-per-second token bucket rejects bursts straight away, and a
+# per-tenant in-flight limit plus a global ADMISSION_MAX_IN_FLIGHT queue the
+# rest. Interactive requests are served before batch ones (X-Priority: batch),
+# and batch may hold at most ADMISSION_BATCH_SHARE of the global slots. A request
+# whose predicted queue wait exceeds its class's latency SLO is shed with 429
+# and Retry-After rather than queued. Limits are per orchestration replica.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_PATHS = [p.strip() for p in os.getenv(
+    "ADMISSION_PATHS", "/api/rag,/api/prompt-chains/execute,/api/spec-builder,/api/validate"
+).split(",") if p.strip()]
+ADMISSION_DEFAULT_RPS = float(os.getenv("ADMISSION_DEFAULT_RPS", "20"))
+ADMISSION_DEFAULT_CONCURRENCY = int(os.getenv("ADMISSION_DEFAULT_CONCURRENCY", "10"))
+ADMISSION_BURST_SECONDS = float(os.getenv("ADMISSION_BURST_SECONDS", "2"))  # bucket size = rps * this
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_BATCH_SHARE = float(os.getenv("ADMISSION_BATCH_SHARE", "0.5"))
+ADMISSION_SLO_MS = {
+    "interactive": float(os.getenv("ADMISSION_INTERACTIVE_SLO_MS", "2000")),
+    "batch": float(os.getenv("ADMISSION_BATCH_SLO_MS", "30000")),
+}
+ADMISSION_PRIORITIES = ("interactive", "batch")
+# Bucket and counter state is kept for at most this many tenants; the least
+# recently seen idle ones are dropped first
+ADMISSION_MAX_TENANTS = int(os.getenv("ADMISSION_MAX_TENANTS", "10000"))
+# "acme=50/20,beta=5/2": requests per second / concurrent requests per tenant
+ADMISSION_TENANT_LIMITS = {
+    tenant.strip(): tuple(limit.split("/", 1))
+    for tenant, _, limit in (item.partition("=") for item in os.getenv("ADMISSION_TENANT_LIMITS", "").split(","))
+    if tenant.strip() and "/" in limit
+}
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+class AdmissionController:
+    """
+    Per-tenant rate and concurrency limits in front of a shared pool of in-flight slots.
+
+    Limits set with set_limits() are kept; other tenants get the defaults. Each
+    tenant's bucket, in-flight count and counters live in an LRU capped at
+    `max_tenants`: when it is full, the least recently seen tenant with nothing
+    in flight or queued is dropped (its bucket starts full if it comes back).
+    """
+
+    def __init__(self, default_rps: float, default_concurrency: int, max_in_flight: int, batch_share: float,
+                 slo_ms: Dict[str, float], max_tenants: int = ADMISSION_MAX_TENANTS):
+        self.default_rps = default_rps
+        self.default_concurrency = default_concurrency
+        self.max_in_flight = max_in_flight
+        self.batch_slots = max(1, int(max_in_flight * batch_share))
+        self.slo_ms = slo_ms
+        self.max_tenants = max_tenants
+        self._limits: Dict[str, Dict[str, float]] = {}
+        self._tenants: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._in_flight = {priority: 0 for priority in ADMISSION_PRIORITIES}
+        self._waiters = {priority: deque() for priority in ADMISSION_PRIORITIES}
+        self._service_ms = {priority: 500.0 for priority in ADMISSION_PRIORITIES}  # EWMA of request duration
+        self._evicted = 0
+
+    def set_limits(self, tenant_id: str, rps: float, concurrency: int, burst: Optional[float] = None):
+        """Replace a tenant's limits; queued requests that now fit start immediately."""
+        burst = burst or max(1.0, rps * ADMISSION_BURST_SECONDS)
+        self._limits[tenant_id] = {"rps": rps, "concurrency": concurrency, "burst": burst}
+        if tenant_id in self._tenants:
+            self._tenants[tenant_id]["bucket"] = TokenBucket(rps, burst)
+        self._grant()
+
+    def limits(self, tenant_id: str) -> Dict[str, float]:
+        return self._limits.get(tenant_id) or {
+            "rps": self.default_rps,
+            "concurrency": self.default_concurrency,
+            "burst": max(1.0, self.default_rps * ADMISSION_BURST_SECONDS),
+        }
+
+    def _tenant(self, tenant_id: str) -> Dict[str, Any]:
+        """The tenant's bucket, in-flight and waiting counts and counters, most recently seen last."""
+        state = self._tenants.get(tenant_id)
+        if state is not None:
+            self._tenants.move_to_end(tenant_id)
+            return state
+        limits = self.limits(tenant_id)
+        state = self._tenants[tenant_id] = {
+            "bucket": TokenBucket(limits["rps"], limits["burst"]),
+            "in_flight": 0,
+            "waiting": 0,
+            "stats": {"admitted": 0, "queued": 0, "rejected_rate": 0, "rejected_slo": 0, "wait_ms_total": 0.0},
+        }
+        if len(self._tenants) > self.max_tenants:
+            idle = [t for t, other in self._tenants.items() if t != tenant_id and not other["in_flight"] and not other["waiting"]]
+            for stale in idle[:len(self._tenants) - self.max_tenants]:
+                del self._tenants[stale]
+                self._evicted += 1
+        return state
+
+    def _can_run(self, tenant_id: str, priority: str) -> bool:
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return False
+        if priority == "batch" and self._in_flight["batch"] >= self.batch_slots:
+            return False
+        return self._tenant(tenant_id)["in_flight"] < self.limits(tenant_id)["concurrency"]
+
+    def _start(self, tenant_id: str, priority: str):
+        state = self._tenant(tenant_id)
+        state["in_flight"] += 1
+        state["stats"]["admitted"] += 1
+        self._in_flight[priority] += 1
+
+    def _grant(self):
+        """Start queued requests that now fit, interactive first, oldest first within a class."""
+        for priority in ADMISSION_PRIORITIES:
+            for waiter in list(self._waiters[priority]):
+                if self._can_run(waiter["tenant"], priority):
+                    self._dequeue(waiter, priority)
+                    self._start(waiter["tenant"], priority)
+                    waiter["future"].set_result(None)
+
+    def _dequeue(self, waiter: Dict[str, Any], priority: str):
+        self._waiters[priority].remove(waiter)
+        self._tenant(waiter["tenant"])["waiting"] -= 1
+
+    def _predicted_wait_ms(self, tenant_id: str, priority: str) -> float:
+        """Queue wait estimate: requests ahead divided by the slots serving them, times the mean duration."""
+        classes = ADMISSION_PRIORITIES[:ADMISSION_PRIORITIES.index(priority) + 1]
+        ahead = sum(len(self._waiters[p]) for p in classes)
+        slots = self.batch_slots if priority == "batch" else self.max_in_flight
+        tenant_ahead = sum(1 for p in classes for w in self._waiters[p] if w["tenant"] == tenant_id)
+        service_ms = self._service_ms[priority]
+        return max(ahead / slots, tenant_ahead / max(1, self.limits(tenant_id)["concurrency"])) * service_ms + service_ms / 2
+
+    async def acquire(self, tenant_id: str, priority: str):
+        """Wait for a slot, or raise AdmissionRejected. Every successful acquire needs a release."""
+        state = self._tenant(tenant_id)
+        stats = state["stats"]
+        retry_after = state["bucket"].take()
+        if retry_after:
+            stats["rejected_rate"] += 1
+            raise AdmissionRejected("rate_limited", retry_after)
+        # _grant() runs on every release, so nothing already queued could take this slot
+        if self._can_run(tenant_id, priority):
+            self._start(tenant_id, priority)
+            return
+        predicted_ms = self._predicted_wait_ms(tenant_id, priority)
+        if predicted_ms > self.slo_ms[priority]:
+            stats["rejected_slo"] += 1
+            raise AdmissionRejected("queue_over_slo", predicted_ms / 1000)
+        waiter = {"tenant": tenant_id, "future": asyncio.get_running_loop().create_future()}
+        self._waiters[priority].append(waiter)
+        state["waiting"] += 1
+        stats["queued"] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter["future"]), self.slo_ms[priority] / 1000)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter["future"].done():
+                # Granted just as we gave up: hand the slot back
+                self.release(tenant_id, priority)
+            else:
+                self._dequeue(waiter, priority)
+                waiter["future"].cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            stats["rejected_slo"] += 1
+            raise AdmissionRejected("queue_over_slo", self._service_ms[priority] / 1000)
+        finally:
+            stats["wait_ms_total"] += (time.perf_counter() - started) * 1000
+
+    def release(self, tenant_id: str, priority: str, duration_ms: Optional[float] = None):
+        self._tenant(tenant_id)["in_flight"] -= 1
+        self._in_flight[priority] -= 1
+        if duration_ms is not None:
+            self._service_ms[priority] = 0.8 * self._service_ms[priority] + 0.2 * duration_ms
+        self._grant()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "max_in_flight": self.max_in_flight,
+            "batch_slots": self.batch_slots,
+            "slo_ms": self.slo_ms,
+            "in_flight": dict(self._in_flight),
+            "queued": {priority: len(waiters) for priority, waiters in self._waiters.items()},
+            "service_ms": {priority: round(ms, 1) for priority, ms in self._service_ms.items()},
+            "tracked_tenants": len(self._tenants),
+            "max_tenants": self.max_tenants,
+            "evicted_tenants": self._evicted,
+            "tenants": {
+                tenant: {
+                    **self.limits(tenant),
+                    **state["stats"],
+                    "in_flight": state["in_flight"],
+                    "wait_ms_total": round(state["stats"]["wait_ms_total"], 1),
+                }
+                for tenant, state in self._tenants.items()
+            },
+        }
+
+admission = AdmissionController(
+    ADMISSION_DEFAULT_RPS, ADMISSION_DEFAULT_CONCURRENCY, ADMISSION_MAX_IN_FLIGHT, ADMISSION_BATCH_SHARE, ADMISSION_SLO_MS
+)
+for _tenant, (_rps, _concurrency) in ADMISSION_TENANT_LIMITS.items():
+    admission.set_limits(_tenant, float(_rps), int(_concurrency))
+
+def admission_tenant(headers: Headers) -> str:
+    """
+    The tenant a request is admitted as: its X-Tenant-Id header, or the shared
+    "default" bucket when there is none. Authentication is still a placeholder
+    (get_current_user), so the header is taken as given; once real auth lands it
+    must be checked against the authenticated principal's tenant_id here.
+    """
+    return (headers.get("x-tenant-id") or "").strip() or "default"
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware (not BaseHTTPMiddleware) so the slot is held until the
+    response body, including a stream, has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED or not any(scope["path"].startswith(p) for p in ADMISSION_PATHS):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        tenant_id = admission_tenant(headers)
+        priority = "batch" if (headers.get("x-priority") or "").lower() == "batch" else "interactive"
+        try:
+            await admission.acquire(tenant_id, priority)
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": f"Tenant '{tenant_id}' request rejected: {e.reason}", "reason": e.reason},
+                status_code=429,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(tenant_id, priority, (time.perf_counter() - started) * 1000)
+
+# Register the middleware (the last added runs first: CORS, audit, then admission)
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(AuditLoggerMiddleware)
 
 # CORS middleware
@@ -74,6 +576,165 @@ SERVICES = {
 }
 
 N8N_API_KEY = os.getenv("N8N_API_KEY")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+
+# -------------------------------------------------------------------
+# Pooled HTTP clients
+# -------------------------------------------------------------------
+# HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to HTTP/1.1 keep-alive.
+try:
+    import h2  # type: ignore  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ModuleNotFoundError:
+    HTTP2_AVAILABLE = False
+
+def _pool_config(name: str, timeout: float, max_connections: int, max_keepalive: int, http2: bool = False):
+    """Build pool settings for a downstream service, overridable via <NAME>_HTTP_* env vars."""
+    prefix = name.upper()
+    return {
+        "timeout": float(os.getenv(f"{prefix}_HTTP_TIMEOUT", timeout)),
+        "connect_timeout": float(os.getenv(f"{prefix}_HTTP_CONNECT_TIMEOUT", 5.0)),
+        "max_connections": int(os.getenv(f"{prefix}_HTTP_MAX_CONNECTIONS", max_connections)),
+        "max_keepalive": int(os.getenv(f"{prefix}_HTTP_MAX_KEEPALIVE", max_keepalive)),
+        "keepalive_expiry": float(os.getenv(f"{prefix}_HTTP_KEEPALIVE_EXPIRY", 30.0)),
+        "http2": os.getenv(f"{prefix}_HTTP2", str(http2)).lower() == "true" and HTTP2_AVAILABLE,
+    }
+
+# One pool per entry in SERVICES, plus the GitHub API used by the GitOps endpoint.
+# Internal services speak plain HTTP/1.1 (uvicorn/n8n); HTTP/2 only pays off over TLS.
+HTTP_POOL_CONFIG = {
+    "llm_inference": _pool_config("llm_inference", timeout=60.0, max_connections=200, max_keepalive=50),
+    "llamaindex": _pool_config("llamaindex", timeout=30.0, max_connections=100, max_keepalive=50),
+    # Hedged /search duplicates use their own connections, so they need not land on the primary's pod
+    "llamaindex_hedge": _pool_config("llamaindex_hedge", timeout=30.0, max_connections=20, max_keepalive=10),
+    "n8n": _pool_config("n8n", timeout=30.0, max_connections=50, max_keepalive=10),
+    "monitoring": _pool_config("monitoring", timeout=10.0, max_connections=20, max_keepalive=5),
+    "github": _pool_config("github", timeout=30.0, max_connections=20, max_keepalive=5, http2=True),
+}
+
+class _TrackedTransport(httpx.AsyncHTTPTransport):
+    """Transport that counts in-flight requests so pool saturation can be reported."""
+
+    def __init__(self, stats: Dict[str, Any], **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def handle_async_request(self, request):
+        stats = self._stats
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        stats["requests_total"] += 1
+        start = time.perf_counter()
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            stats["errors_total"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            stats["total_time_ms"] += (time.perf_counter() - start) * 1000
+
+class ServiceClientPool:
+    """Keep-alive httpx.AsyncClient per downstream service, opened and closed by the app lifespan."""
+
+    def __init__(self, config: Dict[str, Dict[str, Any]]):
+        self._config = config
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        cfg = self._config[name]
+        self._stats[name] = {"in_flight": 0, "peak_in_flight": 0, "requests_total": 0, "errors_total": 0, "total_time_ms": 0.0}
+        transport = _TrackedTransport(
+            self._stats[name],
+            http2=cfg["http2"],
+            limits=httpx.Limits(
+                max_connections=cfg["max_connections"],
+                max_keepalive_connections=cfg["max_keepalive"],
+                keepalive_expiry=cfg["keepalive_expiry"],
+            ),
+        )
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(cfg["timeout"], connect=cfg["connect_timeout"]),
+        )
+
+    async def start(self):
+        for name in self._config:
+            if name not in self._clients:
+                self._clients[name] = self._create(name)
+        logger.info(f"HTTP client pools started: {', '.join(self._clients)} (http2 available: {HTTP2_AVAILABLE})")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the pooled client for a service, creating it lazily if the lifespan has not run."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    async def close(self):
+        for name, client in self._clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing HTTP client for {name}: {e}")
+        self._clients.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        pools = {}
+        for name, cfg in self._config.items():
+            stats = self._stats.get(name, {"in_flight": 0, "peak_in_flight": 0, "requests_total": 0, "errors_total": 0, "total_time_ms": 0.0})
+            limit = cfg["max_connections"]
+            pools[name] = {
+                "in_flight": stats["in_flight"],
+                "peak_in_flight": stats["peak_in_flight"],
+                "queued": max(0, stats["in_flight"] - limit),
+                "max_connections": limit,
+                "saturation": round(stats["in_flight"] / limit, 3) if limit else 0.0,
+                "requests_total": stats["requests_total"],
+                "errors_total": stats["errors_total"],
+                "avg_latency_ms": round(stats["total_time_ms"] / stats["requests_total"], 2) if stats["requests_total"] else None,
+                "http2": cfg["http2"],
+                "open": name in self._clients,
+            }
+        return pools
+
+http_clients = ServiceClientPool(HTTP_POOL_CONFIG)
+
+# -------------------------------------------------------------------
+# Request hedging
+# -------------------------------------------------------------------
+# If a call has not answered within the HEDGE_PERCENTILE latency of recent calls,
+# send one duplicate and take whichever answers first. Every primary call earns
+# HEDGE_BUDGET_RATIO of a hedge token, so hedges stay within that share of load.
+# Hedger and HedgeBudget come from common.hedging, shared with the inference service.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "10"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "1000"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "10"))
+LLAMAINDEX_HEDGE_URL = os.getenv("LLAMAINDEX_HEDGE_URL", SERVICES["llamaindex"])
+
+hedge_settings = HedgeSettings(HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_WINDOW, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY_MS)
+hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST)
+
+search_hedger = Hedger("llamaindex_search", hedge_budget, hedge_settings)
+
+async def search_llamaindex(payload: Dict[str, Any]) -> httpx.Response:
+    """POST llamaindex /search, hedged with a duplicate on the hedge pool when it runs slow."""
+    async def send(client: str, base_url: str) -> httpx.Response:
+        response = await http_clients.get(client).post(f"{base_url}/search", json=payload)
+        if response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    return await search_hedger.run(
+        lambda: send("llamaindex", SERVICES["llamaindex"]),
+        lambda: send("llamaindex_hedge", LLAMAINDEX_HEDGE_URL)
+    )
+
 
 # Request/Response Models
 class SpecBuilderRequest(BaseModel):
@@ -83,10 +744,20 @@ class SpecBuilderRequest(BaseModel):
     tenant_id: str
     user_id: str
 
+class AdmissionLimitsRequest(BaseModel):
+    rps: float
+    concurrency: int
+    burst: Optional[float] = None  # Defaults to rps * ADMISSION_BURST_SECONDS
+
+def validate_admission_limits(limits: AdmissionLimitsRequest):
+    if limits.rps <= 0 or limits.concurrency < 1 or (limits.burst is not None and limits.burst < 1):
+        raise HTTPException(status_code=400, detail="rps must be positive, concurrency at least 1 and burst at least 1")
+
 class PromptChainRequest(BaseModel):
     chain_type: str
     inputs: Dict[str, Any]
     context: Optional[Dict[str, Any]] = None
+    definition: Optional[Dict[str, Any]] = None  # Ad hoc chain; chain_type names a stored one otherwise
 
 class WorkflowRequest(BaseModel):
     workflow_id: str
@@ -99,6 +770,9 @@ class RAGRequest(BaseModel):
     namespace: Optional[str] = "default"
     top_k: Optional[int] = 3
     use_llm: Optional[bool] = True
+    use_cache: Optional[bool] = True
+    context_token_budget: Optional[int] = None
+    cascade: Optional[bool] = None  # False opts out of the domain's cascade policy
 
 # Supabase initialization
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -162,18 +836,22 @@ DEFAULT_NAMESPACES = {
 
 # Utility function to fetch domain config from Supabase
 
-def get_domain_config(domain: str):
+def _load_domain_config(domain: str):
     """
     Fetch namespace, system_prompt, and default_model for a domain from Supabase.
     Fallback to in-code config if Supabase is unavailable or domain not found.
+
+    Returns (config, found) where found is True/False for a definitive Supabase
+    answer and None when the lookup could not be made (not cacheable).
     """
     # Fallbacks
     system_prompt = SYSTEM_PROMPTS.get(domain, SYSTEM_PROMPTS["default"])
     namespace = DEFAULT_NAMESPACES.get(domain, DEFAULT_NAMESPACES["default"])
     model = DEFAULT_MODELS.get(domain, DEFAULT_MODELS["default"])
+    defaults = {"system_prompt": system_prompt, "namespace": namespace, "model": model}
     if not supabase:
         logger.warning(f"Supabase not available. Using defaults for domain '{domain}'.")
-        return {"system_prompt": system_prompt, "namespace": namespace, "model": model}
+        return defaults, False
     try:
         response = supabase.table("domains").select("namespace,system_prompt,default_model").eq("name", domain).execute()
         if response.data and len(response.data) > 0:
@@ -183,13 +861,173 @@ def get_domain_config(domain: str):
                 "system_prompt": row.get("system_prompt", system_prompt),
                 "namespace": row.get("namespace", namespace),
                 "model": row.get("default_model", model)
-            }
+            }, True
         else:
             logger.warning(f"Domain '{domain}' not found in Supabase. Using defaults.")
-            return {"system_prompt": system_prompt, "namespace": namespace, "model": model}
+            return defaults, False
     except Exception as e:
         logger.error(f"Error fetching domain config from Supabase: {e}. Using defaults.")
-        return {"system_prompt": system_prompt, "namespace": namespace, "model": model}
+        return defaults, None
+
+# Domain config cache
+DOMAIN_CONFIG_TTL = float(os.getenv("DOMAIN_CONFIG_TTL", "300"))
+DOMAIN_CONFIG_NEGATIVE_TTL = float(os.getenv("DOMAIN_CONFIG_NEGATIVE_TTL", "60"))
+DOMAIN_CONFIG_STALE_TTL = float(os.getenv("DOMAIN_CONFIG_STALE_TTL", "3600"))
+DOMAIN_CONFIG_MAX_ENTRIES = int(os.getenv("DOMAIN_CONFIG_MAX_ENTRIES", "1024"))
+DOMAIN_CONFIG_CHANNEL = os.getenv("DOMAIN_CONFIG_CHANNEL", "domain_config_invalidate")
+REDIS_URL = os.getenv("REDIS_URL")
+
+class DomainConfigCache:
+    """
+    In-process TTL cache for domain configs.
+
+    Fresh entries are served from memory. Entries past their TTL but within the
+    stale window are served immediately while a background task refreshes them.
+    Unknown domains are cached for a shorter negative TTL. Supabase lookups run
+    in a worker thread, and concurrent misses for one domain share one fetch.
+    At most `max_entries` domains are kept, least recently used evicted first,
+    since the domain name comes straight from the request.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, stale_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "invalidations": 0, "evictions": 0}
+
+    async def get(self, domain: str) -> Dict[str, Any]:
+        entry = self._entries.get(domain)
+        if entry is not None:
+            self._entries.move_to_end(domain)
+            age = time.monotonic() - entry["fetched_at"]
+            ttl = self.ttl if entry["found"] else self.negative_ttl
+            if age < ttl:
+                self._stats["hits"] += 1
+                return entry["config"]
+            if age < ttl + self.stale_ttl:
+                self._stats["stale_hits"] += 1
+                if domain not in self._inflight:
+                    self._stats["refreshes"] += 1
+                    asyncio.create_task(self._fetch(domain))
+                return entry["config"]
+        self._stats["misses"] += 1
+        return await self._fetch(domain)
+
+    async def _fetch(self, domain: str) -> Dict[str, Any]:
+        inflight = self._inflight.get(domain)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[domain] = future
+        try:
+            config, found = await asyncio.to_thread(_load_domain_config, domain)
+            if found is not None:
+                self._store(domain, {"config": config, "found": found, "fetched_at": time.monotonic()})
+            elif domain in self._entries:
+                # Lookup failed: keep serving the last known config
+                config = self._entries[domain]["config"]
+            future.set_result(config)
+            return config
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(domain, None)
+
+    def _store(self, domain: str, entry: Dict[str, Any]):
+        self._entries[domain] = entry
+        self._entries.move_to_end(domain)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, domain: Optional[str] = None) -> int:
+        """Drop one domain (or every domain when None). Returns the number of entries removed."""
+        if domain is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            removed = 1 if self._entries.pop(domain, None) is not None else 0
+        self._stats["invalidations"] += removed
+        return removed
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+domain_configs = DomainConfigCache(
+    DOMAIN_CONFIG_TTL, DOMAIN_CONFIG_NEGATIVE_TTL, DOMAIN_CONFIG_STALE_TTL, DOMAIN_CONFIG_MAX_ENTRIES
+)
+
+async def get_domain_config(domain: str):
+    """Return the cached config for a domain (see DomainConfigCache)."""
+    return await domain_configs.get(domain)
+
+# Optional Redis pub/sub so an invalidation on one replica reaches all of them
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except ModuleNotFoundError:
+    aioredis = None
+
+class DomainConfigInvalidationListener:
+    """Subscribes to DOMAIN_CONFIG_CHANNEL; a message body is a domain name, or "*" for all."""
+
+    def __init__(self, url: Optional[str], channel: str):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and aioredis)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._redis = aioredis.from_url(self.url, decode_responses=True)
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    domain = message.get("data")
+                    domain_configs.invalidate(None if domain == "*" else domain)
+                    logger.info(f"Domain config invalidated via pub/sub: {domain}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Domain config pub/sub listener error: {e}. Reconnecting in 5s.")
+                await asyncio.sleep(5)
+
+    async def publish(self, domain: Optional[str]) -> bool:
+        if not self._redis:
+            return False
+        try:
+            await self._redis.publish(self.channel, domain or "*")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to publish domain config invalidation: {e}")
+            return False
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._redis:
+            await self._redis.close()
+
+domain_config_listener = DomainConfigInvalidationListener(REDIS_URL, DOMAIN_CONFIG_CHANNEL)
 
 
 # Authentication & RBAC (placeholder for enterprise)
@@ -202,18 +1040,89 @@ async def check_permissions(action: str, user: dict = Depends(get_current_user))
     return True
 
 # Health check
-@app.get("/health")
-async def health_check():
-    service_status = {}
-    async with httpx.AsyncClient() as client:
-        for service, url in SERVICES.items():
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2.0"))
+HEALTH_PROBE_DEADLINE = float(os.getenv("HEALTH_PROBE_DEADLINE", "3.0"))
+HEALTH_REFRESH_INTERVAL = float(os.getenv("HEALTH_REFRESH_INTERVAL", "10.0"))
+
+async def _probe_service(service: str, url: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        response = await http_clients.get(service).get(f"{url}/health", timeout=HEALTH_PROBE_TIMEOUT)
+        status = "healthy" if response.status_code == 200 else "unhealthy"
+    except Exception:
+        status = "unreachable"
+    return {"status": status, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+async def probe_services() -> Dict[str, Dict[str, Any]]:
+    """Probe every downstream service concurrently under one shared deadline."""
+    tasks = {service: asyncio.create_task(_probe_service(service, url)) for service, url in SERVICES.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=HEALTH_PROBE_DEADLINE)
+    for task in pending:
+        task.cancel()
+    return {
+        service: task.result() if task in done else {"status": "timeout", "latency_ms": HEALTH_PROBE_DEADLINE * 1000}
+        for service, task in tasks.items()
+    }
+
+class HealthStatusCache:
+    """Keeps the last known probe result, refreshed by a background task, for cheap readiness checks."""
+
+    def __init__(self, probe, interval: float):
+        self._probe = probe
+        self.interval = interval
+        self.last: Optional[Dict[str, Any]] = None
+        self.checked_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> Dict[str, Any]:
+        self.last = await self._probe()
+        self.checked_at = datetime.utcnow()
+        return self.last
+
+    async def _run(self):
+        while True:
             try:
-                response = await client.get(f"{url}/health", timeout=5.0)
-                service_status[service] = "healthy" if response.status_code == 200 else "unhealthy"
-            except:
-                service_status[service] = "unreachable"
-    
-    return {"status": "ok", "services": service_status, "timestamp": datetime.utcnow()}
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Background health refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+service_health = HealthStatusCache(probe_services, HEALTH_REFRESH_INTERVAL)
+
+@app.get("/health")
+async def health_check(cached: bool = False):
+    """
+    Probe downstream services in parallel. With ?cached=true, answer from the
+    last background probe instead (for liveness/readiness probes).
+    """
+    if cached and service_health.last is not None:
+        probes = service_health.last
+        checked_at = service_health.checked_at
+    elif cached:
+        probes, checked_at = {}, None
+    else:
+        probes = await service_health.refresh()
+        checked_at = service_health.checked_at
+    return {
+        "status": "ok",
+        "services": {service: probe["status"] for service, probe in probes.items()},
+        "latency_ms": {service: probe["latency_ms"] for service, probe in probes.items()},
+        "cached": cached,
+        "checked_at": checked_at,
+        "timestamp": datetime.utcnow()
+    }
 
 @app.post("/api/workflow/trigger", status_code=202)
 async def trigger_n8n_workflow(
@@ -239,9 +1148,8 @@ async def trigger_n8n_workflow(
     })
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(n8n_url, headers=headers, json=workflow_payload, timeout=30.0)
-            response.raise_for_status()
+        response = await http_clients.get("n8n").post(n8n_url, headers=headers, json=workflow_payload)
+        response.raise_for_status()
         
         logger.info(f"Successfully triggered N8N workflow {request.workflow_id}. Response: {response.json()}")
         return {"message": "Workflow triggered successfully", "execution_data": response.json()}
@@ -279,6 +1187,17 @@ async def process_spec_builder(
             "artifacts": []
         }
         
+        # The wizard's scale targets are only proposed here; an admin applies them
+        # with PUT /api/admin/tenants/{tenant_id}/admission
+        throughput, concurrency = request.requirements.get("throughput"), request.requirements.get("concurrency")
+        if throughput and concurrency:
+            try:
+                proposed = AdmissionLimitsRequest(rps=throughput, concurrency=concurrency)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="throughput and concurrency must be numbers")
+            validate_admission_limits(proposed)
+            spec["admission"] = {"proposed": {"rps": proposed.rps, "concurrency": proposed.concurrency}, "applied": False}
+        
         # Generate artifacts based on domain
         if request.domain == "legal":
             spec["artifacts"] = [
@@ -296,164 +1215,1353 @@ async def process_spec_builder(
         
         return {"status": "success", "specification": spec}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Spec builder error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# -------------------------------------------------------------------
+# Reranking
+# -------------------------------------------------------------------
+# The cross-encoder needs the optional `sentence-transformers` package; without it
+# (or with RERANK_BACKEND=llm) passages are scored by the LLM service instead.
+try:
+    from sentence_transformers import CrossEncoder  # type: ignore
+    CROSS_ENCODER_AVAILABLE = True
+except ModuleNotFoundError:
+    CROSS_ENCODER_AVAILABLE = False
+
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "auto")  # auto | cross_encoder | llm | none
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_LLM_MODEL = os.getenv("RERANK_LLM_MODEL", "mistral-7b")
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))  # cross-encoder
+# LLM scoring generates a JSON array per batch, which takes seconds rather than milliseconds
+RERANK_LLM_BUDGET_MS = float(os.getenv("RERANK_LLM_BUDGET_MS", "5000"))
+RERANK_MAX_PASSAGE_CHARS = int(os.getenv("RERANK_MAX_PASSAGE_CHARS", "2000"))
+
+if RERANK_BACKEND in ("auto", "cross_encoder") and not CROSS_ENCODER_AVAILABLE:
+    logger.warning(
+        "sentence-transformers is not installed; reranking uses the LLM service "
+        f"({RERANK_LLM_MODEL}, {RERANK_LLM_BUDGET_MS:.0f} ms budget) instead of {RERANK_MODEL}."
+    )
+
+class Reranker:
+    """
+    Rescores over-fetched search results against the query and keeps the top_k.
+    Scoring is batched and bounded by a per-request time budget (RERANK_BUDGET_MS
+    for the cross-encoder, RERANK_LLM_BUDGET_MS for LLM scoring): batches that have
+    not finished when the budget runs out keep their vector-search order, and any
+    scoring error falls back to vector order entirely.
+    """
+
+    def __init__(self):
+        self._model = None
+        self._model_lock = asyncio.Lock()
+        self._stats = {
+            "requests": 0,
+            "reranked": 0,
+            "partial": 0,
+            "fallbacks": 0,
+            "errors": 0,
+            "passages_scored": 0,
+            "total_time_ms": 0.0,
+        }
+
+    @property
+    def backend(self) -> str:
+        if RERANK_BACKEND == "auto":
+            return "cross_encoder" if CROSS_ENCODER_AVAILABLE else "llm"
+        if RERANK_BACKEND == "cross_encoder" and not CROSS_ENCODER_AVAILABLE:
+            return "llm"
+        return RERANK_BACKEND
+
+    def default_budget_ms(self, backend: Optional[str] = None) -> float:
+        return RERANK_LLM_BUDGET_MS if (backend or self.backend) == "llm" else RERANK_BUDGET_MS
+
+    async def _cross_encoder(self):
+        if self._model is None:
+            async with self._model_lock:
+                if self._model is None:
+                    self._model = await asyncio.to_thread(CrossEncoder, RERANK_MODEL, device="cpu")
+        return self._model
+
+    async def _score_cross_encoder(self, query: str, passages: List[str]) -> List[float]:
+        model = await self._cross_encoder()
+        scores = await asyncio.to_thread(model.predict, [(query, passage) for passage in passages])
+        return [float(score) for score in scores]
+
+    async def _score_llm(self, query: str, passages: List[str]) -> List[float]:
+        numbered = "\n\n".join(f"[{i}] {passage}" for i, passage in enumerate(passages))
+        prompt = (
+            "Rate how relevant each passage is to the question on a scale from 0 to 10.\n"
+            f"Question: {query}\n\nPassages:\n{numbered}\n\n"
+            f"Reply with only a JSON array of {len(passages)} numbers, one per passage, in order."
+        )
+        response = await http_clients.get("llm_inference").post(
+            f"{SERVICES['llm_inference']}/generate",
+            json={"prompt": prompt, "model": RERANK_LLM_MODEL, "max_tokens": 8 * len(passages) + 16, "temperature": 0.0}
+        )
+        response.raise_for_status()
+        match = re.search(r"\[[^\]]*\]", response.json().get("text", ""))
+        scores = json.loads(match.group(0)) if match else []
+        if len(scores) != len(passages):
+            raise ValueError(f"LLM returned {len(scores)} scores for {len(passages)} passages")
+        return [float(score) for score in scores]
+
+    async def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_k: int = RERANK_TOP_K,
+        budget_ms: Optional[float] = None,
+    ):
+        """
+        Return (top_k results, report). Results carry `rerank_score` when they were
+        rescored. budget_ms defaults to the active backend's budget.
+        """
+        self._stats["requests"] += 1
+        backend = self.backend
+        if budget_ms is None:
+            budget_ms = self.default_budget_ms(backend)
+        report = {"backend": backend, "candidates": len(results), "top_k": top_k, "reranked": False, "budget_ms": budget_ms}
+        if backend == "none" or len(results) <= 1:
+            report["reason"] = "disabled" if backend == "none" else "too_few_candidates"
+            return results[:top_k], report
+
+        start = time.perf_counter()
+        scorer = self._score_cross_encoder if backend == "cross_encoder" else self._score_llm
+        passages = [str(result.get("content", ""))[:RERANK_MAX_PASSAGE_CHARS] for result in results]
+        batches = [
+            asyncio.create_task(scorer(query, passages[i:i + RERANK_BATCH_SIZE]))
+            for i in range(0, len(passages), RERANK_BATCH_SIZE)
+        ]
+        done, pending = await asyncio.wait(batches, timeout=budget_ms / 1000)
+        for task in pending:
+            task.cancel()
+
+        scores: List[Optional[float]] = []
+        error = None
+        for task in batches:
+            if task in done and task.exception() is None:
+                scores.extend(task.result())
+            else:
+                if task in done:
+                    error = task.exception()
+                scores.extend([None] * len(passages[len(scores):len(scores) + RERANK_BATCH_SIZE]))
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["total_time_ms"] += elapsed_ms
+        report["latency_ms"] = round(elapsed_ms, 2)
+        scored = sum(score is not None for score in scores)
+        self._stats["passages_scored"] += scored
+        if scored == 0:
+            self._stats["errors" if error else "fallbacks"] += 1
+            report["reason"] = f"error: {type(error).__name__}" if error else "budget_exceeded"
+            logger.warning(
+                f"Rerank skipped ({report['reason']}): {backend} scored none of {len(results)} passages "
+                f"within {budget_ms:.0f} ms; using vector order."
+            )
+            return results[:top_k], report
+
+        # Rescored candidates first, then anything the budget did not reach in vector order
+        ranked = sorted(
+            (
+                {**result, "rerank_score": score, "vector_rank": rank}
+                for rank, (result, score) in enumerate(zip(results, scores))
+                if score is not None
+            ),
+            key=lambda result: result["rerank_score"],
+            reverse=True,
+        )
+        ranked += [{**result, "vector_rank": rank} for rank, (result, score) in enumerate(zip(results, scores)) if score is None]
+        report["reranked"] = True
+        report["scored"] = scored
+        if scored < len(results):
+            self._stats["partial"] += 1
+            report["reason"] = f"error: {type(error).__name__}" if error else "budget_exceeded"
+            logger.warning(
+                f"Rerank partial ({report['reason']}): {backend} scored {scored} of {len(results)} passages "
+                f"within {budget_ms:.0f} ms."
+            )
+        else:
+            self._stats["reranked"] += 1
+        return ranked[:top_k], report
+
+    def metrics(self) -> Dict[str, Any]:
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "backend": self.backend,
+            "model": RERANK_MODEL if self.backend == "cross_encoder" else RERANK_LLM_MODEL,
+            "model_loaded": self._model is not None,
+            "budget_ms": self.default_budget_ms(),
+            "cross_encoder_available": CROSS_ENCODER_AVAILABLE,
+            "avg_time_ms": round(self._stats["total_time_ms"] / requests, 2) if requests else 0.0,
+        }
+
+reranker = Reranker()
+
+def format_context(results: List[Dict[str, Any]]) -> str:
+    """Render search results as numbered context passages for a prompt."""
+    return "\n\n".join(f"[{i + 1}] {result.get('content', '')}" for i, result in enumerate(results))
+
+# -------------------------------------------------------------------
 # Prompt Chain Manager
+# -------------------------------------------------------------------
+# Chains are DAGs declared in JSON (or YAML, with PyYAML installed) under
+# PROMPT_CHAINS_DIR. Each step names its inputs as references to chain inputs
+# ("input.text", "input.top_k?" for optional) or to other steps' results
+# ("extract.text"); a step starts as soon as everything it references is ready.
+try:
+    import yaml  # type: ignore
+except ModuleNotFoundError:
+    yaml = None
+
+PROMPT_CHAINS_DIR = os.getenv("PROMPT_CHAINS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_chains"))
+CHAIN_STEP_TIMEOUT = float(os.getenv("CHAIN_STEP_TIMEOUT", "30"))
+CHAIN_STEP_RETRIES = int(os.getenv("CHAIN_STEP_RETRIES", "1"))
+CHAIN_RETRY_BACKOFF = float(os.getenv("CHAIN_RETRY_BACKOFF", "0.5"))
+CHAIN_CACHE_TTL = float(os.getenv("CHAIN_CACHE_TTL", "600"))
+CHAIN_CACHE_MAX_ENTRIES = int(os.getenv("CHAIN_CACHE_MAX_ENTRIES", "2000"))
+CHAIN_STEP_TYPES = {"llm", "search", "rerank"}
+
+def validate_chain(definition: Dict[str, Any]) -> Dict[str, Any]:
+    """Check step ids, types and references, and reject cycles. Returns the definition."""
+    name = definition.get("name", "inline")
+    steps = definition.get("steps") or []
+    ids = [step.get("id") for step in steps]
+    if not steps or None in ids or len(set(ids)) != len(ids):
+        raise ValueError(f"Chain '{name}' needs steps with unique ids")
+    for step in steps:
+        if step.get("type") not in CHAIN_STEP_TYPES:
+            raise ValueError(f"Chain '{name}' step '{step['id']}' has unknown type {step.get('type')!r}")
+        if step["type"] == "llm" and not step.get("prompt"):
+            raise ValueError(f"Chain '{name}' step '{step['id']}' needs a prompt")
+        for ref in step.get("inputs", {}).values():
+            source = ref.split(".", 1)[0]
+            if source != "input" and source not in ids:
+                raise ValueError(f"Chain '{name}' step '{step['id']}' references unknown step '{source}'")
+    for ref in definition.get("outputs", {}).values():
+        if ref.split(".", 1)[0] not in ids + ["input"]:
+            raise ValueError(f"Chain '{name}' output references unknown step in {ref!r}")
+    # Kahn's algorithm: every step must become ready eventually
+    remaining = {step["id"]: _step_dependencies(step) for step in steps}
+    while remaining:
+        ready = [step_id for step_id, deps in remaining.items() if not deps & remaining.keys()]
+        if not ready:
+            raise ValueError(f"Chain '{name}' has a dependency cycle among {sorted(remaining)}")
+        for step_id in ready:
+            del remaining[step_id]
+    return definition
+
+def _step_dependencies(step: Dict[str, Any]) -> set:
+    return {ref.split(".", 1)[0] for ref in step.get("inputs", {}).values()} - {"input"}
+
+def load_prompt_chains(directory: str = PROMPT_CHAINS_DIR) -> Dict[str, Dict[str, Any]]:
+    """Load and validate every chain definition in the directory, keyed by name."""
+    chains = {}
+    if not os.path.isdir(directory):
+        logger.warning(f"Prompt chain directory {directory} not found.")
+        return chains
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        try:
+            with open(path) as f:
+                if filename.endswith(".json"):
+                    definition = json.load(f)
+                elif filename.endswith((".yaml", ".yml")) and yaml is not None:
+                    definition = yaml.safe_load(f)
+                else:
+                    continue
+            definition.setdefault("name", os.path.splitext(filename)[0])
+            chains[definition["name"]] = validate_chain(definition)
+        except Exception as e:
+            logger.error(f"Skipping prompt chain {filename}: {e}")
+    return chains
+
+prompt_chains = load_prompt_chains()
+
+class StepResultCache:
+    """LRU + TTL cache of step results keyed by a hash of the step definition and its resolved inputs."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def key(step: Dict[str, Any], inputs: Dict[str, Any]) -> str:
+        material = {"type": step["type"], "prompt": step.get("prompt"), "params": step.get("params", {}), "inputs": inputs}
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        self._stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries), "ttl": self.ttl}
+
+step_cache = StepResultCache(CHAIN_CACHE_TTL, CHAIN_CACHE_MAX_ENTRIES)
+
+def _resolve_ref(ref: str, chain_inputs: Dict[str, Any], results: Dict[str, Dict[str, Any]]):
+    optional = ref.endswith("?")
+    source, _, path = ref.rstrip("?").partition(".")
+    value: Any = chain_inputs if source == "input" else results[source]
+    for part in path.split(".") if path else []:
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif optional:
+            return None
+        else:
+            raise KeyError(f"'{ref}' is not available")
+    return value
+
+async def _run_step(step: Dict[str, Any], inputs: Dict[str, Any], user: dict) -> Dict[str, Any]:
+    params = step.get("params", {})
+    if step["type"] == "search":
+        response = await search_llamaindex({
+            "query": inputs.get("query", ""),
+            "namespace": inputs.get("namespace") or params.get("namespace", "default"),
+            "top_k": inputs.get("top_k") or params.get("top_k", 5)
+        })
+        response.raise_for_status()
+        return response.json()
+    if step["type"] == "rerank":
+        budget_ms = inputs.get("budget_ms") or params.get("budget_ms")
+        results, report = await reranker.rerank(
+            inputs.get("query", ""),
+            inputs.get("results") or [],
+            top_k=int(inputs.get("top_k") or params.get("top_k", RERANK_TOP_K)),
+            budget_ms=float(budget_ms) if budget_ms else None,
+        )
+        return {"results": results, "context_text": format_context(results), "rerank": report}
+    response = await http_clients.get("llm_inference").post(
+        f"{SERVICES['llm_inference']}/generate",
+        json={"prompt": step["prompt"].format(**inputs), "max_tokens": 256, **params},
+        headers={"X-Tenant-Id": user.get("tenant_id", "default")}
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def execute_chain(definition: Dict[str, Any], chain_inputs: Dict[str, Any], user: dict) -> Dict[str, Any]:
+    """
+    Run a validated chain as a DAG. Each step runs as soon as the steps it references
+    have finished, under its own timeout (timeout_s) with retries (retries) and
+    exponential backoff. Results are cached by input hash unless the step sets
+    "cache": false. When a step fails, its dependents are skipped and the chain fails.
+    """
+    chain_start = time.perf_counter()
+    steps = {step["id"]: step for step in definition["steps"]}
+    dependencies = {step_id: _step_dependencies(step) for step_id, step in steps.items()}
+    results: Dict[str, Dict[str, Any]] = {}
+    records: Dict[str, Dict[str, Any]] = {}
+    finished_at: Dict[str, float] = {}
+
+    async def run(step_id: str):
+        step = steps[step_id]
+        record = {"step": step_id, "type": step["type"], "attempts": 0, "cached": False}
+        records[step_id] = record
+        started = time.perf_counter()
+        record["started_ms"] = round((started - chain_start) * 1000, 1)
+        try:
+            inputs = {name: _resolve_ref(ref, chain_inputs, results) for name, ref in step.get("inputs", {}).items()}
+            use_cache = step.get("cache", True)
+            key = StepResultCache.key(step, inputs) if use_cache else None
+            result = step_cache.get(key) if use_cache else None
+            if result is not None:
+                record["cached"] = True
+            else:
+                retries = int(step.get("retries", CHAIN_STEP_RETRIES))
+                for attempt in range(retries + 1):
+                    record["attempts"] = attempt + 1
+                    try:
+                        result = await asyncio.wait_for(
+                            _run_step(step, inputs, user), float(step.get("timeout_s", CHAIN_STEP_TIMEOUT))
+                        )
+                        break
+                    except Exception as e:
+                        if attempt == retries:
+                            raise
+                        logger.warning(f"Chain step '{step_id}' attempt {attempt + 1} failed: {e!r}; retrying")
+                        await asyncio.sleep(CHAIN_RETRY_BACKOFF * (2 ** attempt))
+                if use_cache:
+                    step_cache.put(key, result)
+            results[step_id] = result
+            record["status"] = "success"
+            record["result"] = result
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = "Step timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+        finally:
+            finished_at[step_id] = time.perf_counter()
+            record["duration_ms"] = round((finished_at[step_id] - started) * 1000, 1)
+
+    pending = set(steps)
+    running: Dict[asyncio.Task, str] = {}
+    failed = False
+    while pending or running:
+        for step_id in sorted(pending):
+            if dependencies[step_id] <= results.keys():
+                pending.discard(step_id)
+                running[asyncio.create_task(run(step_id))] = step_id
+        if not running:
+            break
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            step_id = running.pop(task)
+            if records[step_id]["status"] != "success":
+                failed = True
+        if failed:
+            # Nothing new is scheduled once a step has failed; let running steps finish
+            pending.clear()
+    for step_id in steps:
+        records.setdefault(step_id, {"step": step_id, "type": steps[step_id]["type"], "status": "skipped"})
+
+    total_ms = (time.perf_counter() - chain_start) * 1000
+    chain_results = [records[step["id"]] for step in definition["steps"]]
+    # Longest dependency chain of step durations: the floor for total_ms
+    path_ms: Dict[str, float] = {}
+    for record in sorted(chain_results, key=lambda record: record.get("started_ms", float("inf"))):
+        step_id = record["step"]
+        path_ms[step_id] = record.get("duration_ms", 0) + max((path_ms.get(dep, 0) for dep in dependencies[step_id]), default=0)
+    outputs = {}
+    if not failed:
+        outputs = {name: _resolve_ref(ref, chain_inputs, results) for name, ref in definition.get("outputs", {}).items()}
+    return {
+        "status": "failed" if failed else "success",
+        "chain_type": definition.get("name", "inline"),
+        "outputs": outputs,
+        "chain_results": chain_results,
+        "timing": {
+            "total_ms": round(total_ms, 1),
+            "sum_of_steps_ms": round(sum(record.get("duration_ms", 0) for record in chain_results), 1),
+            "critical_path_ms": round(max(path_ms.values(), default=0), 1),
+        }
+    }
+
 @app.post("/api/prompt-chains/execute")
 async def execute_prompt_chain(
     request: PromptChainRequest,
     user: dict = Depends(get_current_user)
 ):
-    """Execute a prompt chain with multiple LLM calls"""
+    """Execute a declarative prompt chain, running independent steps concurrently"""
     try:
-        chain_results = []
-        
-        # Example prompt chains for different use cases
-        if request.chain_type == "document_analysis":
-            # Chain: Extract -> Summarize -> Classify -> Generate insights
-            steps = [
-                {"action": "extract", "prompt": "Extract key information from: {text}"},
-                {"action": "summarize", "prompt": "Summarize the following: {extracted_info}"},
-                {"action": "classify", "prompt": "Classify this document: {summary}"},
-                {"action": "insights", "prompt": "Generate insights for: {classification}"}
-            ]
-        elif request.chain_type == "rag_enhanced_qa":
-            # Chain: Retrieve -> Rerank -> Generate -> Validate
-            steps = [
-                {"action": "retrieve", "service": "llamaindex"},
-                {"action": "rerank", "service": "llm_inference"},
-                {"action": "generate", "service": "llm_inference"},
-                {"action": "validate", "service": "llm_inference"}
-            ]
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown chain type: {request.chain_type}")
-        
-        # Execute chain steps
-        context = request.inputs.copy()
-        for step in steps:
-            if step.get("service") == "llamaindex":
-                # Call LlamaIndex service
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{SERVICES['llamaindex']}/search",
-                        json={"query": context.get("query", ""), "top_k": 5}
-                    )
-                    step_result = response.json()
-            elif step.get("service") == "llm_inference":
-                # Call LLM service
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{SERVICES['llm_inference']}/generate",
-                        json={"prompt": step["prompt"].format(**context), "max_tokens": 256}
-                    )
-                    step_result = response.json()
-            else:
-                # Mock result for demonstration
-                step_result = {"result": f"Processed {step['action']} with context: {context}"}
-            
-            chain_results.append({"step": step["action"], "result": step_result})
-            context.update(step_result)
-        
-        return {"status": "success", "chain_results": chain_results}
-        
+        definition = validate_chain(request.definition) if request.definition else prompt_chains.get(request.chain_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if definition is None:
+        raise HTTPException(status_code=400, detail=f"Unknown chain type: {request.chain_type}")
+    missing = [name for name in definition.get("inputs", []) if name not in request.inputs]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing chain inputs: {', '.join(missing)}")
+    try:
+        result = await execute_chain(definition, request.inputs, user)
     except Exception as e:
         logger.error(f"Prompt chain execution error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    if result["status"] == "failed":
+        failed = next(record for record in result["chain_results"] if record.get("status") == "failed")
+        logger.error(f"Prompt chain '{result['chain_type']}' failed at step '{failed['step']}': {failed['error']}")
+        raise HTTPException(status_code=500, detail=result)
+    return result
 
-# n8n Workflow Integration
-@app.post("/api/workflows/execute")
-async def execute_workflow(
-    request: WorkflowRequest,
-    user: dict = Depends(get_current_user)
-):
-    """Execute n8n workflow (refactored for best practices)."""
-    if not N8N_API_KEY:
-        logger.error("N8N_API_KEY is not configured.")
-        raise HTTPException(status_code=500, detail="N8N integration is not configured.")
-    n8n_url = f"{SERVICES['n8n']}/api/v1/workflows/{request.workflow_id}/executions"
+@app.get("/api/prompt-chains")
+async def list_prompt_chains(user: dict = Depends(get_current_user)):
+    """List stored chain definitions and step cache counters."""
+    return {
+        "status": "success",
+        "chains": {
+            name: {
+                "description": definition.get("description", ""),
+                "inputs": definition.get("inputs", []),
+                "steps": [{"id": step["id"], "type": step["type"], "depends_on": sorted(_step_dependencies(step))} for step in definition["steps"]],
+            }
+            for name, definition in prompt_chains.items()
+        },
+        "step_cache": step_cache.metrics()
+    }
+
+# -------------------------------------------------------------------
+# Background jobs
+# -------------------------------------------------------------------
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./orchestration_jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_TENANT_CONCURRENCY = int(os.getenv("JOB_TENANT_CONCURRENCY", "2"))
+# Per-tenant overrides, e.g. "acme=4,trial=1"
+JOB_TENANT_LIMITS = {
+    tenant.strip(): int(limit)
+    for tenant, _, limit in (item.partition("=") for item in os.getenv("JOB_TENANT_LIMITS", "").split(","))
+    if tenant.strip() and limit.strip().isdigit()
+}
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "2.0"))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", "300"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "600"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_TERMINAL_STATES = {"succeeded", "failed"}
+
+class PermanentJobError(Exception):
+    """A job failure that retrying cannot fix (bad input, missing resource, rejected by upstream)."""
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code >= 500 or status_code in (408, 429)
+
+class JobQueue:
+    """
+    Durable background job queue backed by SQLite.
+
+    Endpoints submit a job and return its id straight away; a pool of worker
+    tasks claims queued jobs, runs the registered handler for the job kind and
+    records the result. At most `tenant_limit(tenant)` jobs per tenant run at
+    once. Failures are retried with exponential backoff and jitter until
+    `max_attempts`, except for PermanentJobError. Submitting again with the same
+    idempotency key (per tenant and kind) returns the existing job. Jobs left
+    `running` by a crash are re-queued on startup.
+    """
+
+    def __init__(self, path: str, workers: int, tenant_concurrency: int, tenant_limits: Dict[str, int], max_attempts: int):
+        self.path = path
+        self.workers = workers
+        self.tenant_concurrency = tenant_concurrency
+        self.tenant_limits = tenant_limits
+        self.max_attempts = max_attempts
+        self._handlers: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0, "retried": 0, "recovered": 0}
+        self._run_ms: List[float] = []
+
+    def register(self, kind: str, handler):
+        """Register `async handler(payload, user) -> dict` for a job kind."""
+        self._handlers[kind] = handler
+
+    def tenant_limit(self, tenant_id: str) -> int:
+        return self.tenant_limits.get(tenant_id, self.tenant_concurrency)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    tenant_id TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    payload_hash TEXT NOT NULL,
+                    idempotency_key TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    next_run_at REAL NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, next_run_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_tenant ON jobs (tenant_id, created_at)")
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency ON jobs (tenant_id, kind, idempotency_key) "
+                "WHERE idempotency_key IS NOT NULL"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        def ts(value):
+            return datetime.utcfromtimestamp(value).isoformat() + "Z" if value else None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "tenant_id": row["tenant_id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "idempotency_key": row["idempotency_key"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": ts(row["created_at"]),
+            "started_at": ts(row["started_at"]),
+            "finished_at": ts(row["finished_at"]),
+            "next_run_at": ts(row["next_run_at"]) if row["status"] == "queued" else None,
+        }
+
+    def _insert(self, kind: str, tenant_id: str, user: dict, payload: Dict[str, Any], idempotency_key: Optional[str]):
+        payload_json = json.dumps(payload, sort_keys=True, default=str)
+        payload_hash = hashlib.sha256(payload_json.encode()).hexdigest()
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE tenant_id = ? AND kind = ? AND idempotency_key = ?",
+                    (tenant_id, kind, idempotency_key)
+                ).fetchone()
+                if row is not None:
+                    if row["payload_hash"] != payload_hash:
+                        raise HTTPException(status_code=409, detail="Idempotency-Key was already used with a different request body.")
+                    return self._to_dict(row), False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, tenant_id, user, payload, payload_hash, idempotency_key, status, "
+                "max_attempts, next_run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, tenant_id, json.dumps(user, default=str), payload_json, payload_hash,
+                 idempotency_key, self.max_attempts, now, now, now)
+            )
+            conn.commit()
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+
+    async def submit(self, kind: str, user: dict, payload: Dict[str, Any], tenant_id: Optional[str] = None,
+                     idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Persist a job and wake a worker. Returns the job record plus `created` (False for an idempotent replay)."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        tenant_id = tenant_id or user.get("tenant_id", "default")
+        job, created = await asyncio.to_thread(self._insert, kind, tenant_id, user, payload, idempotency_key)
+        if created:
+            self._stats["submitted"] += 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+        else:
+            self._stats["deduplicated"] += 1
+        return {**job, "created": created}
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _list(self, tenant_id: Optional[str], status: Optional[str], kind: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for column, value in (("tenant_id", tenant_id), ("status", status), ("kind", kind)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    async def list(self, tenant_id: Optional[str] = None, status: Optional[str] = None,
+                   kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list, tenant_id, status, kind, limit)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Mark the oldest due job whose tenant is under its concurrency limit as running."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            running = dict(conn.execute(
+                "SELECT tenant_id, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY tenant_id"
+            ).fetchall())
+            blocked = [tenant for tenant, count in running.items() if count >= self.tenant_limit(tenant)]
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = 'queued' AND next_run_at <= ? "
+                f"AND tenant_id NOT IN ({','.join('?' * len(blocked))}) ORDER BY next_run_at LIMIT 1",
+                (now, *blocked)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ? WHERE id = ?",
+                (now, now, row["id"])
+            )
+            conn.commit()
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]], error: Optional[str], next_run_at: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, next_run_at = COALESCE(?, next_run_at), "
+                "finished_at = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result, default=str) if result is not None else None, error,
+                 next_run_at, now if status in JOB_TERMINAL_STATES else None, now, job_id)
+            )
+            conn.commit()
+
+    def _recover(self) -> int:
+        """Re-queue jobs a previous process left running and purge old finished jobs."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            recovered = conn.execute(
+                "UPDATE jobs SET status = 'queued', next_run_at = ?, updated_at = ? WHERE status = 'running'", (now, now)
+            ).rowcount
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (now - JOB_RETENTION_DAYS * 86400,)
+            )
+            conn.commit()
+        return recovered
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(JOB_RETRY_BASE * (2 ** (attempts - 1)), JOB_RETRY_MAX)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def start(self):
+        recovered = await asyncio.to_thread(self._recover)
+        if recovered:
+            self._stats["recovered"] += recovered
+            logger.info(f"Re-queued {recovered} jobs interrupted by the previous shutdown.")
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop claiming jobs; jobs still running are re-queued on the next startup."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                row = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                row = None
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(row)
+            # A finished job may unblock its tenant's queued jobs for the other workers
+            self._wakeup.set()
+
+    async def _execute(self, row: sqlite3.Row):
+        job_id, kind, attempts = row["id"], row["kind"], row["attempts"]
+        start = time.perf_counter()
+        try:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise PermanentJobError(f"No handler registered for job kind '{kind}'")
+            result = await asyncio.wait_for(handler(json.loads(row["payload"]), json.loads(row["user"])), JOB_TIMEOUT)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else (str(e) or type(e).__name__)
+            permanent = isinstance(e, PermanentJobError)
+            if not permanent and attempts < row["max_attempts"]:
+                delay = self._retry_delay(attempts)
+                self._stats["retried"] += 1
+                logger.warning(f"Job {job_id} ({kind}) attempt {attempts} failed: {error}; retrying in {delay:.1f}s")
+                await asyncio.to_thread(self._finish, job_id, "queued", None, error, time.time() + delay)
+            else:
+                self._stats["failed"] += 1
+                logger.error(f"Job {job_id} ({kind}) failed after {attempts} attempts: {error}")
+                await asyncio.to_thread(self._finish, job_id, "failed", None, error)
+            return
+        self._stats["succeeded"] += 1
+        self._run_ms = (self._run_ms + [(time.perf_counter() - start) * 1000])[-500:]
+        await asyncio.to_thread(self._finish, job_id, "succeeded", result, None)
+
+    def _counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    async def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "by_status": await asyncio.to_thread(self._counts),
+            "workers": self.workers,
+            "tenant_concurrency": self.tenant_concurrency,
+            "tenant_limits": self.tenant_limits,
+            "avg_run_ms": round(sum(self._run_ms) / len(self._run_ms), 1) if self._run_ms else 0.0,
+        }
+
+job_queue = JobQueue(JOB_DB_PATH, JOB_WORKERS, JOB_TENANT_CONCURRENCY, JOB_TENANT_LIMITS, JOB_MAX_ATTEMPTS)
+
+def job_accepted(job: Dict[str, Any]) -> Dict[str, Any]:
+    """202 body for a submitted job: its id plus where to poll or subscribe for status."""
+    return {
+        "status": "accepted",
+        "job_id": job["job_id"],
+        "job_status": job["status"],
+        "created": job.pop("created"),
+        "status_url": f"/api/jobs/{job['job_id']}",
+        "events_url": f"/api/jobs/{job['job_id']}/events",
+    }
+
+def raise_for_job_status(response: httpx.Response, service: str):
+    """Raise PermanentJobError for 4xx responses that will not change on retry, HTTPStatusError for the rest."""
+    if response.status_code >= 400 and not is_retryable_status(response.status_code):
+        raise PermanentJobError(f"{service} returned {response.status_code}: {response.text[:500]}")
+    response.raise_for_status()
+
+# n8n Workflow Integration
+N8N_RETRYABLE_STATUSES = (429, 503)
+
+async def run_n8n_workflow_job(payload: Dict[str, Any], user: dict) -> Dict[str, Any]:
+    """Job handler: check the workflow exists in n8n, then start an execution."""
+    workflow_id = payload["workflow_id"]
+    if not N8N_API_KEY:
+        raise PermanentJobError("N8N integration is not configured.")
     headers = {"X-N8N-API-Key": N8N_API_KEY}
+    client = http_clients.get("n8n")
 
     # Check workflow existence
+    wf_resp = await client.get(f"{SERVICES['n8n']}/api/v1/workflows/{workflow_id}", headers=headers, timeout=10.0)
+    if wf_resp.status_code == 404:
+        logger.error(f"Workflow {workflow_id} not found in N8N.")
+        audit_event(user, "n8n_workflow_execute", "n8n", {"workflow_id": workflow_id, "status": "error", "error": "not found"})
+        raise PermanentJobError("Workflow not found in N8N.")
+    raise_for_job_status(wf_resp, "n8n")
+
+    # Starting an execution is not idempotent, so the job is retried only when n8n
+    # cannot have started the workflow: the connection was never made, or n8n
+    # rejected the request outright (429/503). A timeout or dropped connection after
+    # the body was sent may have started it, so the job fails instead of running twice.
     try:
-        async with httpx.AsyncClient() as client:
-            wf_check_url = f"{SERVICES['n8n']}/api/v1/workflows/{request.workflow_id}"
-            wf_resp = await client.get(wf_check_url, headers=headers, timeout=10.0)
-            if wf_resp.status_code != 200:
-                logger.error(f"Workflow {request.workflow_id} not found in N8N.")
-                raise HTTPException(status_code=404, detail="Workflow not found in N8N.")
+        try:
+            response = await client.post(f"{SERVICES['n8n']}/api/v1/workflows/{workflow_id}/executions", headers=headers, json=payload["inputs"])
+        except httpx.RequestError as e:
+            if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+                raise
+            raise PermanentJobError(f"n8n execution outcome unknown ({type(e).__name__}: {e}); not retried to avoid a duplicate run")
+        if response.status_code >= 400 and response.status_code not in N8N_RETRYABLE_STATUSES:
+            raise PermanentJobError(f"n8n returned {response.status_code}: {response.text[:500]}")
+        response.raise_for_status()
     except Exception as e:
-        logger.error(f"Error checking workflow existence: {e}")
-        raise HTTPException(status_code=502, detail="Could not verify workflow existence.")
+        logger.error(f"Error executing N8N workflow {workflow_id}: {e}")
+        audit_event(user, "n8n_workflow_execute", "n8n", {"workflow_id": workflow_id, "status": "error", "error": str(e)})
+        raise
+    logger.info(f"Successfully executed N8N workflow {workflow_id}.")
+    audit_event(user, "n8n_workflow_execute", "n8n", {"workflow_id": workflow_id, "status": "success"})
+    return {"execution_data": response.json()}
+
+job_queue.register("n8n_workflow", run_n8n_workflow_job)
 
+@app.post("/api/workflows/execute", status_code=202)
+async def execute_workflow(
+    request: WorkflowRequest,
+    user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Queue an n8n workflow execution and return its job id; the result is on /api/jobs/{job_id}."""
+    if not N8N_API_KEY:
+        logger.error("N8N_API_KEY is not configured.")
+        raise HTTPException(status_code=500, detail="N8N integration is not configured.")
     workflow_payload = request.inputs.copy()
     workflow_payload.update({
         "tenant_id": request.tenant_id,
         "user_id": user.get("user_id")
     })
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(n8n_url, headers=headers, json=workflow_payload, timeout=30.0)
-            response.raise_for_status()
-        logger.info(f"Successfully executed N8N workflow {request.workflow_id}. Response: {response.json()}")
-        # Audit log success
-        if supabase:
-            try:
-                supabase.table("audit_logs").insert({
-                    "tenant_id": user.get("tenant_id", "default"),
-                    "user_id": user.get("user_id"),
-                    "action": "n8n_workflow_execute",
-                    "resource_type": "n8n",
-                    "details": {"workflow_id": request.workflow_id, "status": "success"}
-                }).execute()
-            except Exception as log_err:
-                logger.warning(f"Failed to write audit log: {log_err}")
-        return {"status": "success", "execution_data": response.json()}
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error executing N8N workflow {request.workflow_id}: {e.response.status_code} - {e.response.text}")
-        if supabase:
-            try:
-                supabase.table("audit_logs").insert({
-                    "tenant_id": user.get("tenant_id", "default"),
-                    "user_id": user.get("user_id"),
-                    "action": "n8n_workflow_execute",
-                    "resource_type": "n8n",
-                    "details": {"workflow_id": request.workflow_id, "status": "error", "error": e.response.text}
-                }).execute()
-            except Exception as log_err:
-                logger.warning(f"Failed to write audit log: {log_err}")
-        raise HTTPException(status_code=e.response.status_code, detail=f"Error from N8N: {e.response.text}")
-    except httpx.RequestError as e:
-        logger.error(f"Request error executing N8N workflow {request.workflow_id}: {e}")
-        if supabase:
-            try:
-                supabase.table("audit_logs").insert({
-                    "tenant_id": user.get("tenant_id", "default"),
-                    "user_id": user.get("user_id"),
-                    "action": "n8n_workflow_execute",
-                    "resource_type": "n8n",
-                    "details": {"workflow_id": request.workflow_id, "status": "error", "error": str(e)}
-                }).execute()
-            except Exception as log_err:
-                logger.warning(f"Failed to write audit log: {log_err}")
-        raise HTTPException(status_code=503, detail=f"Could not connect to N8N service: {e}")
-    except Exception as e:
-        logger.error(f"An unexpected error occurred while executing N8N workflow {request.workflow_id}: {e}")
-        if supabase:
-            try:
-                supabase.table("audit_logs").insert({
-                    "tenant_id": user.get("tenant_id", "default"),
-                    "user_id": user.get("user_id"),
-                    "action": "n8n_workflow_execute",
-                    "resource_type": "n8n",
-                    "details": {"workflow_id": request.workflow_id, "status": "error", "error": str(e)}
-                }).execute()
-            except Exception as log_err:
-                logger.warning(f"Failed to write audit log: {log_err}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+    job = await job_queue.submit(
+        "n8n_workflow", user, {"workflow_id": request.workflow_id, "inputs": workflow_payload},
+        tenant_id=request.tenant_id, idempotency_key=idempotency_key
+    )
+    return job_accepted(job)
 
 # Enhanced RAG with LLM integration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Off by default: similarity is lexical (character trigrams), not an embedding model,
+# so enable it only for domains where near-duplicate phrasings are common and safe
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_MAX_CANDIDATES = int(os.getenv("RESPONSE_CACHE_MAX_CANDIDATES", "32"))
+# Regulated domains never serve answers generated for another request
+RESPONSE_CACHE_DISABLED_DOMAINS = {
+    d.strip() for d in os.getenv("RESPONSE_CACHE_DISABLED_DOMAINS", "legal,finance,compliance_audit,healthcare_pharma").split(",") if d.strip()
+}
+NEGATION_PATTERN = re.compile(r"\b(?:not|no|never|none|nor|without|cannot)\b|n['’]t\b", re.IGNORECASE)
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+def query_guard(query: str) -> tuple:
+    """
+    The parts of a query a near-duplicate must match exactly: its numbers (years,
+    order ids, amounts) and whether it is negated. Trigram similarity barely
+    moves when these change, but the answer does.
+    """
+    return tuple(re.findall(r"\d+(?:[.,]\d+)*", query)), len(NEGATION_PATTERN.findall(query)) % 2
+
+def query_vector(normalized: str, dims: int = 1024) -> Dict[int, float]:
+    """
+    Unit-length hashed character-trigram vector of a normalized query. Cheap and
+    local, and good enough to match near-duplicate phrasings of one question.
+    """
+    counts: Dict[int, float] = {}
+    padded = f" {normalized} "
+    for i in range(len(padded) - 2):
+        bucket = int(hashlib.md5(padded[i:i + 3].encode()).hexdigest()[:8], 16) % dims
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+def _cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+class ResponseCache:
+    """
+    LRU + TTL cache of enhanced RAG responses keyed by scope (see
+    response_cache_scope) and normalized query. On an exact miss, an optional
+    similarity lookup serves the closest stored answer in the same scope when
+    its cosine similarity clears the threshold and its numbers and negation
+    match. Each scope keeps an inverted index from trigram bucket to entries,
+    so only the RESPONSE_CACHE_MAX_CANDIDATES entries sharing the most trigrams
+    are scored. Bounded by entry count and approximate bytes.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int, semantic: bool, threshold: float, disabled_domains,
+                 max_candidates: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.semantic = semantic
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.disabled_domains = set(disabled_domains)
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._index: Dict[tuple, Dict[int, set]] = {}  # scope -> trigram bucket -> keys
+        self._bytes = 0
+        self._stats = {
+            "exact_hits": 0, "semantic_hits": 0, "guard_rejections": 0, "misses": 0, "bypassed": 0,
+            "stores": 0, "evictions": 0, "expirations": 0
+        }
+
+    def enabled_for(self, domain: str) -> bool:
+        return domain not in self.disabled_domains
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry["size"]
+        index = self._index.get(key[0], {})
+        for bucket in entry["vector"]:
+            keys = index.get(bucket)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[bucket]
+        if not index:
+            self._index.pop(key[0], None)
+
+    def _candidates(self, scope: tuple, vector: Dict[int, float]) -> List[tuple]:
+        """Entries in `scope` sharing the most trigram buckets with `vector`."""
+        index = self._index.get(scope)
+        if not index:
+            return []
+        overlap: Dict[tuple, int] = {}
+        for bucket in vector:
+            for key in index.get(bucket, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+        return sorted(overlap, key=overlap.get, reverse=True)[:self.max_candidates]
+
+    def get(self, scope: tuple, query: str):
+        """Return (response, "exact"|"semantic", similarity) or (None, "miss", None)."""
+        normalized = normalize_query(query)
+        key = (scope, normalized)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                self._stats["exact_hits"] += 1
+                return entry["response"], "exact", 1.0
+            self._remove(key)
+            self._stats["expirations"] += 1
+        if self.semantic:
+            vector = query_vector(normalized)
+            guard = query_guard(query)
+            best_key, best_score, guarded = None, self.threshold, False
+            for other_key in self._candidates(scope, vector):
+                other = self._entries[other_key]
+                if other["expires_at"] <= now:
+                    self._remove(other_key)
+                    self._stats["expirations"] += 1
+                    continue
+                score = _cosine(vector, other["vector"])
+                if score < best_score:
+                    continue
+                if other["guard"] != guard:
+                    guarded = True
+                    continue
+                best_key, best_score = other_key, score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self._stats["semantic_hits"] += 1
+                return self._entries[best_key]["response"], "semantic", round(best_score, 4)
+            if guarded:
+                self._stats["guard_rejections"] += 1
+        self._stats["misses"] += 1
+        return None, "miss", None
+
+    def put(self, scope: tuple, query: str, response: Dict[str, Any]):
+        normalized = normalize_query(query)
+        key = (scope, normalized)
+        size = len(json.dumps(response, default=str))
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        vector = query_vector(normalized) if self.semantic else {}
+        self._entries[key] = {
+            "response": response,
+            "vector": vector,
+            "guard": query_guard(query),
+            "expires_at": time.monotonic() + self.ttl,
+            "size": size
+        }
+        index = self._index.setdefault(scope, {})
+        for bucket in vector:
+            index.setdefault(bucket, set()).add(key)
+        self._bytes += size
+        self._stats["stores"] += 1
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def record_bypass(self):
+        self._stats["bypassed"] += 1
+
+    def invalidate(self, domain: Optional[str] = None) -> int:
+        keys = [k for k in self._entries if domain is None or k[0][0] == domain]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self._stats["exact_hits"] + self._stats["semantic_hits"] + self._stats["misses"]
+        hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "semantic": self.semantic,
+            "disabled_domains": sorted(self.disabled_domains),
+        }
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_SEMANTIC,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_DISABLED_DOMAINS,
+    RESPONSE_CACHE_MAX_CANDIDATES
+)
+
+def response_cache_scope(request: RAGRequest, model: str, stream: bool = False) -> tuple:
+    """
+    Everything besides the query that changes the answer: only entries in the same scope are reused.
+    Streamed answers never cascade, so they share the scope of non-cascaded answers.
+    """
+    return (
+        request.domain,
+        model,
+        request.top_k,
+        request.use_llm,
+        request.context_token_budget or CONTEXT_TOKEN_BUDGET,
+        not stream and cascade_policy(request.domain, model, request.cascade) is not None
+    )
+
+def _use_response_cache(request: RAGRequest) -> bool:
+    return RESPONSE_CACHE_ENABLED and bool(request.use_cache) and response_cache.enabled_for(request.domain)
+
+# -------------------------------------------------------------------
+# Context packing
+# -------------------------------------------------------------------
+# Tokenizers are loaded by common.tokenizer_loading, as in the inference service.
+# Without one, token counts are estimated at ~4 characters per token.
+MODEL_TOKENIZERS = {
+    "llama3-70b": os.getenv("LLAMA3_TOKENIZER", "meta-llama/Meta-Llama-3-70B-Instruct"),
+    "mistral-7b": os.getenv("MISTRAL_TOKENIZER", "mistralai/Mistral-7B-Instruct-v0.2"),
+}
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2048"))
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", "64"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+CHARS_PER_TOKEN = 4
+
+class TokenCounter:
+    """Counts and truncates text in a model's tokens. One instance per model, shared."""
+
+    def __init__(self, model: str, tokenizer=None, source: str = "estimate"):
+        self.model = model
+        self._tokenizer = tokenizer
+        self.source = source
+
+    def count(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._tokenizer is not None:
+            encoding = self._tokenizer.encode(text, add_special_tokens=False)
+            if len(encoding.ids) <= max_tokens:
+                return text
+            return text[:encoding.offsets[max_tokens - 1][1]] if max_tokens > 0 else ""
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+class TokenCounterRegistry:
+    """Loads each model's tokenizer once, off the event loop; failures fall back to estimates."""
+
+    def __init__(self):
+        self._counters: Dict[str, TokenCounter] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def _load(self, model: str) -> TokenCounter:
+        name = MODEL_TOKENIZERS.get(model)
+        tokenizer, reason = tokenizer_loading.load_tokenizer(name)
+        if tokenizer is not None:
+            return TokenCounter(model, tokenizer, f"tokenizer:{name}")
+        logger.warning(
+            f"Token counts for '{model}' are ESTIMATED at {CHARS_PER_TOKEN} chars/token: {reason}. "
+            "Context budgets may overflow; set HF_TOKEN or point the model's *_TOKENIZER at a tokenizer.json."
+        )
+        return TokenCounter(model)
+
+    async def _load_once(self, model: str) -> TokenCounter:
+        try:
+            counter = await asyncio.to_thread(self._load, model)
+            self._counters[model] = counter
+            return counter
+        finally:
+            self._loading.pop(model, None)
+
+    async def get(self, model: str) -> TokenCounter:
+        counter = self._counters.get(model)
+        if counter is not None:
+            return counter
+        loading = self._loading.get(model)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load_once(model))
+            self._loading[model] = loading
+        return await asyncio.shield(loading)
+
+token_counters = TokenCounterRegistry()
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = normalize_query(text).split()
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+def pack_context(results: List[Dict[str, Any]], counter: TokenCounter, budget: int):
+    """
+    Choose the context for a prompt: highest-scoring chunks first, skipping chunks
+    that mostly repeat one already chosen (overlapping splits, duplicate documents),
+    and stopping at `budget` tokens. A chunk that does not fit is truncated when at
+    least CONTEXT_MIN_CHUNK_TOKENS remain, otherwise skipped.
+    Returns (context text, chosen results, usage report).
+    """
+    ranked = sorted(results, key=lambda result: result.get("score") or 0.0, reverse=True)
+    chosen, chosen_shingles, parts = [], [], []
+    used = 0
+    report = {
+        "tokenizer": counter.source,
+        "budget_tokens": budget,
+        "chunks_in": len(results),
+        "duplicates_dropped": 0,
+        "dropped_for_budget": 0,
+        "truncated": 0,
+    }
+    for result in ranked:
+        content = (result.get("content") or "").strip()
+        if not content:
+            continue
+        shingles = _shingles(content)
+        if any(len(shingles & seen) / max(1, min(len(shingles), len(seen))) >= CONTEXT_DEDUP_THRESHOLD for seen in chosen_shingles):
+            report["duplicates_dropped"] += 1
+            continue
+        separator = "\n\n" if parts else ""
+        tokens = counter.count(separator + content)
+        remaining = budget - used
+        if tokens > remaining:
+            if remaining < CONTEXT_MIN_CHUNK_TOKENS:
+                report["dropped_for_budget"] += 1
+                continue
+            content = counter.truncate(content, remaining - counter.count(separator))
+            tokens = counter.count(separator + content)
+            report["truncated"] += 1
+        parts.append(separator + content)
+        chosen.append(result)
+        chosen_shingles.append(shingles)
+        used += tokens
+    report["chunks_used"] = len(chosen)
+    report["context_tokens"] = used
+    return "".join(parts), chosen, report
+
+async def build_rag_context(request: RAGRequest, model: str, rag_results: Dict[str, Any], system_prompt: str):
+    """
+    Pack retrieved chunks for `model` and return the /generate fields plus a context usage report.
+    System prompt, context and question travel as separate fields so the inference
+    service can lay them out in that order, keeping each domain's prompt prefix
+    identical across requests for vLLM's prefix cache.
+    """
+    counter = await token_counters.get(model)
+    budget = request.context_token_budget or CONTEXT_TOKEN_BUDGET
+    context, _, report = pack_context(rag_results.get("results", []), counter, budget)
+    report["model"] = model
+    report["system_tokens"] = counter.count(system_prompt)
+    report["prompt_tokens"] = report["system_tokens"] + report["context_tokens"] + counter.count(request.query)
+    return {"system_prompt": system_prompt, "context": context, "prompt": request.query}, report
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def iter_sse_events(response: httpx.Response):
+    """Yield (event, data) pairs from an upstream server-sent event stream."""
+    event, data_lines = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].strip())
+    if data_lines:
+        yield event, json.loads("\n".join(data_lines))
+
+# Model cascade
+# Domains with cascading enabled answer with CASCADE_SMALL_MODEL first; the
+# inference service escalates to the domain's model when the small answer is
+# too short, reads as a refusal or has a low mean token logprob. Weak retrieval
+# (top score under min_retrieval_score) goes straight to the domain's model.
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "true").lower() == "true"
+CASCADE_SMALL_MODEL = os.getenv("CASCADE_SMALL_MODEL", "mistral-7b")
+CASCADE_POLICIES = {
+    "default": {"enabled": True, "min_retrieval_score": 0.3, "min_mean_logprob": -1.0, "min_answer_chars": 40, "refusal_check": True},
+    "customer_support": {"min_retrieval_score": 0.25, "min_mean_logprob": -1.2},
+    "hr_policy": {"min_retrieval_score": 0.25},
+    "marketing_insights": {"min_mean_logprob": -1.4},
+    "sales_support": {"min_mean_logprob": -1.2},
+    "engineering_docs": {"min_retrieval_score": 0.35, "min_mean_logprob": -0.8},
+    "operations_maintenance": {"min_retrieval_score": 0.35, "min_mean_logprob": -0.8},
+    # Regulated domains stay on the large model unless overridden
+    "legal": {"enabled": False},
+    "finance": {"enabled": False},
+    "compliance_audit": {"enabled": False},
+    "healthcare_pharma": {"enabled": False},
+}
+# JSON overrides merged per domain, e.g. '{"legal": {"enabled": true, "min_mean_logprob": -0.6}}'
+try:
+    for _domain, _override in json.loads(os.getenv("CASCADE_POLICIES_JSON", "{}")).items():
+        CASCADE_POLICIES.setdefault(_domain, {}).update(_override)
+except (ValueError, AttributeError) as e:
+    logger.error(f"Ignoring invalid CASCADE_POLICIES_JSON: {e}")
+
+def cascade_policy(domain: str, model: str, requested: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """Cascade settings for a domain whose configured model is `model`, or None when it should not cascade.
+    A request can opt out of its domain's cascade but not into a disabled one."""
+    policy = {**CASCADE_POLICIES["default"], **CASCADE_POLICIES.get(domain, {})}
+    if not CASCADE_ENABLED or not policy["enabled"] or requested is False or model == CASCADE_SMALL_MODEL:
+        return None
+    return policy
+
+class CascadeMetrics:
+    """Per-domain counts of answers served by the small model vs escalated (by reason)."""
+
+    def __init__(self):
+        self._domains: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, domain: str, report: Optional[Dict[str, Any]]):
+        if report is None:
+            return
+        stats = self._domains.setdefault(domain, {"requests": 0, "small_answered": 0, "escalated": 0, "reasons": {}})
+        stats["requests"] += 1
+        stats["escalated" if report.get("escalated") else "small_answered"] += 1
+        for reason in report.get("reasons", []):
+            stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        domains = {
+            domain: {**stats, "reasons": dict(stats["reasons"]), "escalation_rate": round(stats["escalated"] / stats["requests"], 4)}
+            for domain, stats in self._domains.items()
+        }
+        requests = sum(stats["requests"] for stats in self._domains.values())
+        escalated = sum(stats["escalated"] for stats in self._domains.values())
+        return {
+            "enabled": CASCADE_ENABLED,
+            "small_model": CASCADE_SMALL_MODEL,
+            "requests": requests,
+            "escalation_rate": round(escalated / requests, 4) if requests else 0.0,
+            "domains": domains,
+        }
+
+cascade_metrics = CascadeMetrics()
+
+def cascade_generate_fields(domain: str, model: str, policy: Dict[str, Any], rag_results: Dict[str, Any]):
+    """
+    Fields to add to a /generate call for a cascading domain, plus the cascade
+    report when retrieval is too weak to try the small model at all.
+    """
+    top_score = max((result.get("score") or 0.0 for result in rag_results.get("results", [])), default=0.0)
+    if top_score < policy["min_retrieval_score"]:
+        return {}, {"models_tried": [model], "escalated": True, "reasons": ["low_retrieval"], "top_retrieval_score": round(top_score, 4)}
+    return {
+        "cascade": {
+            "small_model": CASCADE_SMALL_MODEL,
+            "large_model": model,
+            "min_mean_logprob": policy["min_mean_logprob"],
+            "min_answer_chars": policy["min_answer_chars"],
+            "refusal_check": policy["refusal_check"],
+            "label": domain
+        }
+    }, None
+
+@app.get("/api/monitoring/cascade")
+async def get_cascade_metrics(user: dict = Depends(get_current_user)):
+    """Return per-domain cascade escalation rates and reasons."""
+    return {"status": "success", "cascade": cascade_metrics.snapshot()}
+
 @app.post("/api/rag/enhanced-query")
 async def enhanced_rag_query(
     request: RAGRequest,
@@ -463,58 +2571,176 @@ async def enhanced_rag_query(
     try:
         # Step 1: Retrieve from vector store
         # Fetch config for the requested domain
-        domain_config = get_domain_config(request.domain)
+        domain_config = await get_domain_config(request.domain)
         namespace = domain_config["namespace"]
         system_prompt = domain_config["system_prompt"]
         model = domain_config["model"]
 
-        async with httpx.AsyncClient() as client:
-            rag_response = await client.post(
-                f"{SERVICES['llamaindex']}/search",
-                json={
-                    "query": request.query,
-                    "namespace": namespace,
-                    "top_k": request.top_k
-                }
-            )
-            rag_results = rag_response.json()
+        use_cache = _use_response_cache(request)
+        if use_cache:
+            cached, kind, similarity = response_cache.get(response_cache_scope(request, model), request.query)
+            if cached is not None:
+                return {**cached, "query": request.query, "cache": kind, "cache_similarity": similarity}
+        else:
+            response_cache.record_bypass()
+
+        rag_response = await search_llamaindex({
+            "query": request.query,
+            "namespace": namespace,
+            "top_k": request.top_k
+        })
+        rag_response.raise_for_status()  # Never cache or answer from a /search error body
+        rag_results = rag_response.json()
         
         if not request.use_llm:
-            return {"status": "success", "results": rag_results}
+            result = {"status": "success", "results": rag_results}
+            if use_cache:
+                response_cache.put(response_cache_scope(request, model), request.query, result)
+            return {**result, "cache": "miss" if use_cache else "bypass"}
         
-        # Step 2: Generate enhanced response with LLM
-        context = "\n".join([result.get("content", "") for result in rag_results.get("results", [])])
-        enhanced_prompt = f"""Based on the following context, answer the question: {request.query}
-
-Context:
-{context}
-
-Answer:"""
+        # Step 2: Generate enhanced response with LLM from a token-budgeted context
+        prompt_fields, context_usage = await build_rag_context(request, model, rag_results, system_prompt)
+        cascade_fields, cascade_report = {}, None
+        policy = cascade_policy(request.domain, model, request.cascade)
+        if policy:
+            cascade_fields, cascade_report = cascade_generate_fields(request.domain, model, policy, rag_results)
         
-        async with httpx.AsyncClient() as client:
-            llm_response = await client.post(
-                f"{SERVICES['llm_inference']}/generate",
-                json={
-                    "prompt": enhanced_prompt,
-                    "system_prompt": system_prompt,
-                    "max_tokens": 512,
-                    "model": model
-                }
-            )
-            llm_result = llm_response.json()
+        llm_response = await http_clients.get("llm_inference").post(
+            f"{SERVICES['llm_inference']}/generate",
+            json={
+                **prompt_fields,
+                "max_tokens": 512,
+                "model": model,
+                **cascade_fields
+            },
+            headers={"X-Tenant-Id": user.get("tenant_id", "default")}
+        )
+        llm_result = llm_response.json()
+        if cascade_fields:
+            cascade_report = llm_result.get("cascade")
+        if llm_response.status_code == 200:
+            cascade_metrics.record(request.domain, cascade_report)
         
-        return {
+        result = {
             "status": "success",
             "query": request.query,
             "rag_results": rag_results,
             "enhanced_answer": llm_result.get("text", ""),
+            "model": llm_result.get("model", model),
+            "cascade": cascade_report,
+            "context_usage": context_usage,
             "confidence": 0.85  # Mock confidence score
         }
+        if use_cache and llm_response.status_code == 200:
+            response_cache.put(response_cache_scope(request, model), request.query, result)
+        return {**result, "cache": "miss" if use_cache else "bypass"}
         
     except Exception as e:
         logger.error(f"Enhanced RAG query error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/rag/enhanced-query/stream")
+async def enhanced_rag_query_stream(
+    request: RAGRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Streaming variant of /api/rag/enhanced-query. Emits server-sent events: one
+    `sources` event with the retrieved chunks, `token` events relayed from the
+    LLM service, then `done` with time-to-first-token and total latency.
+    """
+    return StreamingResponse(_stream_rag_answer(request, user.get("tenant_id", "default")), media_type="text/event-stream")
+
+async def _stream_rag_answer(request: RAGRequest, tenant_id: str = "default"):
+    start = time.perf_counter()
+    try:
+        domain_config = await get_domain_config(request.domain)
+        model = domain_config["model"]
+        use_cache = _use_response_cache(request)
+        if use_cache:
+            cached, kind, similarity = response_cache.get(response_cache_scope(request, model, stream=True), request.query)
+            if cached is not None:
+                yield sse_event("sources", {"query": request.query, "rag_results": cached.get("rag_results", cached.get("results")), "retrieval_ms": 0.0})
+                if request.use_llm:
+                    yield sse_event("token", {"text": cached.get("enhanced_answer", "")})
+                yield sse_event("done", {
+                    "model": model,
+                    "cache": kind,
+                    "cache_similarity": similarity,
+                    "ttft_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 1)
+                })
+                return
+        else:
+            response_cache.record_bypass()
+        rag_response = await search_llamaindex({
+            "query": request.query,
+            "namespace": domain_config["namespace"],
+            "top_k": request.top_k
+        })
+        rag_response.raise_for_status()  # Never cache or answer from a /search error body
+        rag_results = rag_response.json()
+        yield sse_event("sources", {
+            "query": request.query,
+            "rag_results": rag_results,
+            "retrieval_ms": round((time.perf_counter() - start) * 1000, 1)
+        })
+        if not request.use_llm:
+            if use_cache:
+                response_cache.put(response_cache_scope(request, model, stream=True), request.query, {"status": "success", "results": rag_results})
+            yield sse_event("done", {"latency_ms": round((time.perf_counter() - start) * 1000, 1)})
+            return
+
+        prompt_fields, context_usage = await build_rag_context(request, model, rag_results, domain_config["system_prompt"])
+        yield sse_event("context", context_usage)
+        ttft_ms = None
+        answer = []
+        async with http_clients.get("llm_inference").stream(
+            "POST",
+            f"{SERVICES['llm_inference']}/generate",
+            params={"stream": "true"},
+            json={
+                **prompt_fields,
+                "max_tokens": 512,
+                "model": model
+            },
+            headers={"X-Tenant-Id": tenant_id}
+        ) as llm_response:
+            llm_response.raise_for_status()
+            async for event, data in iter_sse_events(llm_response):
+                if event == "token":
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                    answer.append(data.get("text", ""))
+                    yield sse_event("token", data)
+                elif event == "error":
+                    yield sse_event("error", data)
+                    return
+                elif event == "done":
+                    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+                    logger.info(f"Streamed RAG answer for domain '{request.domain}': ttft_ms={ttft_ms} latency_ms={latency_ms}")
+                    if use_cache:
+                        response_cache.put(response_cache_scope(request, model, stream=True), request.query, {
+                            "status": "success",
+                            "query": request.query,
+                            "rag_results": rag_results,
+                            "enhanced_answer": "".join(answer),
+                            "model": model,
+                            "cascade": None,
+                            "context_usage": context_usage,
+                            "confidence": 0.85
+                        })
+                    yield sse_event("done", {
+                        **data,
+                        "cache": "miss" if use_cache else "bypass",
+                        "llm_ttft_ms": data.get("ttft_ms"),
+                        "ttft_ms": ttft_ms,
+                        "latency_ms": latency_ms
+                    })
+    except Exception as e:
+        logger.error(f"Enhanced RAG stream error: {str(e)}")
+        yield sse_event("error", {"detail": str(e)})
+
 # -------------------------------------------------------------------
 # Specification Validation Endpoint
 # -------------------------------------------------------------------
@@ -525,14 +2751,13 @@ async def validate_spec(
 ):
     """Validate a specification JSON via LLM service and log the result."""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{SERVICES['llm_inference']}/validate-spec",
-                json={"spec": spec},
-                timeout=60.0,
-            )
-            resp.raise_for_status()
-            validation_result = resp.json()
+        resp = await http_clients.get("llm_inference").post(
+            f"{SERVICES['llm_inference']}/validate-spec",
+            json={"spec": spec},
+            timeout=60.0,
+        )
+        resp.raise_for_status()
+        validation_result = resp.json()
     except Exception as e:
         logger.error(f"Spec validation service error: {e}")
         raise HTTPException(status_code=502, detail="Validation service unavailable")
@@ -540,12 +2765,12 @@ async def validate_spec(
     # Log into Supabase
     if supabase:
         try:
-            supabase.table("spec_validation_logs").insert({
+            await asyncio.to_thread(supabase.table("spec_validation_logs").insert({
                 "tenant_id": user.get("tenant_id", "default"),
                 "user_id": user.get("user_id"),
                 "status": validation_result.get("status", "unknown"),
                 "details": validation_result,
-            }).execute()
+            }).execute)
         except Exception as db_err:
             logger.warning(f"Failed to log spec validation result: {db_err}")
 
@@ -557,89 +2782,215 @@ async def validate_spec(
 # -------------------------------------------------------------------
 import base64
 
-@app.post("/api/git/pr")
+def github_headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"token {os.getenv('GITHUB_TOKEN')}",
+        "Accept": "application/vnd.github+json"
+    }
+
+async def run_git_pr_job(payload: Dict[str, Any], user: dict) -> Dict[str, Any]:
+    """
+    Job handler for /api/git/pr. Safe to retry: an existing branch is reused,
+    files are updated in place and an already open PR for the branch is returned.
+    """
+    if not os.getenv("GITHUB_TOKEN"):
+        raise PermanentJobError("GitHub integration not configured.")
+    headers = github_headers()
+    owner, repo_name = payload["repo"].split("/")
+    branch = payload["branch"]
+    base_branch = "main"
+    try:
+        client = http_clients.get("github")
+        # 1. Create branch from main
+        ref_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/git/refs/heads/{base_branch}"
+        ref_resp = await client.get(ref_url, headers=headers)
+        raise_for_job_status(ref_resp, "GitHub")
+        sha = ref_resp.json()["object"]["sha"]
+        new_ref_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/git/refs"
+        await client.post(new_ref_url, headers=headers, json={
+            "ref": f"refs/heads/{branch}",
+            "sha": sha
+        })
+        # 2. Create/update files
+        for path, content in payload["files"].items():
+            file_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/contents/{path}"
+            # Check if file exists for update
+            get_file_resp = await client.get(file_url+f"?ref={branch}", headers=headers)
+            exists = get_file_resp.status_code == 200
+            data = {
+                "message": f"Add/update {path}",
+                "content": base64.b64encode(content.encode()).decode(),
+                "branch": branch
+            }
+            if exists:
+                data["sha"] = get_file_resp.json()["sha"]
+            put_resp = await client.put(file_url, headers=headers, json=data)
+            raise_for_job_status(put_resp, "GitHub")
+        # 3. Create PR
+        pr_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/pulls"
+        pr_resp = await client.post(pr_url, headers=headers, json={
+            "title": payload["pr_title"],
+            "body": payload["pr_body"],
+            "head": branch,
+            "base": base_branch
+        })
+        pr_data = None
+        if pr_resp.status_code == 422:
+            # A previous attempt may already have opened it
+            open_resp = await client.get(pr_url, headers=headers, params={"head": f"{owner}:{branch}", "state": "open"})
+            if open_resp.status_code == 200 and open_resp.json():
+                pr_data = open_resp.json()[0]
+        if pr_data is None:
+            raise_for_job_status(pr_resp, "GitHub")
+            pr_data = pr_resp.json()
+    except Exception as e:
+        logger.error(f"GitHub PR creation error: {e}")
+        # Audit log failure
+        audit_event(user, "git_pr_create", "github", {"error": str(e)})
+        raise
+    # Audit log success
+    audit_event(user, "git_pr_create", "github", {"pr_url": pr_data.get("html_url")})
+    return {"pr_url": pr_data.get("html_url"), "pr_number": pr_data.get("number")}
+
+job_queue.register("git_pr", run_git_pr_job)
+
+@app.post("/api/git/pr", status_code=202)
 async def create_git_pr(
     repo: str,
     branch: str,
     files: Dict[str, str],
     pr_title: str,
     pr_body: str = "",
-    user: dict = Depends(get_current_user)
+    user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
-    """Create a GitHub PR with generated artifacts."""
-    GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-    if not GITHUB_TOKEN:
+    """Queue creation of a GitHub PR with generated artifacts and return its job id."""
+    if not os.getenv("GITHUB_TOKEN"):
         logger.error("GITHUB_TOKEN not set.")
         raise HTTPException(status_code=500, detail="GitHub integration not configured.")
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github+json"
+    if repo.count("/") != 1:
+        raise HTTPException(status_code=400, detail="repo must be 'owner/name'.")
+    job = await job_queue.submit("git_pr", user, {
+        "repo": repo,
+        "branch": branch,
+        "files": files,
+        "pr_title": pr_title,
+        "pr_body": pr_body
+    }, idempotency_key=idempotency_key)
+    return job_accepted(job)
+
+# -------------------------------------------------------------------
+# Job status
+# -------------------------------------------------------------------
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "0.5"))
+
+async def get_visible_job(job_id: str, user: dict) -> Dict[str, Any]:
+    """Fetch a job, hiding other tenants' jobs from non-admins."""
+    job = await job_queue.get(job_id)
+    if job is None or (job["tenant_id"] != user.get("tenant_id", "default") and user.get("role") != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Return a job's status, attempts and, once finished, its result or error."""
+    return {"status": "success", "job": await get_visible_job(job_id, user)}
+
+@app.get("/api/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    user: dict = Depends(get_current_user)
+):
+    """List the current tenant's most recent jobs."""
+    jobs = await job_queue.list(user.get("tenant_id", "default"), status, kind, max(1, min(limit, 500)))
+    return {"status": "success", "jobs": jobs}
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, user: dict = Depends(get_current_user)):
+    """
+    Server-sent events for one job: a `status` event whenever its status or
+    attempt count changes, then `done` with the final record.
+    """
+    job = await get_visible_job(job_id, user)
+
+    async def stream(job: Dict[str, Any]):
+        last = None
+        while True:
+            if (job["status"], job["attempts"]) != last:
+                last = (job["status"], job["attempts"])
+                yield sse_event("status", {key: job[key] for key in ("job_id", "status", "attempts", "error", "next_run_at")})
+            if job["status"] in JOB_TERMINAL_STATES:
+                yield sse_event("done", job)
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+            job = await job_queue.get(job_id) or job
+
+    return StreamingResponse(stream(job), media_type="text/event-stream")
+
+@app.get("/api/monitoring/jobs")
+async def get_job_metrics(user: dict = Depends(get_current_user)):
+    """Return job queue counters, jobs per status and worker/tenant limits."""
+    return {"status": "success", "jobs": await job_queue.metrics()}
+
+# -------------------------------------------------------------------
+# Domain config cache administration
+# -------------------------------------------------------------------
+@app.post("/api/admin/domains/{domain}/invalidate")
+async def invalidate_domain_config(domain: str, user: dict = Depends(get_current_user)):
+    """
+    Drop a cached domain config after its Supabase row is edited.
+    Use "*" to drop every entry. Suitable as a Supabase database webhook target.
+    """
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required.")
+    target = None if domain == "*" else domain
+    removed = domain_configs.invalidate(target)
+    broadcast = await domain_config_listener.publish(target)
+    return {"status": "success", "domain": domain, "removed": removed, "broadcast": broadcast}
+
+@app.delete("/api/admin/response-cache")
+async def invalidate_response_cache(domain: Optional[str] = None, user: dict = Depends(get_current_user)):
+    """Drop cached RAG answers for one domain (or all), e.g. after re-ingesting its documents."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required.")
+    return {"status": "success", "domain": domain, "removed": response_cache.invalidate(domain)}
+
+@app.get("/api/monitoring/response-cache")
+async def get_response_cache_metrics(user: dict = Depends(get_current_user)):
+    """Return hit/miss, eviction and size counters for the RAG response cache."""
+    return {"status": "success", "cache": response_cache.metrics()}
+
+@app.get("/api/monitoring/hedging")
+async def get_hedging_metrics(user: dict = Depends(get_current_user)):
+    """Return hedge rate, hedge wins and estimated latency saved for hedged calls."""
+    return {
+        "status": "success",
+        "enabled": hedge_settings.enabled,
+        "percentile": hedge_settings.percentile,
+        "budget": {"ratio": HEDGE_BUDGET_RATIO, "tokens": round(hedge_budget.tokens, 2), "burst": HEDGE_BUDGET_BURST},
+        "hedgers": {search_hedger.name: search_hedger.metrics()}
     }
-    owner, repo_name = repo.split("/")
-    base_branch = "main"
-    try:
-        async with httpx.AsyncClient() as client:
-            # 1. Create branch from main
-            ref_url = f"https://api.github.com/repos/{owner}/{repo_name}/git/refs/heads/{base_branch}"
-            ref_resp = await client.get(ref_url, headers=headers)
-            ref_resp.raise_for_status()
-            sha = ref_resp.json()["object"]["sha"]
-            new_ref_url = f"https://api.github.com/repos/{owner}/{repo_name}/git/refs"
-            await client.post(new_ref_url, headers=headers, json={
-                "ref": f"refs/heads/{branch}",
-                "sha": sha
-            })
-            # 2. Create/update files
-            for path, content in files.items():
-                file_url = f"https://api.github.com/repos/{owner}/{repo_name}/contents/{path}"
-                # Check if file exists for update
-                get_file_resp = await client.get(file_url+f"?ref={branch}", headers=headers)
-                exists = get_file_resp.status_code == 200
-                data = {
-                    "message": f"Add/update {path}",
-                    "content": base64.b64encode(content.encode()).decode(),
-                    "branch": branch
-                }
-                if exists:
-                    data["sha"] = get_file_resp.json()["sha"]
-                await client.put(file_url, headers=headers, json=data)
-            # 3. Create PR
-            pr_url = f"https://api.github.com/repos/{owner}/{repo_name}/pulls"
-            pr_resp = await client.post(pr_url, headers=headers, json={
-                "title": pr_title,
-                "body": pr_body,
-                "head": branch,
-                "base": base_branch
-            })
-            pr_resp.raise_for_status()
-            pr_data = pr_resp.json()
-    except Exception as e:
-        logger.error(f"GitHub PR creation error: {e}")
-        # Audit log failure
-        if supabase:
-            try:
-                supabase.table("audit_logs").insert({
-                    "tenant_id": user.get("tenant_id", "default"),
-                    "user_id": user.get("user_id"),
-                    "action": "git_pr_create",
-                    "resource_type": "github",
-                    "details": {"error": str(e)}
-                }).execute()
-            except Exception as log_err:
-                logger.warning(f"Failed to write audit log: {log_err}")
-        raise HTTPException(status_code=500, detail=f"GitHub PR error: {e}")
-    # Audit log success
-    if supabase:
-        try:
-            supabase.table("audit_logs").insert({
-                "tenant_id": user.get("tenant_id", "default"),
-                "user_id": user.get("user_id"),
-                "action": "git_pr_create",
-                "resource_type": "github",
-                "details": {"pr_url": pr_data.get("html_url")}
-            }).execute()
-        except Exception as log_err:
-            logger.warning(f"Failed to write audit log: {log_err}")
+
+@app.get("/api/monitoring/admission")
+async def get_admission_metrics(user: dict = Depends(get_current_user)):
+    """Return per-tenant admission limits, in-flight and queued requests, and rejections."""
+    return {"status": "success", **admission.metrics()}
+
+@app.put("/api/admin/tenants/{tenant_id}/admission")
+async def set_tenant_admission_limits(tenant_id: str, limits: AdmissionLimitsRequest, user: dict = Depends(get_current_user)):
+    """Set a tenant's requests-per-second and concurrency limits (e.g. from the wizard's scale targets)."""
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required.")
+    validate_admission_limits(limits)
+    admission.set_limits(tenant_id, limits.rps, limits.concurrency, limits.burst)
+    return {"status": "success", "tenant_id": tenant_id, "limits": admission.limits(tenant_id)}
+
+@app.get("/api/admin/domains/cache")
+async def get_domain_cache_metrics(user: dict = Depends(get_current_user)):
+    """Return hit/miss counters for the domain config cache."""
+    return {"status": "success", "cache": domain_configs.metrics()}
 
 # Monitoring and observability endpoints
 @app.get("/api/monitoring/metrics")
@@ -654,21 +3005,24 @@ async def get_metrics(user: dict = Depends(get_current_user)):
     }
     results = {}
     try:
-        async with httpx.AsyncClient() as client:
-            for key, prom_query in queries.items():
-                resp = await client.get(f"{prometheus_url}/api/v1/query", params={"query": prom_query}, timeout=10.0)
-                resp.raise_for_status()
-                data = resp.json()
-                value = None
-                if data.get("status") == "success" and data.get("data", {}).get("result"):
-                    value = float(data["data"]["result"][0]["value"][1])
-                results[key] = value
+        client = http_clients.get("monitoring")
+        for key, prom_query in queries.items():
+            resp = await client.get(f"{prometheus_url}/api/v1/query", params={"query": prom_query})
+            resp.raise_for_status()
+            data = resp.json()
+            value = None
+            if data.get("status") == "success" and data.get("data", {}).get("result"):
+                value = float(data["data"]["result"][0]["value"][1])
+            results[key] = value
         # Add compliance flags and last scan from Supabase if available
         compliance_flags = []
         last_scan = None
         if supabase:
             try:
-                compliance_resp = supabase.table("compliance_results").select("flag,scanned_at").eq("tenant_id", user.get("tenant_id", "default")).order("scanned_at", desc=True).limit(1).execute()
+                compliance_resp = await asyncio.to_thread(
+                    supabase.table("compliance_results").select("flag,scanned_at").eq("tenant_id", user.get("tenant_id", "default"))
+                    .order("scanned_at", desc=True).limit(1).execute
+                )
                 if compliance_resp.data and len(compliance_resp.data) > 0:
                     compliance_flags = [compliance_resp.data[0]["flag"]]
                     last_scan = compliance_resp.data[0]["scanned_at"]
@@ -690,6 +3044,21 @@ async def get_metrics(user: dict = Depends(get_current_user)):
         }
         return {"status": "success", "metrics": metrics, "note": "Prometheus unavailable, mock data returned."}
 
+@app.get("/api/monitoring/http-pools")
+async def get_http_pool_metrics(user: dict = Depends(get_current_user)):
+    """Return saturation and latency counters for the pooled downstream HTTP clients."""
+    return {"status": "success", "pools": http_clients.metrics(), "timestamp": datetime.utcnow()}
+
+@app.get("/api/monitoring/rerank")
+async def get_rerank_metrics(user: dict = Depends(get_current_user)):
+    """Return rerank backend, fallback and latency counters."""
+    return {"status": "success", "rerank": reranker.metrics(), "timestamp": datetime.utcnow()}
+
+@app.get("/api/monitoring/audit-log")
+async def get_audit_log_metrics(user: dict = Depends(get_current_user)):
+    """Return queue depth, write, drop and spill counters for the background audit writer."""
+    return {"status": "success", "audit_log": audit_log.metrics(), "timestamp": datetime.utcnow()}
+
 # Artifact generation
 # Attempt to use Jinja2 for templating; fall back to Python's built-in string.Template if unavailable.
 try:
@@ -701,49 +3070,44 @@ except ModuleNotFoundError:
         def render(self, **kwargs):  # type: ignore
             return self.safe_substitute(**kwargs)
 
-@app.post("/api/artifacts/generate")
-async def generate_artifacts(
-    spec: Dict[str, Any],
-    user: dict = Depends(get_current_user)
-):
-    """Generate deployment artifacts (K8s, Terraform, CI/CD, Compliance) based on specification"""
-    try:
-        artifacts = []
-        # Kubernetes manifest (as before)
-        if spec.get("deployment", {}).get("platform") == "kubernetes":
-            k8s_manifest = {
-                "apiVersion": "apps/v1",
-                "kind": "Deployment",
-                "metadata": {"name": f"{spec['domain']}-ai-platform"},
-                "spec": {
-                    "replicas": spec.get("scale", {}).get("replicas", 1),
-                    "selector": {"matchLabels": {"app": f"{spec['domain']}-ai"}},
-                    "template": {
-                        "metadata": {"labels": {"app": f"{spec['domain']}-ai"}},
-                        "spec": {
-                            "containers": [
-                                {
-                                    "name": "ai-service",
-                                    "image": f"ai-advisor/{spec['domain']}:latest",
-                                    "ports": [{"containerPort": 8000}]
-                                }
-                            ]
-                        }
+def build_artifacts(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Render deployment artifacts (K8s, Terraform, CI/CD, Compliance, n8n) for a specification."""
+    artifacts = []
+    # Kubernetes manifest (as before)
+    if spec.get("deployment", {}).get("platform") == "kubernetes":
+        k8s_manifest = {
+            "apiVersion": "apps/v1",
+            "kind": "Deployment",
+            "metadata": {"name": f"{spec['domain']}-ai-platform"},
+            "spec": {
+                "replicas": spec.get("scale", {}).get("replicas", 1),
+                "selector": {"matchLabels": {"app": f"{spec['domain']}-ai"}},
+                "template": {
+                    "metadata": {"labels": {"app": f"{spec['domain']}-ai"}},
+                    "spec": {
+                        "containers": [
+                            {
+                                "name": "ai-service",
+                                "image": f"ai-advisor/{spec['domain']}:latest",
+                                "ports": [{"containerPort": 8000}]
+                            }
+                        ]
                     }
                 }
             }
-            artifacts.append({"name": "k8s-deployment.yaml", "content": k8s_manifest})
-        # Terraform main.tf (Jinja2 template)
-        tf_template = Template('''
+        }
+        artifacts.append({"name": "k8s-deployment.yaml", "content": k8s_manifest})
+    # Terraform main.tf (Jinja2 template)
+    tf_template = Template('''
 resource "aws_s3_bucket" "ai_artifacts" {
   bucket = "{{ domain }}-ai-artifacts"
   acl    = "private"
 }
 ''')
-        tf_content = tf_template.render(domain=spec.get("domain", "project"))
-        artifacts.append({"name": "main.tf", "content": tf_content})
-        # CI/CD workflow (GitHub Actions YAML via Jinja2)
-        ci_template = Template('''
+    tf_content = tf_template.render(domain=spec.get("domain", "project"))
+    artifacts.append({"name": "main.tf", "content": tf_content})
+    # CI/CD workflow (GitHub Actions YAML via Jinja2)
+    ci_template = Template('''
 name: CI Pipeline
 on:
   push:
@@ -770,10 +3134,10 @@ jobs:
         with:
           directory: ./
 ''')
-        ci_content = ci_template.render()
-        artifacts.append({"name": ".github/workflows/ci.yml", "content": ci_content})
-        # Compliance scan workflow (GitHub Actions YAML)
-        compliance_template = Template('''
+    ci_content = ci_template.render()
+    artifacts.append({"name": ".github/workflows/ci.yml", "content": ci_content})
+    # Compliance scan workflow (GitHub Actions YAML)
+    compliance_template = Template('''
 name: Compliance Scan
 on:
   workflow_dispatch:
@@ -791,23 +3155,43 @@ jobs:
         with:
           directory: ./
 ''')
-        compliance_content = compliance_template.render()
-        artifacts.append({"name": ".github/workflows/compliance.yml", "content": compliance_content})
-        # n8n workflow (as before)
-        workflow_template = {
-            "name": f"{spec['domain']}_workflow",
-            "nodes": [
-                {"name": "Trigger", "type": "n8n-nodes-base.webhook"},
-                {"name": "RAG Search", "type": "n8n-nodes-base.httpRequest"},
-                {"name": "LLM Generate", "type": "n8n-nodes-base.httpRequest"},
-                {"name": "Response", "type": "n8n-nodes-base.respondToWebhook"}
-            ]
-        }
-        artifacts.append({"name": "workflow.json", "content": workflow_template})
-        return {"status": "success", "artifacts": artifacts}
-    except Exception as e:
-        logger.error(f"Artifact generation error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    compliance_content = compliance_template.render()
+    artifacts.append({"name": ".github/workflows/compliance.yml", "content": compliance_content})
+    # n8n workflow (as before)
+    workflow_template = {
+        "name": f"{spec['domain']}_workflow",
+        "nodes": [
+            {"name": "Trigger", "type": "n8n-nodes-base.webhook"},
+            {"name": "RAG Search", "type": "n8n-nodes-base.httpRequest"},
+            {"name": "LLM Generate", "type": "n8n-nodes-base.httpRequest"},
+            {"name": "Response", "type": "n8n-nodes-base.respondToWebhook"}
+        ]
+    }
+    artifacts.append({"name": "workflow.json", "content": workflow_template})
+    return artifacts
+
+async def run_artifacts_job(payload: Dict[str, Any], user: dict) -> Dict[str, Any]:
+    """Job handler for /api/artifacts/generate."""
+    try:
+        artifacts = build_artifacts(payload["spec"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise PermanentJobError(f"Invalid specification: {e!r}")
+    audit_event(user, "artifacts_generate", "artifacts", {"domain": payload["spec"].get("domain"), "count": len(artifacts)})
+    return {"artifacts": artifacts}
+
+job_queue.register("artifacts", run_artifacts_job)
+
+@app.post("/api/artifacts/generate", status_code=202)
+async def generate_artifacts(
+    spec: Dict[str, Any],
+    user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Queue artifact generation (K8s, Terraform, CI/CD, Compliance) for a specification and return its job id."""
+    if "domain" not in spec:
+        raise HTTPException(status_code=400, detail="Specification must include 'domain'.")
+    job = await job_queue.submit("artifacts", user, {"spec": spec}, idempotency_key=idempotency_key)
+    return job_accepted(job)
 
 # ------------------------------------------------------------------
 # Compliance Results Endpoints
@@ -822,7 +3206,7 @@ async def get_compliance_results(user: dict = Depends(get_current_user)):
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase not configured.")
     try:
-        resp = supabase.table("compliance_results").select("*").eq("tenant_id", user.get("tenant_id", "default")).execute()
+        resp = await asyncio.to_thread(supabase.table("compliance_results").select("*").eq("tenant_id", user.get("tenant_id", "default")).execute)
         return {"status": "success", "results": resp.data}
     except Exception as e:
         logger.error(f"Error fetching compliance results: {e}")
@@ -834,23 +3218,14 @@ async def insert_compliance_result(result: ComplianceResult, user: dict = Depend
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase not configured.")
     try:
-        supabase.table("compliance_results").insert({
+        await asyncio.to_thread(supabase.table("compliance_results").insert({
             "tenant_id": user.get("tenant_id", "default"),
             "user_id": user.get("user_id"),
             "flag": result.flag,
             "details": result.details
-        }).execute()
+        }).execute)
         # Audit log
-        try:
-            supabase.table("audit_logs").insert({
-                "tenant_id": user.get("tenant_id", "default"),
-                "user_id": user.get("user_id"),
-                "action": "compliance_result_insert",
-                "resource_type": "compliance",
-                "details": {"flag": result.flag}
-            }).execute()
-        except Exception as log_err:
-            logger.warning(f"Audit log write failed: {log_err}")
+        audit_event(user, "compliance_result_insert", "compliance", {"flag": result.flag})
         return {"status": "success"}
     except Exception as e:
         logger.error(f"Error inserting compliance result: {e}")
@@ -32,6 +32,7 @@ if "spec" not in st.session_state:
 # API Configuration
 API_BASE_URL = st.secrets.get("API_BASE_URL", "http://localhost:8000")
 API_KEY = st.secrets.get("API_KEY", "demo-key")
+TENANT_ID = st.secrets.get("TENANT_ID", "streamlit-user")
 
 def save_uploaded_file(uploaded_file, filename: str):
     """Save uploaded file to temp directory"""
@@ -45,7 +46,7 @@ def call_api(endpoint: str, data: Dict[Any, Any]) -> Dict[Any, Any]:
         response = requests.post(
             f"{API_BASE_URL}{endpoint}",
             json=data,
-            headers={"Authorization": f"Bearer {API_KEY}"}
+            headers={"Authorization": f"Bearer {API_KEY}", "X-Tenant-Id": TENANT_ID}
         )
         response.raise_for_status()
         return response.json()
@@ -53,6 +54,20 @@ def call_api(endpoint: str, data: Dict[Any, Any]) -> Dict[Any, Any]:
         st.error(f"API Error: {str(e)}")
         return {}
 
+def apply_admission_limits(spec: Dict[str, Any]) -> bool:
+    """Register the wizard's throughput/concurrency targets as the tenant's admission limits"""
+    try:
+        response = requests.put(
+            f"{API_BASE_URL}/api/admin/tenants/{TENANT_ID}/admission",
+            json={"rps": spec["throughput"], "concurrency": spec["concurrency"]},
+            headers={"Authorization": f"Bearer {API_KEY}"}
+        )
+        response.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        st.warning(f"Could not apply rate limits: {str(e)}")
+        return False
+
 # Main app layout
 st.title("🤖 AI Advisor - No-Code Platform Builder")
 st.markdown("Build enterprise AI solutions without coding")
@@ -171,12 +186,14 @@ elif st.session_state.step == 3:
         st.subheader("Performance Requirements")
         throughput = st.slider(
             "Expected throughput (messages/second)",
-            min_value=1, max_value=500, value=50
+            min_value=1, max_value=500, value=50,
+            help="Enforced as your requests-per-second limit; bursts above it get HTTP 429"
         )
         
         concurrency = st.slider(
             "Concurrent users",
-            min_value=1, max_value=1000, value=10
+            min_value=1, max_value=1000, value=10,
+            help="Enforced as your limit on requests in flight; extra requests queue"
         )
         
         sla = st.radio(
@@ -333,12 +350,17 @@ elif st.session_state.step == 5:
                 # Call the generation API
                 result = call_api("/api/generate-platform", {
                     "spec": st.session_state.spec,
-                    "tenantId": "streamlit-user",
+                    "tenantId": TENANT_ID,
                     "userId": "streamlit"
                 })
                 
                 if result:
                     st.success("🎉 Platform generated successfully!")
+                    if apply_admission_limits(st.session_state.spec):
+                        st.info(
+                            f"Rate limits applied: {st.session_state.spec['throughput']} requests/second, "
+                            f"{st.session_state.spec['concurrency']} concurrent requests"
+                        )
                     st.balloons()
                     
                     # Show results
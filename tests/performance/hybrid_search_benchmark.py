@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Hybrid vs dense-only retrieval benchmark for the LlamaIndex service.
+
+Ingests a synthetic operations-maintenance / legal corpus into a throwaway
+namespace, then runs identifier queries (part numbers, statute citations) and
+descriptive queries against /search in vector, sparse and hybrid mode and
+reports latency percentiles and recall@k per mode and query type.
+
+Usage:
+    python tests/performance/hybrid_search_benchmark.py --url http://localhost:8002
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+import requests
+
+MODES = ["vector", "sparse", "hybrid"]
+COMPONENTS = ["hydraulic pump", "fuel filter", "bearing assembly", "gearbox seal", "cooling fan", "pressure valve"]
+ACTIONS = ["inspect", "replace", "lubricate", "torque-check", "clean", "recalibrate"]
+INTERVALS = ["every 250 hours", "every 500 hours", "monthly", "quarterly", "at each shutdown"]
+
+
+def build_corpus(n_parts: int, n_citations: int, seed: int):
+    """Return (documents, queries); each query lists the ids of its relevant documents."""
+    rng = random.Random(seed)
+    documents, queries = [], []
+    for i in range(n_parts):
+        part = f"PN-{rng.randint(1000, 9999)}-{rng.choice('ABCDEFGH')}{i}"
+        component, action, interval = rng.choice(COMPONENTS), rng.choice(ACTIONS), rng.choice(INTERVALS)
+        doc_id = f"maint-{i}"
+        documents.append({
+            "id": doc_id,
+            "content": (
+                f"Maintenance card {i}. {action.capitalize()} the {component} ({part}) {interval}. "
+                f"Record findings in the work order and tag the {component} if wear exceeds limits."
+            )
+        })
+        queries.append({"query": f"{part}", "relevant": [doc_id], "type": "identifier"})
+        queries.append({"query": f"how often to {action} the {component} {part}", "relevant": [doc_id], "type": "mixed"})
+    for i in range(n_citations):
+        title, section = rng.randint(1, 50), rng.randint(100, 9999)
+        citation = f"{title} U.S.C. § {section}"
+        doc_id = f"legal-{i}"
+        documents.append({
+            "id": doc_id,
+            "content": (
+                f"Memo {i}. Claims brought under {citation} must be filed within the limitation period; "
+                f"counsel should confirm jurisdiction and preserve records relevant to the dispute."
+            )
+        })
+        queries.append({"query": f"§ {section}", "relevant": [doc_id], "type": "identifier"})
+    return documents, queries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(args) -> Dict:
+    session = requests.Session()
+    documents, queries = build_corpus(args.parts, args.citations, args.seed)
+    base = args.url.rstrip("/")
+
+    started = time.perf_counter()
+    response = session.post(f"{base}/ingest", json={
+        "documents": documents, "namespace": args.namespace, "collection": args.collection
+    }, timeout=600)
+    response.raise_for_status()
+    ingest_seconds = time.perf_counter() - started
+
+    samples: Dict[str, Dict[str, Dict[str, List[float]]]] = {
+        mode: {} for mode in MODES
+    }
+    try:
+        for _ in range(args.repeat):
+            for query in queries:
+                for mode in MODES:
+                    started = time.perf_counter()
+                    response = session.post(f"{base}/search", json={
+                        "query": query["query"],
+                        "namespace": args.namespace,
+                        "collection": args.collection,
+                        "top_k": args.top_k,
+                        "mode": mode
+                    }, timeout=60)
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    response.raise_for_status()
+                    ids = {result["id"] for result in response.json()["results"]}
+                    recall = len(ids & set(query["relevant"])) / len(query["relevant"])
+                    for bucket in (query["type"], "all"):
+                        stats = samples[mode].setdefault(bucket, {"latency_ms": [], "recall": []})
+                        stats["latency_ms"].append(latency_ms)
+                        stats["recall"].append(recall)
+    finally:
+        if not args.keep:
+            session.delete(f"{base}/namespaces/{args.namespace}", params={"collection": args.collection}, timeout=60)
+
+    report = {"documents": len(documents), "queries": len(queries), "ingest_seconds": round(ingest_seconds, 2), "modes": {}}
+    for mode, buckets in samples.items():
+        report["modes"][mode] = {
+            bucket: {
+                "p50_ms": round(percentile(stats["latency_ms"], 50), 2),
+                "p95_ms": round(percentile(stats["latency_ms"], 95), 2),
+                f"recall@{args.top_k}": round(statistics.mean(stats["recall"]), 3)
+            }
+            for bucket, stats in buckets.items()
+        }
+    return report
+
+
+def print_report(report: Dict, top_k: int):
+    print(f"\n{report['documents']} documents, {report['queries']} queries, ingest {report['ingest_seconds']}s\n")
+    print(f"{'mode':<8} {'queries':<12} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(top_k):>10}")
+    for mode, buckets in report["modes"].items():
+        for bucket, stats in sorted(buckets.items()):
+            print(f"{mode:<8} {bucket:<12} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats[f'recall@{top_k}']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid vs dense-only retrieval")
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--collection", default="documents")
+    parser.add_argument("--namespace", default="hybrid_bench")
+    parser.add_argument("--parts", type=int, default=200)
+    parser.add_argument("--citations", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark namespace afterwards")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report, args.top_k)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
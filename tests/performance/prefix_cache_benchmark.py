@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Prefix-cache benchmark for the RAG prompt layout.
+
+Builds synthetic RAG requests for every domain in SYSTEM_PROMPTS and compares
+the prompt the orchestrator used to send (question first, system prompt
+dropped) with the canonical layout rendered by the inference service (system
+prompt, then context, then question).
+
+Offline (default) the prompts are tokenized and replayed through a model of
+vLLM's automatic prefix cache: full KV blocks of --block-size tokens are
+reused when every token up to the end of the block matches an earlier
+request. The cache is assumed large enough to hold everything. Reported per
+domain and layout: prompt tokens, tokens served from cache, and tokens that
+still need prefill.
+
+With --url, the same requests are also sent to /generate?stream=true and
+time to first token is reported. Run that against a vLLM started with
+--enable-prefix-caching, and again without it, to see the real saving.
+
+Usage:
+    python tests/performance/prefix_cache_benchmark.py --tokenizer meta-llama/Meta-Llama-3-70B-Instruct
+    python tests/performance/prefix_cache_benchmark.py --url http://localhost:8001 --model llama3-70b
+"""
+
+import argparse
+import ast
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+ORCHESTRATION_APP = REPO_ROOT / "services" / "orchestration" / "app.py"
+INFERENCE_APP = REPO_ROOT / "services" / "llm-inference" / "app.py"
+LAYOUTS = ["before", "canonical"]
+QUESTIONS = [
+    "What does section {n} require?",
+    "Summarize the findings about item {n}.",
+    "Which deadline applies to case {n}?",
+    "Who is responsible for step {n}?",
+    "What changed in revision {n}?",
+]
+
+
+def load_definitions(path: Path, names: List[str]) -> Dict:
+    """Execute only the named top-level assignments/functions of a service module, without importing it."""
+    tree = ast.parse(path.read_text())
+    nodes = [
+        node for node in tree.body
+        if (isinstance(node, ast.FunctionDef) and node.name in names)
+        or (isinstance(node, ast.Assign) and any(getattr(target, "id", None) in names for target in node.targets))
+    ]
+    namespace = {"GenerateRequest": object}
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), str(path), "exec"), namespace)
+    return namespace
+
+
+class Request:
+    """Stand-in for the inference service's GenerateRequest."""
+
+    def __init__(self, model: str, prompt: str, system_prompt: Optional[str] = None, context: Optional[str] = None):
+        self.model = model
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.context = context
+
+
+def build_requests(system_prompts: Dict[str, str], n: int, passages: int, top_k: int, seed: int) -> Dict[str, List[Dict]]:
+    """Per domain, `n` (question, context) pairs drawn from a pool of `passages` synthetic passages."""
+    rng = random.Random(seed)
+    workload = {}
+    for domain in system_prompts:
+        pool = [
+            f"[{domain} doc {i}] " + " ".join(f"{domain}-term-{rng.randint(0, 999)}" for _ in range(rng.randint(40, 90)))
+            for i in range(passages)
+        ]
+        workload[domain] = [
+            {
+                "question": rng.choice(QUESTIONS).format(n=rng.randint(1, 500)),
+                "context": "\n\n".join(rng.sample(pool, min(top_k, len(pool))))
+            }
+            for _ in range(n)
+        ]
+    return workload
+
+
+def before_prompt(question: str, context: str) -> str:
+    """The prompt orchestration built before the canonical layout; the system prompt never reached the model."""
+    return f"""Based on the following context, answer the question: {question}
+
+Context:
+{context}
+
+Answer:"""
+
+
+def make_tokenizer(name: Optional[str]) -> Callable[[str], List]:
+    if name:
+        try:
+            from tokenizers import Tokenizer  # type: ignore
+        except ModuleNotFoundError:
+            raise SystemExit("--tokenizer needs the `tokenizers` package")
+        tokenizer = Tokenizer.from_file(name) if name.endswith(".json") else Tokenizer.from_pretrained(name)
+        return lambda text: tokenizer.encode(text).ids
+    # Fallback: 4-character pieces, roughly one token each
+    return lambda text: [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def cached_tokens(tokens: List, cache: set, block_size: int) -> int:
+    """Tokens of `tokens` served from the prefix cache; adds its full blocks to the cache."""
+    hits, matching = 0, True
+    for end in range(block_size, len(tokens) + 1, block_size):
+        key = hash(tuple(tokens[:end]))
+        if matching and key in cache:
+            hits += block_size
+        else:
+            matching = False
+            cache.add(key)
+    return hits
+
+
+def render(layout: str, model: str, system_prompt: str, item: Dict) -> Request:
+    if layout == "before":
+        return Request(model, before_prompt(item["question"], item["context"]))
+    return Request(model, item["question"], system_prompt=system_prompt, context=item["context"])
+
+
+def simulate(workload: Dict, system_prompts: Dict, model: str, render_prompt: Callable, tokenize: Callable, block_size: int) -> Dict:
+    report = {}
+    for domain, items in workload.items():
+        report[domain] = {}
+        for layout in LAYOUTS:
+            cache: set = set()
+            prompt_tokens, hit_tokens = [], []
+            for item in items:
+                tokens = tokenize(render_prompt(render(layout, model, system_prompts[domain], item)))
+                prompt_tokens.append(len(tokens))
+                hit_tokens.append(cached_tokens(tokens, cache, block_size))
+            # The first request of each domain warms the cache; report steady state
+            prompt_mean = statistics.mean(prompt_tokens[1:] or prompt_tokens)
+            hit_mean = statistics.mean(hit_tokens[1:] or hit_tokens)
+            report[domain][layout] = {
+                "prompt_tokens": round(prompt_mean, 1),
+                "cached_tokens": round(hit_mean, 1),
+                "prefill_tokens": round(prompt_mean - hit_mean, 1),
+                "cached_pct": round(100 * hit_mean / prompt_mean, 1) if prompt_mean else 0.0
+            }
+    return report
+
+
+def first_token_ms(session: requests.Session, url: str, payload: Dict) -> float:
+    started = time.perf_counter()
+    with session.post(f"{url}/generate", params={"stream": "true"}, json=payload, stream=True, timeout=120) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("event: token"):
+                return (time.perf_counter() - started) * 1000
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(workload: Dict, system_prompts: Dict, args) -> Dict:
+    session = requests.Session()
+    base = args.url.rstrip("/")
+    report = {}
+    for domain, items in workload.items():
+        report[domain] = {}
+        for layout in LAYOUTS:
+            samples = []
+            for item in items:
+                request = render(layout, args.model, system_prompts[domain], item)
+                payload = {
+                    "prompt": request.prompt,
+                    "system_prompt": request.system_prompt,
+                    "context": request.context,
+                    "model": args.model,
+                    "max_tokens": 1,
+                    "temperature": 0.0
+                }
+                samples.append(first_token_ms(session, base, payload))
+            warm = samples[1:] or samples
+            report[domain][layout] = {
+                "cold_ttft_ms": round(samples[0], 1),
+                "p50_ttft_ms": round(statistics.median(warm), 1)
+            }
+    return report
+
+
+def print_report(title: str, report: Dict, columns: List[str]):
+    print(f"\n{title}")
+    print(f"{'domain':<24} {'layout':<10} " + " ".join(f"{column:>15}" for column in columns))
+    for domain, layouts in report.items():
+        for layout, stats in layouts.items():
+            print(f"{domain:<24} {layout:<10} " + " ".join(f"{stats[column]:>15}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prefill saved by the prefix-cache-friendly prompt layout")
+    parser.add_argument("--model", default="llama3-70b", help="Model whose chat template is rendered")
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer id or tokenizer.json (default: 4 chars/token)")
+    parser.add_argument("--block-size", type=int, default=16, help="vLLM KV cache block size")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per domain")
+    parser.add_argument("--passages", type=int, default=40, help="Passage pool per domain")
+    parser.add_argument("--top-k", type=int, default=3, help="Passages per context")
+    parser.add_argument("--domains", help="Comma-separated subset of domains")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="LLM inference service URL; also measure time to first token")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    system_prompts = load_definitions(ORCHESTRATION_APP, ["SYSTEM_PROMPTS"])["SYSTEM_PROMPTS"]
+    if args.domains:
+        system_prompts = {domain: system_prompts[domain] for domain in args.domains.split(",")}
+    render_prompt = load_definitions(INFERENCE_APP, ["PROMPT_TEMPLATES", "user_message", "render_prompt"])["render_prompt"]
+    workload = build_requests(system_prompts, args.requests, args.passages, args.top_k, args.seed)
+
+    report = {"simulated": simulate(workload, system_prompts, args.model, render_prompt, make_tokenizer(args.tokenizer), args.block_size)}
+    print_report(
+        f"Simulated prefix cache ({args.model}, block size {args.block_size}, {args.requests} requests/domain)",
+        report["simulated"], ["prompt_tokens", "cached_tokens", "prefill_tokens", "cached_pct"]
+    )
+    if args.url:
+        report["measured"] = measure(workload, system_prompts, args)
+        print_report(f"Measured time to first token ({args.url})", report["measured"], ["cold_ttft_ms", "p50_ttft_ms"])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
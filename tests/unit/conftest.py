@@ -0,0 +1,143 @@
+"""
+Shared fixtures for the Python service unit tests.
+
+Each service is a single `app.py` module; they are loaded by path under distinct
+module names so the three `app` modules can coexist in one test session. Files
+the services write (job DB, audit spill, manifests, sparse index) go to a
+per-session temporary directory.
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SERVICES_DIR = Path(__file__).resolve().parents[2] / "services"
+STATE_DIR = tempfile.mkdtemp(prefix="service-tests-")
+
+os.environ.setdefault("JOB_DB_PATH", os.path.join(STATE_DIR, "jobs.db"))
+os.environ.setdefault("AUDIT_SPILL_PATH", os.path.join(STATE_DIR, "audit_spill.jsonl"))
+os.environ.setdefault("CHROMA_PATH", os.path.join(STATE_DIR, "chroma_db"))
+os.environ.setdefault("INGEST_MANIFEST_PATH", os.path.join(STATE_DIR, "ingest_manifest.db"))
+os.environ.setdefault("SPARSE_INDEX_PATH", os.path.join(STATE_DIR, "sparse_index.db"))
+os.environ.setdefault("INGEST_SPOOL_DIR", STATE_DIR)
+os.environ.setdefault("WARM_VECTOR_STORES", "")
+os.environ.setdefault("LLAMA3_TOKENIZER", "")
+os.environ.setdefault("MISTRAL_TOKENIZER", "")
+
+
+def load_service(name: str, directory: str):
+    """Import services/<directory>/app.py as module `name`, skipping when a dependency is missing."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, SERVICES_DIR / directory / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        # The repo's supabase/ migrations folder can shadow the client package too
+        pytest.skip(f"services/{directory} dependencies not installed: {e}")
+    sys.modules[name] = module
+    return module
+
+
+@pytest.fixture(scope="session")
+def orchestration():
+    return load_service("orchestration_app", "orchestration")
+
+
+@pytest.fixture(scope="session")
+def inference():
+    return load_service("llm_inference_app", "llm-inference")
+
+
+@pytest.fixture(scope="session")
+def llamaindex():
+    return load_service("llamaindex_app", "llamaindex-service")
+
+
+@pytest.fixture
+def downstream(orchestration, monkeypatch):
+    """
+    Route orchestration's pooled HTTP clients to in-process handlers.
+
+    Register `routes[path_prefix] = handler(request) -> httpx.Response` (sync or
+    async); unmatched paths return 404. `calls` records every request made.
+    """
+    import httpx
+
+    routes, calls = {}, []
+
+    async def handle(request):
+        calls.append(request)
+        for prefix, handler in routes.items():
+            if request.url.path.startswith(prefix):
+                response = handler(request)
+                if hasattr(response, "__await__"):
+                    response = await response
+                return response
+        return httpx.Response(404, json={"detail": "no route"})
+
+    clients = {}
+
+    def get(name):
+        if name not in clients:
+            clients[name] = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        return clients[name]
+
+    monkeypatch.setattr(orchestration.http_clients, "get", get)
+    return routes, calls
+
+
+@pytest.fixture
+def vector_index(llamaindex, monkeypatch):
+    """
+    Point llama-index at a deterministic bag-of-words embedding (no model download
+    or API key) and return a factory for fresh collection names, so each test
+    ingests into its own Chroma partitions.
+    """
+    import hashlib
+    import re
+    import uuid
+
+    from llama_index.core import Settings
+    from llama_index.core.embeddings import BaseEmbedding
+
+    class HashEmbedding(BaseEmbedding):
+        dim: int = 64
+
+        def _vector(self, text):
+            vector = [0.0] * self.dim
+            for word in re.findall(r"\w+", text.lower()):
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+            norm = sum(v * v for v in vector) ** 0.5 or 1.0
+            return [v / norm for v in vector]
+
+        def _get_text_embedding(self, text):
+            return self._vector(text)
+
+        def _get_query_embedding(self, query):
+            return self._vector(query)
+
+        async def _aget_query_embedding(self, query):
+            return self._vector(query)
+
+    monkeypatch.setattr(Settings, "_embed_model", HashEmbedding())
+    return lambda: f"test-{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def word_tokenizer(tmp_path):
+    """Path to a tokenizer.json that splits on whitespace and punctuation: one token per word."""
+    tokenizers = pytest.importorskip("tokenizers")
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    tokenizer = tokenizers.Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+    return str(path)
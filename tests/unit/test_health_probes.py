@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+import httpx
+
+
+def test_orchestration_probes_run_concurrently_under_one_deadline(orchestration, monkeypatch):
+    async def probe(service, url):
+        await asyncio.sleep(5 if service == "n8n" else 0.05)
+        return {"status": "healthy", "latency_ms": 50.0}
+
+    monkeypatch.setattr(orchestration, "_probe_service", probe)
+    monkeypatch.setattr(orchestration, "HEALTH_PROBE_DEADLINE", 0.3)
+    started = time.perf_counter()
+    results = asyncio.run(orchestration.probe_services())
+
+    assert time.perf_counter() - started < 1.0
+    assert results["n8n"]["status"] == "timeout"
+    assert all(result["status"] == "healthy" for service, result in results.items() if service != "n8n")
+
+
+def test_model_probe_reports_timeout_without_waiting(inference, monkeypatch):
+    async def probe_endpoint(client, url):
+        await asyncio.sleep(5 if "mistral" in url else 0.05)
+        return "healthy"
+
+    monkeypatch.setattr(inference, "_probe_endpoint", probe_endpoint)
+    monkeypatch.setattr(inference, "MODEL_PROBE_DEADLINE", 0.3)
+    started = time.perf_counter()
+    models = {model["name"]: model for model in asyncio.run(inference.probe_models())}
+
+    assert time.perf_counter() - started < 1.0
+    assert models["mistral-7b"]["status"] == "timeout"
+    assert models["llama3-70b"]["status"] == "healthy"
+    assert models["gemini-2.5-pro"]["type"] == "external"
+
+
+def test_model_probe_treats_error_status_as_unhealthy(inference):
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(503))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await inference._probe_endpoint(client, "http://replica:8000")
+
+    assert asyncio.run(run()) == "unhealthy"
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def vllm(inference, monkeypatch):
+    """Fake vLLM /v1/completions that rejects any call containing a TOO_LONG prompt, like vLLM does."""
+    calls = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        calls.append(prompts)
+        if any("TOO_LONG" in prompt for prompt in prompts):
+            return httpx.Response(400, json={"message": "prompt exceeds max_model_len"})
+        return httpx.Response(200, json={
+            "choices": [{"index": i, "text": f"answer:{prompt}"} for i, prompt in enumerate(prompts)],
+            "usage": {"prompt_tokens": 4, "completion_tokens": 2}
+        })
+
+    monkeypatch.setattr(inference, "_vllm_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return calls
+
+
+def make_batcher(inference):
+    return inference.MicroBatcher("llama3-70b", inference.replica_pools["llama3-70b"], window_ms=20, max_batch_size=8, max_queue_depth=64)
+
+
+def test_concurrent_requests_share_one_upstream_call(inference, vllm):
+    batcher = make_batcher(inference)
+
+    async def run():
+        requests = [inference.GenerateRequest(prompt=f"q{i}") for i in range(4)]
+        return await asyncio.gather(*(batcher.submit(request) for request in requests))
+
+    results = asyncio.run(run())
+    assert [result["text"] for result in results] == [f"answer:q{i}" for i in range(4)]
+    assert len(vllm) == 1 and len(vllm[0]) == 4
+    assert batcher.metrics()["largest_batch"] == 4
+
+
+def test_different_sampling_parameters_are_not_batched(inference, vllm):
+    batcher = make_batcher(inference)
+
+    async def run():
+        await asyncio.gather(
+            batcher.submit(inference.GenerateRequest(prompt="a", temperature=0.0)),
+            batcher.submit(inference.GenerateRequest(prompt="b", temperature=0.7)),
+        )
+
+    asyncio.run(run())
+    assert len(vllm) == 2
+
+
+def test_rejected_prompt_only_fails_its_own_caller(inference, vllm):
+    batcher = make_batcher(inference)
+
+    async def run():
+        requests = [inference.GenerateRequest(prompt=p) for p in ("ok-1", "TOO_LONG", "ok-2")]
+        return await asyncio.gather(*(batcher.submit(request) for request in requests), return_exceptions=True)
+
+    ok_1, bad, ok_2 = asyncio.run(run())
+    assert ok_1["text"] == "answer:ok-1" and ok_2["text"] == "answer:ok-2"
+    assert isinstance(bad, httpx.HTTPStatusError) and bad.response.status_code == 400
+    assert batcher.metrics()["split_batches"] == 1
+    assert batcher.metrics()["errors"] == 1
+
+
+def test_queue_depth_limit_rejects_with_503(inference, vllm):
+    batcher = inference.MicroBatcher("llama3-70b", inference.replica_pools["llama3-70b"], 20, 8, max_queue_depth=2)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.submit(inference.GenerateRequest(prompt=f"q{i}")) for i in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert getattr(results[2], "status_code", None) == 503
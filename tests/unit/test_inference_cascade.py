@@ -0,0 +1,97 @@
+"""Model cascade: quality checks on the small model's answer and escalation."""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def models(inference, monkeypatch):
+    """Fake run_model: answers[model] is the result dict (or exception) each model returns."""
+    answers, calls = {}, []
+
+    async def run_model(request, logprobs=False):
+        calls.append((request.model, logprobs))
+        answer = answers[request.model]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def token_usage(request, text, usage):
+        return {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2, "source": "test"}
+
+    monkeypatch.setattr(inference, "run_model", run_model)
+    monkeypatch.setattr(inference, "token_usage", token_usage)
+    monkeypatch.setattr(inference, "cascade_stats", inference.CascadeStats())
+    return answers, calls
+
+
+GOOD = "The refund window is thirty days from delivery for unopened items."
+
+
+def cascade(inference, **policy):
+    request = inference.GenerateRequest(prompt="q", cascade=inference.CascadePolicy(label="support", **policy))
+    return asyncio.run(inference.run_cascade(request))
+
+
+@pytest.mark.parametrize("text, logprobs, reasons", [
+    (GOOD, [-0.2, -0.3], []),
+    ("Thirty.", None, ["too_short"]),
+    ("I'm not sure; the context does not contain enough information about refunds.", None, ["refusal"]),
+    (GOOD, [-2.5, -1.5], ["low_logprob"]),
+])
+def test_quality_checks(inference, text, logprobs, reasons):
+    policy = inference.CascadePolicy(min_answer_chars=20, min_mean_logprob=-1.0)
+    found, mean = inference.cascade_checks({"text": text, "logprobs": logprobs}, policy)
+    assert found == reasons
+    assert mean == (sum(logprobs) / len(logprobs) if logprobs else None)
+
+
+def test_good_small_answer_is_kept(inference, models):
+    answers, calls = models
+    answers["mistral-7b"] = {"text": GOOD, "logprobs": [-0.1]}
+    request, result, report = cascade(inference)
+    assert request.model == "mistral-7b" and result["text"] == GOOD
+    assert report["escalated"] is False and report["models_tried"] == ["mistral-7b"]
+    assert calls == [("mistral-7b", True)]
+    assert inference.cascade_stats.snapshot()["support"]["escalation_rate"] == 0.0
+
+
+def test_weak_answer_escalates(inference, models):
+    answers, calls = models
+    answers["mistral-7b"] = {"text": "I don't know.", "logprobs": [-0.1]}
+    answers["llama3-70b"] = {"text": GOOD}
+    request, result, report = cascade(inference)
+    assert request.model == "llama3-70b" and result["text"] == GOOD
+    assert report["escalated"] and set(report["reasons"]) == {"too_short", "refusal"}
+    assert report["models_tried"] == ["mistral-7b", "llama3-70b"]
+    stats = inference.cascade_stats.snapshot()["support"]
+    assert stats["escalated"] == 1 and stats["reasons"] == {"too_short": 1, "refusal": 1}
+
+
+def test_small_model_failure_escalates_but_client_errors_do_not(inference, models):
+    answers, _ = models
+    answers["mistral-7b"] = httpx.ConnectError("refused")
+    answers["llama3-70b"] = {"text": GOOD}
+    _, result, report = cascade(inference)
+    assert report["reasons"] == ["small_error"] and result["text"] == GOOD
+
+    answers["mistral-7b"] = HTTPException(status_code=400, detail="prompt too long")
+    with pytest.raises(HTTPException):
+        cascade(inference)
+
+
+def test_generate_reports_cascade_and_answering_model(inference, models):
+    answers, _ = models
+    answers["mistral-7b"] = {"text": GOOD, "logprobs": None}
+    request = inference.GenerateRequest(prompt="q", cascade=inference.CascadePolicy())
+    response = asyncio.run(inference.generate_text(request, x_tenant_id=None))
+    assert response.model == "mistral-7b"
+    assert response.cascade["escalated"] is False
+
+    unknown = inference.GenerateRequest(prompt="q", cascade=inference.CascadePolicy(large_model="gpt-9"))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(inference.generate_text(unknown, x_tenant_id=None))
+    assert error.value.status_code == 400
@@ -0,0 +1,76 @@
+"""Hedged model calls: duplicates go to another replica, never to a billed external API by default."""
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def hedging(inference, monkeypatch):
+    monkeypatch.setattr(inference.hedge_settings, "enabled", True)
+    monkeypatch.setattr(inference.hedge_settings, "min_samples", 5)
+    monkeypatch.setattr(inference.hedge_settings, "min_delay_ms", 10)
+
+
+def warm(hedger, latency_ms=20.0):
+    for _ in range(5):
+        hedger._observe(latency_ms)
+
+
+def test_slow_replica_is_hedged_to_another(inference, hedging):
+    pool = inference.ReplicaPool("mistral-7b", "http://a,http://b", "least_outstanding")
+    pool.hedger = inference.Hedger("mistral-7b", inference.HedgeBudget(0.05, 10), inference.hedge_settings)
+    warm(pool.hedger)
+    pool.replicas["http://b"].outstanding = 1  # steer the primary to http://a
+    sent = []
+
+    async def send(url):
+        sent.append(url)
+        await asyncio.sleep(1.0 if url == "http://a" else 0.0)
+        return url
+
+    async def main():
+        result = await pool.call(send)
+        pool.replicas["http://b"].outstanding = 0
+        return result
+
+    assert asyncio.run(main()) == "http://b"
+    assert sent == ["http://a", "http://b"]
+    assert pool.replicas["http://a"].outstanding == 0  # the cancelled primary released its slot
+    assert pool.hedger.metrics()["hedge_wins"] == 1
+
+
+def test_single_replica_is_not_hedged(inference, hedging):
+    pool = inference.ReplicaPool("mistral-7b", "http://a", "ewma")
+    pool.hedger = inference.Hedger("mistral-7b", inference.HedgeBudget(0.05, 10), inference.hedge_settings)
+    warm(pool.hedger)
+
+    async def send(url):
+        await asyncio.sleep(0.05)
+        return url
+
+    assert asyncio.run(pool.call(send)) == "http://a"
+    assert pool.hedger.metrics()["hedged"] == 0
+
+
+def test_external_apis_not_hedged_unless_enabled(inference, hedging, monkeypatch):
+    hedger = inference.Hedger("gemini-2.5-pro", inference.HedgeBudget(0.05, 10), inference.hedge_settings)
+    warm(hedger)
+    monkeypatch.setattr(inference, "external_hedgers", {"gemini-2.5-pro": hedger})
+    calls = []
+
+    async def call_external_api(request):
+        calls.append(request.model)
+        await asyncio.sleep(0.3 if len(calls) == 1 else 0.0)  # only the first call of a run is slow
+        return {"text": "ok"}
+
+    monkeypatch.setattr(inference, "call_external_api", call_external_api)
+    request = inference.GenerateRequest(prompt="q", model="gemini-2.5-pro")
+    asyncio.run(inference.run_model(request))
+    assert len(calls) == 1 and hedger.metrics()["hedged"] == 0
+
+    monkeypatch.setattr(inference, "HEDGE_EXTERNAL_APIS", True)
+    calls.clear()
+    hedger._latencies = [20.0] * 5
+    asyncio.run(inference.run_model(request))
+    assert len(calls) == 2 and hedger.metrics()["hedged"] == 1
@@ -0,0 +1,62 @@
+"""Prompt layout: system prompt, then context, then question, in each model's chat template."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+SYSTEM = "You are a support assistant. Answer only from the context."
+
+
+def request(inference, model, question="How long is the refund window?", context="Refunds: 30 days.", **fields):
+    return inference.GenerateRequest(prompt=question, system_prompt=SYSTEM, context=context, model=model, **fields)
+
+
+def test_plain_prompt_is_sent_unchanged(inference):
+    assert inference.render_prompt(inference.GenerateRequest(prompt="Hello")) == "Hello"
+
+
+def test_llama3_layout(inference):
+    prompt = inference.render_prompt(request(inference, "llama3-70b"))
+    assert prompt == (
+        f"<|start_header_id|>system<|end_header_id|>\n\n{SYSTEM}<|eot_id|>"
+        "<|start_header_id|>user<|end_header_id|>\n\n"
+        "Context:\nRefunds: 30 days.\n\nQuestion: How long is the refund window?\n\nAnswer:<|eot_id|>"
+        "<|start_header_id|>assistant<|end_header_id|>\n\n"
+    )
+
+
+def test_mistral_puts_system_prompt_in_first_inst_block(inference):
+    prompt = inference.render_prompt(request(inference, "mistral-7b", context=None))
+    assert prompt == f"[INST] {SYSTEM}\n\nHow long is the refund window? [/INST]"
+
+
+@pytest.mark.parametrize("model", ["llama3-70b", "mistral-7b"])
+def test_system_prompt_prefix_is_identical_across_requests(inference, model):
+    first = inference.render_prompt(request(inference, model, question="a?", context="one"))
+    second = inference.render_prompt(request(inference, model, question="b?", context="two"))
+    prefix = first[:first.index("one")]
+    assert second.startswith(prefix) and prefix.index(SYSTEM) >= 0
+    assert first.index(SYSTEM) < first.index("one") < first.index("a?")
+
+
+def test_gemini_gets_system_instruction(inference):
+    payload = inference.gemini_payload(request(inference, "gemini-2.5-pro"))
+    assert payload["systemInstruction"] == {"parts": [{"text": SYSTEM}]}
+    text = payload["contents"][0]["parts"][0]["text"]
+    assert text.startswith("Context:\nRefunds: 30 days.") and SYSTEM not in text
+
+
+def test_vllm_receives_rendered_prompt(inference, monkeypatch):
+    bodies = []
+
+    def handler(http_request):
+        bodies.append(json.loads(http_request.content))
+        return httpx.Response(200, json={"choices": [{"text": "30 days"}]})
+
+    monkeypatch.setattr(inference, "_vllm_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    generate = request(inference, "mistral-7b")
+    result = asyncio.run(inference.call_vllm_endpoint("http://mistral", generate))
+    assert result["text"] == "30 days"
+    assert bodies[0]["prompt"] == inference.render_prompt(generate)
@@ -0,0 +1,157 @@
+"""Replica routing: EWMA and least-outstanding picks, failover and circuit breakers."""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def pool(inference, monkeypatch):
+    monkeypatch.setattr(inference, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(inference, "BREAKER_OPEN_SECONDS", 30)
+    monkeypatch.setattr(inference.hedge_settings, "enabled", False)
+    return inference.ReplicaPool("mistral-7b", "http://a, http://b", "ewma")
+
+
+def upstream_error(status):
+    request = httpx.Request("POST", "http://upstream/v1/completions")
+    return httpx.HTTPStatusError("upstream", request=request, response=httpx.Response(status, request=request))
+
+
+def call(pool, send):
+    return asyncio.run(pool.call(send))
+
+
+def test_failed_replica_fails_over(pool):
+    async def send(url):
+        if url == "http://a":
+            raise httpx.ConnectError("refused")
+        return url
+
+    pool.replicas["http://a"].ewma_ms = 1.0
+    pool.replicas["http://b"].ewma_ms = 100.0
+    assert call(pool, send) == "http://b"
+    metrics = pool.metrics()
+    assert metrics["retries"] == 1
+    assert metrics["replicas"][0]["failures"] == 1 and metrics["replicas"][1]["successes"] == 1
+
+
+def test_client_errors_neither_fail_over_nor_count_against_replica(pool):
+    attempts = []
+
+    async def send(url):
+        attempts.append(url)
+        raise upstream_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call(pool, send)
+    assert len(attempts) == 1
+    assert all(replica.consecutive_failures == 0 for replica in pool.replicas.values())
+
+
+def test_breaker_opens_then_half_open_probe_closes_it(inference, pool, monkeypatch):
+    replica = pool.replicas["http://a"]
+    for _ in range(2):
+        replica.record_failure(upstream_error(503))
+    assert replica.state == "open" and replica.metrics()["breaker_opens"] == 1
+    assert all(pool.pick().url == "http://b" for _ in range(5))
+
+    replica.opened_at -= 31  # the open period has elapsed
+    assert replica.available(inference.time.monotonic()) and replica.state == "half_open"
+    replica.outstanding = 1  # a probe is in flight, so no more requests are let through
+    assert not replica.available(inference.time.monotonic())
+    replica.outstanding = 0
+    replica.record_failure(httpx.ReadTimeout("slow"))
+    assert replica.state == "open"  # a failed probe re-opens at once
+
+    replica.opened_at -= 31
+    replica.available(inference.time.monotonic())
+    replica.record_success(12.0)
+    assert replica.state == "closed" and replica.consecutive_failures == 0
+
+
+def test_all_breakers_open_rejects(inference, pool):
+    for replica in pool.replicas.values():
+        replica.state, replica.opened_at = "open", inference.time.monotonic()
+    with pytest.raises(inference.NoReplicaAvailable):
+        call(pool, lambda url: asyncio.sleep(0))
+    assert pool.metrics()["rejected"] == 1
+
+
+def test_no_replica_is_503_with_retry_after(inference, pool, monkeypatch):
+    for replica in pool.replicas.values():
+        replica.state, replica.opened_at = "open", inference.time.monotonic()
+    monkeypatch.setattr(inference, "replica_pools", {**inference.replica_pools, "mistral-7b": pool})
+    monkeypatch.setattr(inference, "batchers", {})
+    request = inference.GenerateRequest(prompt="hi", model="mistral-7b")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(inference.generate_text(request, x_tenant_id=None))
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "30"
+
+
+@pytest.mark.parametrize("failure, status", [
+    (httpx.ReadTimeout("slow"), 504),
+    (httpx.ConnectError("refused"), 502),
+    (upstream_error(500), 502),
+    (upstream_error(422), 422),
+])
+def test_upstream_errors_map_to_gateway_statuses(inference, pool, monkeypatch, failure, status):
+    async def send(url):
+        raise failure
+
+    async def run_model(request, logprobs=False):
+        return await pool.call(send)
+
+    monkeypatch.setattr(inference, "run_model", run_model)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(inference.generate_text(inference.GenerateRequest(prompt="hi", model="mistral-7b"), x_tenant_id=None))
+    assert error.value.status_code == status
+
+
+def test_ewma_prefers_fast_replica_and_least_outstanding_counts_queue(inference):
+    ewma = inference.ReplicaPool("mistral-7b", "http://a,http://b", "ewma")
+    ewma.replicas["http://a"].ewma_ms, ewma.replicas["http://b"].ewma_ms = 300.0, 20.0
+    ewma.replicas["http://b"].outstanding = 3  # 20ms * 4 still beats 300ms * 1
+    assert ewma.pick().url == "http://b"
+
+    least = inference.ReplicaPool("mistral-7b", "http://a,http://b", "least_outstanding")
+    least.replicas["http://a"].ewma_ms, least.replicas["http://b"].ewma_ms = 300.0, 20.0
+    least.replicas["http://b"].outstanding = 3
+    assert least.pick().url == "http://a"
+
+
+def test_new_replica_starts_at_best_observed_latency(inference):
+    pool = inference.ReplicaPool("mistral-7b", "http://a,http://b", "ewma")
+    pool.replicas["http://a"].ewma_ms = 50.0
+    pool.replicas["http://a"].outstanding = 1
+    assert pool.pick().url == "http://b"  # 50ms prior * 1 beats 50ms * 2
+    pool._set_urls(["http://a", "http://c"])
+    assert pool.replicas["http://a"].ewma_ms == 50.0 and "http://b" not in pool.replicas
+
+
+def test_stream_fails_over_only_before_first_chunk(pool):
+    async def stream_from(urls, fail_after):
+        async def gen(url):
+            urls.append(url)
+            for i in range(fail_after):
+                yield f"{url}:{i}"
+            raise httpx.ReadError("reset")
+
+        chunks = []
+        try:
+            async for chunk in pool.stream(gen):
+                chunks.append(chunk)
+        except httpx.ReadError:
+            chunks.append("error")
+        return chunks
+
+    urls = []
+    assert asyncio.run(stream_from(urls, 0)) == ["error"]
+    assert len(urls) == 2  # nothing relayed yet, so the second replica was tried
+
+    urls = []
+    assert asyncio.run(stream_from(urls, 1))[-1] == "error"
+    assert len(urls) == 1  # a token already reached the client: no retry
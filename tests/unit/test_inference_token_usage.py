@@ -0,0 +1,81 @@
+"""Token accounting: upstream counts first, then a local tokenizer, then a logged estimate."""
+
+import asyncio
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def usage(inference, monkeypatch):
+    """Fresh tokenizer cache and tenant totals."""
+    cache, totals = inference.TokenizerCache(), inference.TenantUsage()
+    monkeypatch.setattr(inference, "tokenizer_cache", cache)
+    monkeypatch.setattr(inference, "tenant_usage", totals)
+    return cache, totals
+
+
+def request(inference, **fields):
+    return inference.GenerateRequest(prompt="one two three", tenant_id="acme", **fields)
+
+
+def test_upstream_counts_win(inference, usage):
+    result = asyncio.run(inference.token_usage(
+        request(inference), "four five", {"prompt_tokens": 11, "completion_tokens": 2}
+    ))
+    assert result == {"prompt_tokens": 11, "completion_tokens": 2, "source": "upstream", "total_tokens": 13}
+    assert usage[1].tenant("acme")["llama3-70b"]["total_tokens"] == 13
+
+
+def test_local_tokenizer_counts(inference, usage, word_tokenizer, monkeypatch):
+    monkeypatch.setitem(inference.MODEL_TOKENIZERS, "llama3-70b", word_tokenizer)
+    result = asyncio.run(inference.token_usage(request(inference), "four five"))
+    assert (result["prompt_tokens"], result["completion_tokens"], result["source"]) == (3, 2, "tokenizer")
+    assert usage[0].loaded() == {"llama3-70b": word_tokenizer}
+    assert usage[0].estimated() == {}
+
+
+def test_gated_tokenizer_without_token_is_reported(inference, usage, monkeypatch, caplog):
+    monkeypatch.setitem(inference.MODEL_TOKENIZERS, "llama3-70b", "meta-llama/Meta-Llama-3-70B-Instruct")
+    monkeypatch.setattr(inference.tokenizer_loading, "HF_TOKEN", None)
+    monkeypatch.setattr(inference.tokenizer_loading, "TOKENIZERS_AVAILABLE", True)
+    calls = []
+
+    class Gated:
+        @staticmethod
+        def from_pretrained(name, revision, token):
+            calls.append(token)
+            raise RuntimeError("401 Unauthorized")
+
+    monkeypatch.setattr(inference.tokenizer_loading, "Tokenizer", Gated, raising=False)
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            result = asyncio.run(inference.token_usage(request(inference), "four five"))
+    assert result["source"] == "estimate"
+    assert calls == [None]  # retried only after TOKENIZER_RETRY_INTERVAL
+    assert caplog.text.count("ESTIMATED") == 1 and "HF_TOKEN" in caplog.text
+    assert "HF_TOKEN" in usage[0].estimated()["llama3-70b"]
+    assert usage[1].tenant("acme")["llama3-70b"]["estimated_requests"] == 3
+
+    with TestClient(inference.app) as client:
+        body = client.get("/usage/tenants").json()
+    assert "llama3-70b" in body["estimated_models"]
+
+
+def test_hf_token_passed_to_download(inference, usage, word_tokenizer, monkeypatch):
+    monkeypatch.setitem(inference.MODEL_TOKENIZERS, "mistral-7b", "mistralai/Mistral-7B-Instruct-v0.2")
+    monkeypatch.setattr(inference.tokenizer_loading, "HF_TOKEN", "hf_secret")
+    monkeypatch.setattr(inference.tokenizer_loading, "TOKENIZERS_AVAILABLE", True)
+    seen = []
+    real = inference.tokenizer_loading.Tokenizer
+
+    class Hub:
+        @staticmethod
+        def from_pretrained(name, revision, token):
+            seen.append((name, revision, token))
+            return real.from_file(word_tokenizer)
+
+    monkeypatch.setattr(inference.tokenizer_loading, "Tokenizer", Hub)
+    assert usage[0].count("mistral-7b", "a b", "c") == [2, 1]
+    assert seen == [("mistralai/Mistral-7B-Instruct-v0.2", "main", "hf_secret")]
@@ -0,0 +1,93 @@
+"""Federated search: per-store deadlines, failures and score merging."""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def stores(llamaindex, monkeypatch):
+    """Fake dense retrieval per store: behaviours[store] is a callable run in the worker thread."""
+    from llama_index.core.schema import NodeWithScore, TextNode
+
+    behaviours = {}
+
+    def retrieve_nodes(store_type, partition, top_k, query):
+        return [
+            NodeWithScore(node=TextNode(id_=f"{store_type}-{i}", text=text), score=score)
+            for i, (text, score) in enumerate(behaviours[store_type]())
+        ][:top_k]
+
+    monkeypatch.setattr(llamaindex, "retrieve_nodes", retrieve_nodes)
+    monkeypatch.setattr(llamaindex, "VECTOR_STORES", {
+        name: llamaindex.LazyStoreClient(name, object, name) for name in ("chromadb", "weaviate")
+    })
+    return behaviours
+
+
+def search(llamaindex, **fields):
+    request = llamaindex.SearchRequest(query="q", stores=["chromadb", "weaviate"], **fields)
+    return asyncio.run(llamaindex.federated_search(request.stores, request))
+
+
+def test_slow_store_times_out_without_blocking_fast_store(llamaindex, stores):
+    stores["chromadb"] = lambda: [("fast answer", 0.9), ("second", 0.5)]
+
+    def slow():
+        time.sleep(0.5)  # Blocking, like a synchronous store client
+        return [("late", 1.0)]
+
+    stores["weaviate"] = slow
+    started = time.perf_counter()
+    results, status = search(llamaindex, store_timeout_ms=100)
+    assert time.perf_counter() - started < 0.5 + 0.4  # asyncio.run also waits for the abandoned thread
+    assert status["weaviate"]["status"] == "timeout"
+    assert status["weaviate"]["latency_ms"] < 400
+    assert status["chromadb"] == {"status": "ok", "results": 2, "latency_ms": status["chromadb"]["latency_ms"]}
+    assert [r.content for r in results] == ["fast answer", "second"]
+    assert results[0].metadata["store"] == "chromadb"
+
+
+def test_unavailable_and_failing_stores_are_reported(llamaindex, stores):
+    stores["chromadb"] = lambda: [("ok", 0.4)]
+
+    def unavailable():
+        raise HTTPException(status_code=503, detail="Vector store weaviate unavailable: refused")
+
+    stores["weaviate"] = unavailable
+    results, status = search(llamaindex)
+    assert status["weaviate"]["status"] == "unavailable"
+    assert [r.content for r in results] == ["ok"]
+
+    stores["weaviate"] = lambda: 1 / 0
+    _, status = search(llamaindex)
+    assert status["weaviate"]["status"] == "error"
+
+
+def test_scores_normalized_per_store_before_merge(llamaindex, stores):
+    stores["chromadb"] = lambda: [("c-high", 0.30), ("c-low", 0.10)]
+    stores["weaviate"] = lambda: [("w-high", 0.95), ("w-mid", 0.90), ("w-low", 0.85)]
+    results, _ = search(llamaindex, top_k=4)
+    assert [r.score for r in results] == pytest.approx([0.95, 0.90, 0.85, 0.30])
+    assert [r.content for r in results] == ["w-high", "w-mid", "w-low", "c-high"]
+
+
+def test_single_or_flat_results_keep_their_scores(llamaindex, stores):
+    stores["chromadb"] = lambda: [("lone weak match", 0.2)]
+    stores["weaviate"] = lambda: [("tie", 0.4), ("tie again", 0.4), ("over", 1.3), ("under", -0.2)]
+    results, _ = search(llamaindex, top_k=5)
+    scores = {r.content: r.score for r in results}
+    assert scores == pytest.approx({"over": 1.0, "tie": 0.4, "tie again": 0.4, "lone weak match": 0.2, "under": 0.0})
+
+
+def test_sparse_and_hybrid_scores_are_bounded(llamaindex):
+    def result(score):
+        return llamaindex.SearchResult(id="d", content="c", score=score, metadata={})
+
+    sparse = llamaindex.SearchRequest(query="q", mode="sparse")
+    assert [r.score for r in llamaindex.normalize_scores([result(3.0), result(0.0)], sparse)] == [0.75, 0.0]
+    hybrid = llamaindex.SearchRequest(query="q", mode="hybrid")
+    best = (hybrid.vector_weight + hybrid.sparse_weight) / (hybrid.rrf_k + 1)
+    assert [r.score for r in llamaindex.normalize_scores([result(best), result(best / 2)], hybrid)] == pytest.approx([1.0, 0.5])
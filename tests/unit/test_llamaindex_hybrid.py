@@ -0,0 +1,59 @@
+"""BM25 sparse index and hybrid retrieval with reciprocal-rank fusion."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def node(node_id, text, doc_id):
+    from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+    return TextNode(id_=node_id, text=text, relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)})
+
+
+def test_sparse_terms_keep_compound_tokens(llamaindex):
+    terms = llamaindex.sparse_terms("Replace part PN-4471-B per § 17.2.3 of the manual")
+    assert "pn-4471-b" in terms and "4471" in terms
+    assert "17.2.3" in terms and "17" in terms
+    assert "the" not in terms and "of" not in terms
+
+
+def test_bm25_ranks_rare_terms_and_tracks_deletes(llamaindex, tmp_path):
+    index = llamaindex.SparseIndex(str(tmp_path / "sparse.db"))
+    index.add("chromadb", "docs", [
+        node("a", "warranty covers part PN-4471-B for two years", "doc-a"),
+        node("b", "warranty covers labour for one year", "doc-b"),
+        node("c", "shipping is free for orders over fifty euros", "doc-c"),
+    ])
+    hits = index.search("chromadb", "docs", "PN-4471-B warranty", 3)
+    assert [hit["node_id"] for hit in hits] == ["a", "b"]
+    assert hits[0]["doc_id"] == "doc-a"
+    assert index.search("chromadb", "other", "warranty", 3) == []
+
+    index.delete("chromadb", "docs", ["a"])
+    assert [hit["node_id"] for hit in index.search("chromadb", "docs", "PN-4471-B warranty", 3)] == ["b"]
+    index.drop("chromadb", "docs")
+    assert index.search("chromadb", "docs", "warranty", 3) == []
+
+
+def test_reciprocal_rank_fusion(llamaindex):
+    result = lambda i: llamaindex.SearchResult(id=i, content=i, score=0.0, metadata={})
+    dense = [("x", result("x")), ("y", result("y"))]
+    sparse = [("y", result("y")), ("z", result("z"))]
+    fused = llamaindex.reciprocal_rank_fusion([(1.0, dense), (1.0, sparse)], rrf_k=60, top_k=3)
+    assert [r.id for r in fused] == ["y", "x", "z"]
+    assert fused[0].score == pytest.approx(1 / 62 + 1 / 61)
+
+    weighted = llamaindex.reciprocal_rank_fusion([(1.0, dense), (0.0, sparse)], rrf_k=60, top_k=1)
+    assert [r.id for r in weighted] == ["x"]
+
+
+def test_hybrid_search_finds_exact_identifier(llamaindex, vector_index):
+    collection = vector_index()
+    documents = [{"id": f"filler-{i}", "content": f"general warranty information sheet {i}"} for i in range(6)]
+    documents.append({"id": "exact", "content": "replacement part PN-4471-B"})
+    with TestClient(llamaindex.app) as client:
+        assert client.post("/ingest", json={"documents": documents, "collection": collection}).status_code == 200
+        body = client.post("/search", json={
+            "query": "PN-4471-B warranty", "collection": collection, "mode": "hybrid", "top_k": 3
+        }).json()
+    assert "exact" in [r["id"] for r in body["results"]]
+    assert body["mode"] == "hybrid"
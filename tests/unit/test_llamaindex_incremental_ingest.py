@@ -0,0 +1,63 @@
+"""Incremental re-ingestion: the manifest and change detection per store."""
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(llamaindex, vector_index):
+    with TestClient(llamaindex.app) as client:
+        yield client
+
+
+def ingest(client, collection, documents, **params):
+    response = client.post("/ingest", json={"documents": documents, "collection": collection, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_unchanged_documents_are_skipped(client, vector_index):
+    collection = vector_index()
+    docs = [{"id": "a", "content": "alpha policy text"}, {"id": "b", "content": "beta policy text"}]
+    assert ingest(client, collection, docs)["chunks_ingested"] == 2
+    again = ingest(client, collection, docs)
+    assert again["documents_skipped"] == 2
+    assert again["chunks_ingested"] == 0
+
+
+def test_changed_document_reembedded_and_sync_prunes(client, vector_index):
+    collection = vector_index()
+    ingest(client, collection, [{"id": "a", "content": "alpha"}, {"id": "b", "content": "beta"}])
+    changed = ingest(client, collection, [{"id": "a", "content": "alpha revised"}], sync=True)
+    assert changed["documents_updated"] == 1
+    assert changed["chunks_removed"] == 2
+    assert changed["documents_removed"] == 1
+    results = client.post("/search", json={"query": "beta", "collection": collection, "mode": "sparse"}).json()["results"]
+    assert results == []
+
+
+def test_manifest_keys_on_store(llamaindex, tmp_path):
+    manifest = llamaindex.IngestManifest(str(tmp_path / "manifest.db"))
+    manifest.put_document("chromadb", "hr", "docs", "a", "hash", {"c": "a:1"})
+    assert manifest.get_document("weaviate", "hr", "docs", "a") is None
+    manifest.put_document("weaviate", "hr", "docs", "a", "hash", {"c": "a:1"})
+    manifest.delete_namespace("chromadb", "hr", "docs")
+    assert manifest.document_ids("chromadb", "hr", "docs") == set()
+    assert manifest.document_ids("weaviate", "hr", "docs") == {"a"}
+
+
+def test_manifest_migrates_rows_without_store(llamaindex, tmp_path):
+    path = str(tmp_path / "manifest.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE documents (namespace TEXT, collection TEXT, doc_id TEXT, doc_hash TEXT, chunks TEXT, updated_at TEXT, "
+        "PRIMARY KEY (namespace, collection, doc_id))"
+    )
+    conn.execute("INSERT INTO documents VALUES ('hr', 'docs', 'a', 'hash', '{}', '2024-01-01')")
+    conn.commit()
+    conn.close()
+    manifest = llamaindex.IngestManifest(path)
+    assert manifest.get_document("chromadb", "hr", "docs", "a") == ("hash", {})
+    assert manifest.get_document("weaviate", "hr", "docs", "a") is None
@@ -0,0 +1,62 @@
+"""IndexRegistry: index handles are built once per (store, collection) and reused."""
+
+import pytest
+
+
+@pytest.fixture
+def built(llamaindex, vector_index, monkeypatch):
+    """Count vector-store wrappers built by the registry."""
+    calls = []
+    real = llamaindex.get_vector_store
+
+    def counting(store_type, collection):
+        calls.append((store_type, collection))
+        return real(store_type, collection)
+
+    monkeypatch.setattr(llamaindex, "get_vector_store", counting)
+    return calls
+
+
+def test_handles_built_once_and_reused(llamaindex, vector_index, built):
+    registry = llamaindex.IndexRegistry(8)
+    collection = vector_index()
+    index = registry.get_index("chromadb", collection)
+    assert registry.get_index("chromadb", collection) is index
+    assert registry.get_vector_store("chromadb", collection) is registry.get_vector_store("chromadb", collection)
+    assert built == [("chromadb", collection)]
+    assert registry.metrics()["misses"] == 1
+    assert registry.metrics()["hits"] == 3
+
+
+def test_retrievers_cached_per_top_k(llamaindex, vector_index, built):
+    registry = llamaindex.IndexRegistry(8)
+    collection = vector_index()
+    three = registry.get_retriever("chromadb", collection, 3)
+    assert registry.get_retriever("chromadb", collection, 3) is three
+    assert registry.get_retriever("chromadb", collection, 5) is not three
+    assert len(built) == 1
+
+
+def test_lru_eviction(llamaindex, vector_index, built):
+    registry = llamaindex.IndexRegistry(2)
+    first, second, third = vector_index(), vector_index(), vector_index()
+    registry.get_index("chromadb", first)
+    registry.get_index("chromadb", second)
+    registry.get_index("chromadb", first)
+    registry.get_index("chromadb", third)
+    assert registry.metrics()["evictions"] == 1
+    registry.get_index("chromadb", first)
+    registry.get_index("chromadb", second)
+    assert [c for _, c in built] == [first, second, third, second]
+
+
+def test_invalidate_by_collection(llamaindex, vector_index, built):
+    registry = llamaindex.IndexRegistry(8)
+    kept, dropped = vector_index(), vector_index()
+    registry.get_index("chromadb", kept)
+    registry.get_index("chromadb", dropped)
+    assert registry.invalidate(collection=dropped) == 1
+    registry.get_index("chromadb", kept)
+    registry.get_index("chromadb", dropped)
+    assert [c for _, c in built] == [kept, dropped, dropped]
+    assert registry.metrics()["invalidations"] == 1
@@ -0,0 +1,104 @@
+"""Bulk ingestion jobs: spooled uploads, batched embeddings and job status."""
+
+import asyncio
+import glob
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(llamaindex, vector_index):
+    with TestClient(llamaindex.app) as client:
+        yield client
+
+
+@pytest.fixture
+def batch_sizes(llamaindex, monkeypatch):
+    """Record the size of every embedding batch the pipeline schedules."""
+    sizes = []
+    real = llamaindex._iter_node_batches
+
+    def recording(*args, **kwargs):
+        for batch in real(*args, **kwargs):
+            sizes.append(len(batch))
+            yield batch
+
+    monkeypatch.setattr(llamaindex, "_iter_node_batches", recording)
+    return sizes
+
+
+def ndjson(records):
+    return "\n".join(json.dumps(record) for record in records).encode()
+
+
+def wait_for(client, job_id, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/ingest/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"ingest job {job_id} did not finish: {job}")
+
+
+def test_ndjson_job_embeds_in_batches(client, llamaindex, vector_index, batch_sizes, monkeypatch):
+    monkeypatch.setattr(llamaindex, "INGEST_EMBED_BATCH_SIZE", 2)
+    collection = vector_index()
+    records = [{"id": f"doc-{i}", "content": f"policy number {i} covers topic {i}"} for i in range(5)]
+    response = client.post(
+        f"/ingest/jobs?collection={collection}", content=ndjson(records),
+        headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 202
+    job = wait_for(client, response.json()["job_id"])
+    assert job["status"] == "completed", job["error"]
+    assert job["progress"]["documents_read"] == 5
+    assert job["progress"]["chunks_upserted"] == 5
+    assert batch_sizes == [2, 2, 1]
+    assert not glob.glob(os.path.join(llamaindex.INGEST_SPOOL_DIR, f"ingest-{job['job_id']}-*"))
+
+    hits = client.post("/search", json={"query": "policy number 3", "collection": collection, "top_k": 1}).json()
+    assert hits["results"][0]["id"] == "doc-3"
+
+
+def test_multipart_text_upload_is_segmented(client, llamaindex, vector_index, monkeypatch):
+    monkeypatch.setattr(llamaindex, "INGEST_TEXT_SEGMENT_CHARS", 40)
+    collection = vector_index()
+    text = b"The handbook describes leave. " * 4
+    response = client.post(
+        f"/ingest/jobs?collection={collection}&namespace=hr",
+        files={"file": ("handbook.txt", text, "text/plain")}
+    )
+    job = wait_for(client, response.json()["job_id"])
+    assert job["status"] == "completed", job["error"]
+    assert job["files"] == ["handbook.txt"]
+    assert job["progress"]["documents_read"] == 3
+
+
+def test_malformed_record_fails_job(client, vector_index):
+    response = client.post(f"/ingest/jobs?collection={vector_index()}", content=b'{"id": "a", "content": "ok"}\nnot json\n')
+    job = wait_for(client, response.json()["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"]
+
+
+def test_cancelled_batch_fails_instead_of_cancelling_the_job(llamaindex):
+    async def main():
+        task = asyncio.create_task(asyncio.sleep(10))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.wait([task])
+        with pytest.raises(RuntimeError, match="cancelled"):
+            llamaindex._raise_if_batch_failed(task)
+
+    asyncio.run(main())
+
+
+def test_empty_upload_and_bad_namespace_rejected(client, vector_index):
+    assert client.post("/ingest/jobs", files={"note": (None, "x")}).status_code == 400
+    assert client.post("/ingest/jobs?namespace=bad/name", content=b"").status_code == 400
+    assert client.get("/ingest/jobs/missing").status_code == 404
@@ -0,0 +1,117 @@
+"""Namespace partitions: naming, isolation and deletion."""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(llamaindex, vector_index):
+    with TestClient(llamaindex.app) as client:
+        yield client
+
+
+def test_partition_names(llamaindex):
+    name = llamaindex.partition_name
+    assert name("chromadb", "docs", "default") == "docs"
+    assert name("chromadb", "docs", "acme") == "docs--acme"
+    assert name("weaviate", "docs", "acme") == "docs__acme"
+    assert name("weaviate", "docs", "a_b") == "docs__a_ub"
+    assert name("weaviate", "docs", "a-b") == "docs__a_hb"
+
+
+@pytest.mark.parametrize("namespace", ["Acme", "ACME", "a--b", "a__b", "-a", "a/b", "", "x" * 64])
+def test_invalid_namespaces_rejected(llamaindex, namespace):
+    with pytest.raises(HTTPException) as error:
+        llamaindex.partition_name("weaviate", "docs", namespace)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("store, collection", [("chromadb", "docs--a"), ("weaviate", "docs__a")])
+def test_collection_with_separator_rejected(llamaindex, store, collection):
+    with pytest.raises(HTTPException) as error:
+        llamaindex.partition_name(store, collection, "default")
+    assert error.value.status_code == 400
+
+
+def test_weaviate_class_names_do_not_collide(llamaindex):
+    namespaces = ["acme", "acme-1", "acme_1", "acme1", "a-b-c", "a_b-c", "a-b_c", "a_b_c", "a-u", "a_h"]
+    classes = {llamaindex.partition_name("weaviate", "docs", ns).title() for ns in namespaces}
+    assert len(classes) == len(namespaces)
+    name = llamaindex.partition_name
+    assert name("weaviate", "documents_a", "b").title() != name("weaviate", "documents", "a_b").title()
+
+
+def test_weaviate_partitions_listed_exactly(llamaindex, monkeypatch):
+    classes = ["Documents", "Documents__Acme", "Documents__A_Ub", "Documents__A_Hb", "Documents_A__B",
+               "Documents_Archive", "Documents__Bad_X", "Documentsx__Acme"]
+
+    client = SimpleNamespace(schema=SimpleNamespace(get=lambda: {"classes": [{"class": name} for name in classes]}))
+    monkeypatch.setitem(llamaindex.VECTOR_STORES, "weaviate", SimpleNamespace(get=lambda: client))
+    listed = llamaindex.list_partitions("weaviate", "documents")
+    assert listed == [
+        {"namespace": "default", "partition": "Documents"},
+        {"namespace": "acme", "partition": "Documents__Acme"},
+        {"namespace": "a_b", "partition": "Documents__A_Ub"},
+        {"namespace": "a-b", "partition": "Documents__A_Hb"},
+    ]
+    assert [p["namespace"] for p in llamaindex.list_partitions("weaviate", "documents_a")] == ["b"]
+
+
+def test_namespaces_are_isolated(client, llamaindex, vector_index):
+    collection = vector_index()
+    # Not a partition of collection: its prefix is another (unreachable) collection name
+    llamaindex.VECTOR_STORES["chromadb"].get().get_or_create_collection(f"{collection}--acme--old")
+    for namespace, text in (("acme", "acme pays invoices in thirty days"), ("globex", "globex pays invoices in sixty days")):
+        response = client.post("/ingest", json={
+            "documents": [{"id": f"{namespace}-terms", "content": text}], "collection": collection, "namespace": namespace
+        })
+        assert response.status_code == 200, response.text
+    for mode in ("vector", "sparse", "hybrid"):
+        results = client.post("/search", json={
+            "query": "invoices", "collection": collection, "namespace": "acme", "mode": mode
+        }).json()["results"]
+        assert [r["id"] for r in results] == ["acme-terms"]
+
+    listed = client.get(f"/namespaces?collection={collection}").json()["namespaces"]
+    assert {p["namespace"] for p in listed} == {"acme", "globex"}
+
+    assert client.delete(f"/namespaces/acme?collection={collection}").status_code == 200
+    assert client.delete(f"/namespaces/acme?collection={collection}").status_code == 404
+    remaining = client.post("/search", json={"query": "invoices", "collection": collection, "namespace": "globex"}).json()
+    assert [r["id"] for r in remaining["results"]] == ["globex-terms"]
+
+
+def test_mixed_case_namespace_rejected_by_api(client):
+    assert client.post("/search", json={"query": "q", "namespace": "Acme"}).status_code == 400
+
+
+def test_legacy_chunks_migrate_into_their_partitions(client, llamaindex, vector_index):
+    from llama_index.core import Settings
+    from llama_index.core.schema import TextNode
+
+    collection = vector_index()
+    legacy = [("old-acme", "acme", "acme pays invoices in thirty days"),
+              ("old-default", "default", "everyone pays invoices eventually"),
+              ("old-bad", "Not Valid", "invoices from an unnamed tenant")]
+    nodes = [TextNode(id_=node_id, text=text, metadata={"namespace": namespace},
+                      embedding=Settings.embed_model.get_text_embedding(text))
+             for node_id, namespace, text in legacy]
+    llamaindex.get_vector_store("chromadb", collection).add(nodes)
+
+    def search(namespace, mode="vector"):
+        response = client.post("/search", json={
+            "query": "invoices", "collection": collection, "namespace": namespace, "mode": mode
+        })
+        return [r["id"] for r in response.json()["results"]]
+
+    assert search("acme") == []
+    migrated = client.post(f"/namespaces/migrate?collection={collection}").json()
+    assert migrated["moved"] == {"acme": 1} and migrated["skipped"] == {"Not Valid": 1}
+    assert search("acme") == ["old-acme"] and search("acme", mode="sparse") == ["old-acme"]
+    assert set(search("default")) == {"old-default", "old-bad"}
+
+    again = client.post(f"/namespaces/migrate?collection={collection}").json()
+    assert again["moved"] == {} and again["skipped"] == {"Not Valid": 1}
@@ -0,0 +1,55 @@
+"""/search: retrieval only, no LLM or query engine on the request path."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(llamaindex, vector_index, monkeypatch):
+    def no_query_engine(*args, **kwargs):
+        raise AssertionError("/search must not build a query engine")
+
+    monkeypatch.setattr(llamaindex.index_registry, "get_query_engine", no_query_engine)
+    with TestClient(llamaindex.app) as client:
+        yield client
+
+
+def ingest(client, collection, documents, **params):
+    response = client.post("/ingest", json={"documents": documents, "collection": collection, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+DOCUMENTS = [
+    {"id": "vacation", "content": "Employees receive twenty five vacation days per year."},
+    {"id": "payroll", "content": "Payroll runs monthly on the last friday."},
+    {"id": "travel", "content": "Travel must be booked through the approved agency."},
+]
+
+
+def test_search_returns_ranked_chunks_without_llm(client, vector_index):
+    collection = vector_index()
+    ingest(client, collection, DOCUMENTS)
+    response = client.post("/search", json={"query": "how many vacation days", "collection": collection, "top_k": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["store"] == "chromadb"
+    assert [r["id"] for r in body["results"]][0] == "vacation"
+    assert len(body["results"]) == 2
+    assert "answer" not in body
+
+
+def test_search_reuses_retriever(client, llamaindex, vector_index):
+    collection = vector_index()
+    ingest(client, collection, DOCUMENTS)
+    before = llamaindex.index_registry.metrics()
+    for _ in range(3):
+        client.post("/search", json={"query": "payroll", "collection": collection})
+    after = llamaindex.index_registry.metrics()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 2
+
+
+def test_unknown_mode_and_store_rejected(client):
+    assert client.post("/search", json={"query": "q", "mode": "fuzzy"}).status_code == 400
+    assert client.post("/search", json={"query": "q", "store": "pinecone"}).status_code == 400
@@ -0,0 +1,82 @@
+"""LazyStoreClient: connect once, off the event loop, and fail fast on a dead store."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+
+def test_concurrent_aget_connects_once_in_a_worker_thread(llamaindex):
+    threads = []
+
+    def connect():
+        threads.append(threading.get_ident())
+        time.sleep(0.2)
+        return object()
+
+    client = llamaindex.LazyStoreClient("chromadb", connect, "chroma")
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(client.aget() for _ in range(5)))
+        tick.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
+    assert all(result is results[0] for result in results)
+    assert ticks >= 5  # the loop kept running while the store connected
+    assert client.status()["status"] == "ready"
+    assert client.status()["init_ms"] >= 200
+
+
+def test_failed_connect_is_remembered(llamaindex, monkeypatch):
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        raise ConnectionError("refused")
+
+    client = llamaindex.LazyStoreClient("weaviate", connect, "weaviate")
+    for _ in range(3):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(client.aget())
+        assert error.value.status_code == 503
+    assert len(attempts) == 1
+    assert client.status()["status"] == "unavailable"
+    assert client.status()["error"] == "refused"
+
+    monkeypatch.setattr(llamaindex, "VECTOR_STORE_RETRY_INTERVAL", 0)
+    with pytest.raises(HTTPException):
+        client.get()
+    assert len(attempts) == 2
+
+
+def test_ready_reports_required_stores(llamaindex, monkeypatch):
+    def down():
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(llamaindex, "VECTOR_STORES", {
+        "chromadb": llamaindex.LazyStoreClient("chromadb", object, "chroma"),
+        "weaviate": llamaindex.LazyStoreClient("weaviate", down, "weaviate"),
+    })
+    monkeypatch.setattr(llamaindex, "REQUIRED_VECTOR_STORES", ["chromadb"])
+    with TestClient(llamaindex.app) as client:
+        assert client.get("/ready").status_code == 503
+        response = client.get("/ready?connect=true")
+    assert response.status_code == 200
+    stores = response.json()["vector_stores"]
+    assert stores["chromadb"]["status"] == "ready"
+    assert stores["weaviate"]["status"] == "unavailable"
+    assert stores["weaviate"]["required"] is False
@@ -0,0 +1,168 @@
+"""Admission control: rate and concurrency limits, priorities, shedding and bounded tenant state."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def controller(orchestration, rps=100.0, concurrency=1, max_in_flight=4, slo_ms=None, max_tenants=100):
+    return orchestration.AdmissionController(
+        rps, concurrency, max_in_flight, 0.5, slo_ms or {"interactive": 1000, "batch": 1000}, max_tenants
+    )
+
+
+def test_rate_limit_rejects_with_retry_after(orchestration):
+    admission = controller(orchestration, rps=0.5, concurrency=10)  # burst = 1 token
+
+    async def main():
+        await admission.acquire("acme", "interactive")
+        with pytest.raises(orchestration.AdmissionRejected) as error:
+            await admission.acquire("acme", "interactive")
+        return error.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == "rate_limited" and rejected.retry_after == 2
+    assert admission.metrics()["tenants"]["acme"]["rejected_rate"] == 1
+
+
+def test_queued_requests_granted_interactive_first(orchestration):
+    admission = controller(orchestration, concurrency=10, max_in_flight=1)
+    order = []
+
+    async def request(tenant, priority):
+        await admission.acquire(tenant, priority)
+        order.append(priority)
+
+    async def main():
+        await admission.acquire("acme", "interactive")
+        waiting = [asyncio.create_task(request("acme", "batch")), asyncio.create_task(request("beta", "interactive"))]
+        await asyncio.sleep(0.01)
+        assert admission.metrics()["queued"] == {"interactive": 1, "batch": 1}
+        admission.release("acme", "interactive", 10.0)
+        await asyncio.sleep(0.01)
+        admission.release("beta", "interactive", 10.0)
+        await asyncio.gather(*waiting)
+
+    asyncio.run(main())
+    assert order == ["interactive", "batch"]
+
+
+def test_tenant_concurrency_limit(orchestration):
+    admission = controller(orchestration, concurrency=1)
+    admission.set_limits("big", 100.0, 2)
+
+    async def main():
+        await admission.acquire("big", "interactive")
+        await admission.acquire("big", "interactive")
+        await admission.acquire("small", "interactive")
+        return admission._can_run("big", "interactive"), admission._can_run("small", "interactive")
+
+    assert asyncio.run(main()) == (False, False)
+
+
+def test_queue_over_slo_is_shed(orchestration):
+    admission = controller(orchestration, concurrency=1, slo_ms={"interactive": 100, "batch": 100})
+
+    async def main():
+        await admission.acquire("acme", "interactive")
+        with pytest.raises(orchestration.AdmissionRejected) as error:
+            await admission.acquire("acme", "interactive")  # predicted wait is ~750ms of the mean duration
+        return error.value
+
+    assert asyncio.run(main()).reason == "queue_over_slo"
+    assert admission.metrics()["tenants"]["acme"]["rejected_slo"] == 1
+
+
+def test_idle_tenants_are_evicted_but_busy_ones_kept(orchestration):
+    admission = controller(orchestration, concurrency=10, max_in_flight=100, max_tenants=3)
+    admission.set_limits("acme", 5.0, 2)
+
+    async def main():
+        await admission.acquire("busy", "interactive")
+        for n in range(20):
+            await admission.acquire(f"tenant-{n}", "interactive")
+            admission.release(f"tenant-{n}", "interactive")
+
+    asyncio.run(main())
+    metrics = admission.metrics()
+    assert metrics["tracked_tenants"] == 3 and metrics["evicted_tenants"] == 18
+    assert "busy" in metrics["tenants"] and metrics["tenants"]["busy"]["in_flight"] == 1
+    admission.release("busy", "interactive")
+    assert admission.limits("acme")["concurrency"] == 2  # explicit limits survive eviction
+
+
+@pytest.fixture
+def gated(orchestration, monkeypatch):
+    """Admit /api/monitoring/admission through a controller that allows one request per tenant every 2s."""
+    admission = controller(orchestration, rps=0.5, concurrency=10)
+    monkeypatch.setattr(orchestration, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(orchestration, "ADMISSION_PATHS", ["/api/monitoring/admission"])
+    monkeypatch.setattr(orchestration, "admission", admission)
+    return admission
+
+
+def test_tenants_are_rate_limited_independently(orchestration, gated):
+    def get(tenant=None):
+        headers = {"X-Tenant-Id": tenant} if tenant else {}
+        return client.get("/api/monitoring/admission", headers=headers).status_code
+
+    with TestClient(orchestration.app) as client:
+        assert [get("acme"), get("acme")] == [200, 429]
+        assert get("beta") == 200  # acme's empty bucket does not affect beta
+        assert [get(), get("  ")] == [200, 429]  # no header: the shared default bucket
+    tenants = gated.metrics()["tenants"]
+    assert set(tenants) == {"acme", "beta", "default"}
+    assert tenants["acme"]["rejected_rate"] == 1 and tenants["beta"]["rejected_rate"] == 0
+
+
+def test_admin_limits_apply_to_the_header_tenant(orchestration, gated):
+    gated.set_limits("streamlit-user", 100.0, 10)
+    with TestClient(orchestration.app) as client:
+        statuses = [
+            client.get("/api/monitoring/admission", headers={"X-Tenant-Id": "streamlit-user"}).status_code
+            for _ in range(3)
+        ]
+    assert statuses == [200, 200, 200]
+    assert gated.metrics()["tenants"]["streamlit-user"]["admitted"] == 3
+
+
+def spec_request(requirements):
+    return {"domain": "legal", "subdomain": "contracts", "requirements": requirements,
+            "tenant_id": "acme", "user_id": "u1"}
+
+
+def test_spec_builder_proposes_limits_without_applying(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "ADMISSION_ENABLED", False)
+    admission = controller(orchestration)
+    monkeypatch.setattr(orchestration, "admission", admission)
+    with TestClient(orchestration.app) as client:
+        response = client.post("/api/spec-builder/process", json=spec_request({"throughput": 500, "concurrency": 50}))
+        assert response.status_code == 200, response.text
+        assert response.json()["specification"]["admission"] == {
+            "proposed": {"rps": 500.0, "concurrency": 50}, "applied": False
+        }
+        assert admission.limits("acme")["rps"] == 100.0
+
+        bad = client.post("/api/spec-builder/process", json=spec_request({"throughput": "lots", "concurrency": 5}))
+        assert bad.status_code == 400
+        negative = client.post("/api/spec-builder/process", json=spec_request({"throughput": -1, "concurrency": 5}))
+        assert negative.status_code == 400
+
+
+def test_admin_endpoint_validates_and_applies(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "ADMISSION_ENABLED", False)
+    admission = controller(orchestration)
+    monkeypatch.setattr(orchestration, "admission", admission)
+    with TestClient(orchestration.app) as client:
+        response = client.put("/api/admin/tenants/acme/admission", json={"rps": 5, "concurrency": 2})
+        assert response.status_code == 200
+        assert response.json()["limits"] == {"rps": 5.0, "concurrency": 2, "burst": 10.0}
+        assert client.put("/api/admin/tenants/acme/admission", json={"rps": 0, "concurrency": 2}).status_code == 400
+
+        async def plain_user():
+            return {"user_id": "u1", "tenant_id": "acme", "role": "user"}
+
+        monkeypatch.setitem(orchestration.app.dependency_overrides, orchestration.get_current_user, plain_user)
+        assert client.put("/api/admin/tenants/acme/admission", json={"rps": 500, "concurrency": 50}).status_code == 403
+    assert admission.limits("acme")["rps"] == 5.0
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+import uuid
+
+
+class RejectedRow(Exception):
+    code = "22P02"  # invalid_text_representation
+
+
+def make_writer(orchestration, tmp_path, monkeypatch, insert, max_retries=3):
+    monkeypatch.setattr(orchestration, "supabase", object())
+    writer = orchestration.AuditLogWriter(
+        1000, 100, 0.05, max_retries, str(tmp_path / "spill.jsonl"), str(tmp_path / "rejected.jsonl")
+    )
+    writer._insert = insert
+    return writer
+
+
+def test_rejected_row_is_quarantined_and_the_rest_written(orchestration, tmp_path, monkeypatch):
+    written = []
+
+    def insert(rows):
+        if any(row["action"] == "bad" for row in rows):
+            raise RejectedRow("invalid input syntax for type uuid")
+        written.extend(rows)
+
+    writer = make_writer(orchestration, tmp_path, monkeypatch, insert)
+    rows = [{"action": "bad" if i == 5 else "GET", "resource_type": "api"} for i in range(8)]
+    asyncio.run(writer._flush(rows))
+
+    assert len(written) == 7
+    assert writer._stats["quarantined"] == 1
+    assert writer._stats["spilled"] == 0
+    assert not (tmp_path / "spill.jsonl").exists()
+    assert json.loads((tmp_path / "rejected.jsonl").read_text())["action"] == "bad"
+
+
+def test_transient_failure_is_spilled_for_replay(orchestration, tmp_path, monkeypatch):
+    def insert(rows):
+        raise ConnectionError("supabase unreachable")
+
+    writer = make_writer(orchestration, tmp_path, monkeypatch, insert, max_retries=1)
+    asyncio.run(writer._flush([{"action": "GET", "resource_type": "api"}]))
+
+    assert writer._stats["spilled"] == 1
+    assert writer._stats["quarantined"] == 0
+    assert (tmp_path / "spill.jsonl").read_text().count("\n") == 1
+
+
+def test_non_uuid_ids_are_moved_into_details(orchestration, tmp_path, monkeypatch):
+    writer = make_writer(orchestration, tmp_path, monkeypatch, lambda rows: None)
+    tenant = str(uuid.uuid4())
+
+    async def run():
+        writer.enqueue({"tenant_id": "default", "user_id": None, "action": "GET", "resource_type": "api", "details": {"path": "/"}})
+        writer.enqueue({"tenant_id": tenant, "action": "GET", "resource_type": "api"})
+        return [writer._queue.get_nowait(), writer._queue.get_nowait()]
+
+    first, second = asyncio.run(run())
+    assert first["tenant_id"] is None
+    assert first["details"] == {"path": "/", "tenant_id": "default"}
+    assert second["tenant_id"] == tenant
+
+
+def test_permanent_error_classification(orchestration):
+    assert orchestration.is_permanent_audit_error(RejectedRow())
+    assert not orchestration.is_permanent_audit_error(ConnectionError())
+
+
+class RecordingTable:
+    """Minimal supabase table whose execute() records the thread it ran on."""
+
+    def __init__(self, threads):
+        self.threads = threads
+
+    def insert(self, row):
+        return self
+
+    def execute(self):
+        self.threads.append(threading.get_ident())
+
+
+def test_request_path_inserts_run_off_the_event_loop(orchestration, monkeypatch):
+    threads = []
+    monkeypatch.setattr(orchestration, "supabase", type("Client", (), {"table": lambda self, name: RecordingTable(threads)})())
+    monkeypatch.setattr(orchestration, "audit_event", lambda *args: None)
+    user = {"user_id": "u1", "tenant_id": "t1", "role": "admin"}
+
+    async def run():
+        await orchestration.insert_compliance_result(orchestration.ComplianceResult(flag="pass", details={}), user)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and all(thread != loop_thread for thread in threads)
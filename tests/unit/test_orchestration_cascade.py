@@ -0,0 +1,88 @@
+"""Cascade policy per domain and its use by /api/rag/enhanced-query."""
+
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+
+def test_policy_per_domain(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "CASCADE_ENABLED", True)
+    support = orchestration.cascade_policy("customer_support", "llama3-70b")
+    assert support["min_retrieval_score"] == 0.25 and support["min_answer_chars"] == 40
+    assert orchestration.cascade_policy("legal", "llama3-70b") is None
+    assert orchestration.cascade_policy("legal", "llama3-70b", requested=True) is None
+    assert orchestration.cascade_policy("customer_support", "llama3-70b", requested=False) is None
+    assert orchestration.cascade_policy("customer_support", "mistral-7b") is None
+    monkeypatch.setattr(orchestration, "CASCADE_ENABLED", False)
+    assert orchestration.cascade_policy("customer_support", "llama3-70b") is None
+
+
+def test_weak_retrieval_goes_straight_to_large_model(orchestration):
+    policy = orchestration.cascade_policy("default", "llama3-70b")
+    fields, report = orchestration.cascade_generate_fields("default", "llama3-70b", policy, {"results": [{"score": 0.1}]})
+    assert fields == {}
+    assert report["reasons"] == ["low_retrieval"] and report["models_tried"] == ["llama3-70b"]
+
+    fields, report = orchestration.cascade_generate_fields("default", "llama3-70b", policy, {"results": [{"score": 0.8}]})
+    assert report is None
+    assert fields["cascade"]["small_model"] == "mistral-7b" and fields["cascade"]["large_model"] == "llama3-70b"
+    assert fields["cascade"]["label"] == "default"
+
+
+@pytest.fixture
+def rag(orchestration, downstream, monkeypatch):
+    routes, calls = downstream
+
+    async def domain_config(domain):
+        return {"namespace": domain, "system_prompt": "Answer from the context.", "model": "llama3-70b"}
+
+    monkeypatch.setattr(orchestration, "get_domain_config", domain_config)
+    monkeypatch.setattr(orchestration, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(orchestration, "CASCADE_ENABLED", True)
+    monkeypatch.setattr(orchestration, "cascade_metrics", orchestration.CascadeMetrics())
+
+    def generate(request):
+        body = json.loads(request.content)
+        cascade = body.get("cascade")
+        if cascade is None:
+            return httpx.Response(200, json={"text": "large", "model": body["model"]})
+        return httpx.Response(200, json={
+            "text": "small", "model": cascade["small_model"],
+            "cascade": {"models_tried": [cascade["small_model"]], "escalated": False, "reasons": []},
+        })
+
+    routes["/generate"] = generate
+    return routes, calls
+
+
+def query(orchestration, **fields):
+    with TestClient(orchestration.app) as client:
+        response = client.post("/api/rag/enhanced-query", json={"query": "refund window?", **fields})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_enhanced_query_cascades_and_reports(orchestration, rag):
+    routes, calls = rag
+    routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"content": "30 days", "score": 0.9}]})
+    body = query(orchestration, domain="customer_support")
+    assert body["model"] == "mistral-7b" and body["cascade"]["escalated"] is False
+
+    routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"content": "?", "score": 0.05}]})
+    body = query(orchestration, domain="customer_support")
+    assert body["model"] == "llama3-70b" and body["cascade"]["reasons"] == ["low_retrieval"]
+    assert "cascade" not in json.loads(calls[-1].content)
+
+    snapshot = orchestration.cascade_metrics.snapshot()
+    assert snapshot["domains"]["customer_support"]["escalation_rate"] == 0.5
+    assert snapshot["domains"]["customer_support"]["reasons"] == {"low_retrieval": 1}
+
+
+def test_request_can_opt_out(orchestration, rag):
+    routes, calls = rag
+    routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"content": "30 days", "score": 0.9}]})
+    body = query(orchestration, domain="customer_support", cascade=False)
+    assert body["model"] == "llama3-70b" and body["cascade"] is None
+    assert orchestration.cascade_metrics.snapshot()["requests"] == 0
@@ -0,0 +1,85 @@
+"""Context packing: token budgets, dedup, truncation and tokenizer loading."""
+
+import asyncio
+import logging
+
+import pytest
+
+
+def chunk(content, score):
+    return {"content": content, "score": score}
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+@pytest.fixture
+def counter(orchestration, word_tokenizer, monkeypatch):
+    monkeypatch.setitem(orchestration.MODEL_TOKENIZERS, "llama3-70b", word_tokenizer)
+    return orchestration.TokenCounterRegistry()._load("llama3-70b")
+
+
+def test_tokenizer_counts_and_truncates(counter):
+    assert counter.source.startswith("tokenizer:")
+    assert counter.count("one two three") == 3
+    assert counter.truncate("one two three four", 2) == "one two"
+
+
+def test_highest_scores_first_within_budget(orchestration, counter, monkeypatch):
+    monkeypatch.setattr(orchestration, "CONTEXT_MIN_CHUNK_TOKENS", 5)
+    results = [chunk(words(10, "low"), 0.1), chunk(words(10, "high"), 0.9), chunk(words(10, "mid"), 0.5)]
+    context, chosen, report = orchestration.pack_context(results, counter, budget=26)
+    assert [c["score"] for c in chosen] == [0.9, 0.5, 0.1]
+    assert context.startswith("high0") and context.endswith("low5")
+    assert report["context_tokens"] == 26
+    assert report["truncated"] == 1 and report["dropped_for_budget"] == 0
+
+
+def test_small_remainder_is_dropped_not_truncated(orchestration, counter, monkeypatch):
+    monkeypatch.setattr(orchestration, "CONTEXT_MIN_CHUNK_TOKENS", 8)
+    results = [chunk(words(10, "a"), 0.9), chunk(words(10, "b"), 0.5)]
+    _, chosen, report = orchestration.pack_context(results, counter, budget=15)
+    assert len(chosen) == 1
+    assert report["dropped_for_budget"] == 1
+
+
+def test_near_duplicate_chunks_dropped(orchestration, counter):
+    text = words(40)
+    results = [chunk(text, 0.9), chunk(text + " tail", 0.8), chunk(words(40, "other"), 0.7)]
+    _, chosen, report = orchestration.pack_context(results, counter, budget=1000)
+    assert len(chosen) == 2
+    assert report["duplicates_dropped"] == 1
+
+
+def test_missing_tokenizer_warns_and_estimates(orchestration, monkeypatch, caplog):
+    monkeypatch.setitem(orchestration.MODEL_TOKENIZERS, "llama3-70b", "meta-llama/Meta-Llama-3-70B-Instruct")
+    monkeypatch.setattr(orchestration.tokenizer_loading, "HF_TOKEN", None)
+
+    class Gated:
+        @staticmethod
+        def from_pretrained(*args):
+            raise RuntimeError("401 Unauthorized")
+
+    monkeypatch.setattr(orchestration.tokenizer_loading, "Tokenizer", Gated, raising=False)
+    monkeypatch.setattr(orchestration.tokenizer_loading, "TOKENIZERS_AVAILABLE", True)
+    with caplog.at_level(logging.WARNING):
+        counter = asyncio.run(orchestration.TokenCounterRegistry().get("llama3-70b"))
+    assert counter.source == "estimate"
+    assert counter.count("x" * 9) == 3
+    assert "ESTIMATED" in caplog.text and "HF_TOKEN" in caplog.text
+
+
+def test_build_rag_context_reports_usage(orchestration, counter, monkeypatch):
+    registry = orchestration.TokenCounterRegistry()
+    registry._counters["llama3-70b"] = counter
+    monkeypatch.setattr(orchestration, "token_counters", registry)
+    request = orchestration.RAGRequest(query="what is the policy", context_token_budget=50)
+    fields, report = asyncio.run(orchestration.build_rag_context(
+        request, "llama3-70b", {"results": [chunk(words(10), 0.9)]}, "You are helpful."
+    ))
+    assert fields == {"system_prompt": "You are helpful.", "context": words(10), "prompt": "what is the policy"}
+    assert report["context_tokens"] == 10
+    assert report["system_tokens"] == 4
+    assert report["prompt_tokens"] == 4 + 10 + 4
+    assert report["budget_tokens"] == 50
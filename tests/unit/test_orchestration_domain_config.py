@@ -0,0 +1,64 @@
+import asyncio
+
+
+def make_cache(orchestration, monkeypatch, max_entries=3):
+    calls = []
+
+    def load(domain):
+        calls.append(domain)
+        return {"system_prompt": f"prompt for {domain}", "namespace": domain, "model": "llama3-70b"}, domain == "legal"
+
+    monkeypatch.setattr(orchestration, "_load_domain_config", load)
+    return orchestration.DomainConfigCache(300, 60, 3600, max_entries), calls
+
+
+def test_fresh_entries_are_served_from_memory(orchestration, monkeypatch):
+    cache, calls = make_cache(orchestration, monkeypatch)
+
+    async def run():
+        first = await cache.get("legal")
+        second = await cache.get("legal")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert calls == ["legal"]
+    assert cache.metrics()["hits"] == 1
+
+
+def test_concurrent_misses_share_one_fetch(orchestration, monkeypatch):
+    cache, calls = make_cache(orchestration, monkeypatch)
+
+    async def run():
+        await asyncio.gather(*(cache.get("finance") for _ in range(5)))
+
+    asyncio.run(run())
+    assert calls == ["finance"]
+
+
+def test_cache_is_bounded_lru(orchestration, monkeypatch):
+    cache, calls = make_cache(orchestration, monkeypatch, max_entries=3)
+
+    async def run():
+        await cache.get("legal")
+        for i in range(10):
+            await cache.get(f"random-{i}")
+            await cache.get("legal")  # stays most recently used
+
+    asyncio.run(run())
+    metrics = cache.metrics()
+    assert metrics["entries"] == 3
+    assert metrics["evictions"] == 8
+    assert calls.count("legal") == 1
+
+
+def test_invalidate_forces_a_refetch(orchestration, monkeypatch):
+    cache, calls = make_cache(orchestration, monkeypatch)
+
+    async def run():
+        await cache.get("legal")
+        assert cache.invalidate("legal") == 1
+        await cache.get("legal")
+
+    asyncio.run(run())
+    assert calls == ["legal", "legal"]
@@ -0,0 +1,112 @@
+"""Hedged calls: percentile delay, racing a duplicate, and the shared hedge budget."""
+
+import asyncio
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def hedging(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration.hedge_settings, "enabled", True)
+    monkeypatch.setattr(orchestration.hedge_settings, "min_samples", 10)
+    monkeypatch.setattr(orchestration.hedge_settings, "min_delay_ms", 10)
+    monkeypatch.setattr(orchestration.hedge_settings, "percentile", 90)
+
+
+def warmed(orchestration, budget=None, latency_ms=20.0):
+    hedger = orchestration.Hedger("test", budget or orchestration.HedgeBudget(0.05, 10), orchestration.hedge_settings)
+    for _ in range(10):
+        hedger._observe(latency_ms)
+    return hedger
+
+
+def answer(value, delay, cancelled=None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(value)
+            raise
+        return value
+    return call
+
+
+def test_delay_needs_samples_and_has_a_floor(orchestration, hedging):
+    hedger = orchestration.Hedger("test", orchestration.HedgeBudget(0.05, 10), orchestration.hedge_settings)
+    for latency in range(1, 10):
+        hedger._observe(float(latency))
+    assert hedger.delay_ms() is None
+    hedger._observe(100.0)
+    assert hedger.delay_ms() == 100.0  # p90 of 10 samples is the slowest one
+    assert warmed(orchestration, latency_ms=1.0).delay_ms() == 10  # min_delay_ms
+
+
+def test_slow_primary_loses_to_hedge_and_is_cancelled(orchestration, hedging):
+    hedger = warmed(orchestration)
+    hedger._observe(500.0)  # one past call this slow makes saved latency estimable
+    cancelled = []
+    result = asyncio.run(hedger.run(answer("primary", 1.0, cancelled), lambda: answer("hedge", 0.0)()))
+    assert result == "hedge" and cancelled == ["primary"]
+    metrics = hedger.metrics()
+    assert metrics["hedged"] == 1 and metrics["hedge_wins"] == 1
+    assert 400 < metrics["latency_saved_ms"] < 500
+
+
+def test_fast_primary_is_not_hedged(orchestration, hedging):
+    hedger = warmed(orchestration)
+    hedges = []
+    result = asyncio.run(hedger.run(answer("primary", 0.0), lambda: hedges.append(1)))
+    assert result == "primary" and hedges == [] and hedger.metrics()["hedged"] == 0
+
+
+def test_budget_limits_hedges(orchestration, hedging):
+    budget = orchestration.HedgeBudget(0.05, 1)
+    hedger = warmed(orchestration, budget)
+    asyncio.run(hedger.run(answer("primary", 0.1), lambda: answer("hedge", 0.0)()))
+    result = asyncio.run(hedger.run(answer("primary", 0.1), lambda: answer("hedge", 0.0)()))
+    assert result == "primary"
+    assert hedger.metrics()["hedged"] == 1 and hedger.metrics()["budget_exhausted"] == 1
+    assert budget.tokens == pytest.approx(0.05)  # the second call's deposit; 20 more calls earn a hedge
+
+
+def test_missing_hedge_target_refunds_budget(orchestration, hedging):
+    budget = orchestration.HedgeBudget(0.0, 1)
+    hedger = warmed(orchestration, budget)
+
+    def no_target():
+        raise LookupError("no other replica")
+
+    assert asyncio.run(hedger.run(answer("primary", 0.05), no_target)) == "primary"
+    assert budget.tokens == 1.0 and hedger.metrics()["no_hedge_target"] == 1
+
+
+def test_both_failing_raises_primary_error(orchestration, hedging):
+    hedger = warmed(orchestration)
+
+    async def primary():
+        await asyncio.sleep(0.05)
+        raise httpx.ReadTimeout("primary")
+
+    async def hedge():
+        raise httpx.ConnectError("hedge")
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(hedger.run(primary, lambda: hedge()))
+
+
+def test_search_hedges_to_hedge_pool(orchestration, hedging, downstream, monkeypatch):
+    routes, calls = downstream
+    monkeypatch.setattr(orchestration, "LLAMAINDEX_HEDGE_URL", "http://llamaindex-hedge:8000")
+    monkeypatch.setattr(orchestration, "search_hedger", warmed(orchestration))
+
+    async def search(request):
+        if request.url.host != "llamaindex-hedge":
+            await asyncio.sleep(1.0)
+        return httpx.Response(200, json={"results": [], "served_by": request.url.host})
+
+    routes["/search"] = search
+    response = asyncio.run(orchestration.search_llamaindex({"query": "q"}))
+    assert response.json()["served_by"] == "llamaindex-hedge"
+    assert len(calls) == 2
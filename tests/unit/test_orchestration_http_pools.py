@@ -0,0 +1,35 @@
+import asyncio
+
+import httpx
+
+
+def test_pool_config_reads_env_overrides(orchestration, monkeypatch):
+    monkeypatch.setenv("EXAMPLE_HTTP_TIMEOUT", "7")
+    monkeypatch.setenv("EXAMPLE_HTTP_MAX_CONNECTIONS", "3")
+    cfg = orchestration._pool_config("example", timeout=30.0, max_connections=100, max_keepalive=10)
+    assert cfg["timeout"] == 7.0
+    assert cfg["max_connections"] == 3
+    assert cfg["max_keepalive"] == 10
+
+
+def test_clients_are_reused_and_requests_counted(orchestration, monkeypatch):
+    async def fake_request(self, request):
+        return httpx.Response(200, json={"ok": True})
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", fake_request)
+    pool = orchestration.ServiceClientPool({"svc": orchestration._pool_config("svc", 5.0, 4, 2)})
+
+    async def run():
+        await pool.start()
+        client = pool.get("svc")
+        assert pool.get("svc") is client
+        await asyncio.gather(*(client.get("http://svc/health") for _ in range(3)))
+        metrics = pool.metrics()["svc"]
+        await pool.close()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert metrics["requests_total"] == 3
+    assert metrics["in_flight"] == 0
+    assert metrics["open"] is True
+    assert pool.metrics()["svc"]["open"] is False
@@ -0,0 +1,168 @@
+"""Job queue: idempotent submit, per-tenant limits, retries, crash recovery and n8n executions."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+USER = {"user_id": "demo", "tenant_id": "default", "role": "admin"}
+
+
+@pytest.fixture
+def queue(orchestration, tmp_path):
+    queue = orchestration.JobQueue(str(tmp_path / "jobs.db"), 1, 1, {"big": 2}, 3)
+
+    async def ok(payload, user):
+        return {"echo": payload}
+
+    queue.register("ok", ok)
+    return queue
+
+
+def submit(queue, payload, **kwargs):
+    return asyncio.run(queue.submit("ok", USER, payload, **kwargs))
+
+
+def test_idempotency_key_returns_original_job(queue):
+    first = submit(queue, {"n": 1}, idempotency_key="k1")
+    again = submit(queue, {"n": 1}, idempotency_key="k1")
+    assert first["created"] and not again["created"]
+    assert again["job_id"] == first["job_id"]
+    with pytest.raises(HTTPException) as error:
+        submit(queue, {"n": 2}, idempotency_key="k1")
+    assert error.value.status_code == 409
+    other_tenant = submit(queue, {"n": 1}, idempotency_key="k1", tenant_id="big")
+    assert other_tenant["created"]
+    with pytest.raises(ValueError):
+        asyncio.run(queue.submit("unknown", USER, {}))
+
+
+def test_claim_respects_tenant_concurrency(queue):
+    for n in range(3):
+        submit(queue, {"n": n}, tenant_id="default")
+        submit(queue, {"n": n}, tenant_id="big")
+    claimed = [queue._claim() for _ in range(5)]
+    tenants = [row["tenant_id"] for row in claimed if row is not None]
+    assert sorted(tenants) == ["big", "big", "default"]
+    assert claimed[-1] is None
+
+
+def test_failed_attempts_back_off_then_fail(orchestration, queue, monkeypatch):
+    monkeypatch.setattr(orchestration, "JOB_RETRY_BASE", 10.0)
+
+    async def broken(payload, user):
+        raise RuntimeError("upstream down")
+
+    queue.register("ok", broken)
+    job_id = submit(queue, {})["job_id"]
+    asyncio.run(queue._execute(queue._claim()))
+    job = asyncio.run(queue.get(job_id))
+    assert job["status"] == "queued" and job["attempts"] == 1 and job["error"] == "upstream down"
+    assert queue._claim() is None  # not due until the backoff has passed
+
+    for _ in range(2):
+        queue._connect().execute("UPDATE jobs SET next_run_at = 0 WHERE id = ?", (job_id,))
+        asyncio.run(queue._execute(queue._claim()))
+    job = asyncio.run(queue.get(job_id))
+    assert job["status"] == "failed" and job["attempts"] == 3
+    assert queue._stats["retried"] == 2 and queue._stats["failed"] == 1
+
+
+def test_permanent_error_is_not_retried(orchestration, queue):
+    async def rejected(payload, user):
+        raise orchestration.PermanentJobError("bad input")
+
+    queue.register("ok", rejected)
+    job_id = submit(queue, {})["job_id"]
+    asyncio.run(queue._execute(queue._claim()))
+    job = asyncio.run(queue.get(job_id))
+    assert job["status"] == "failed" and job["attempts"] == 1
+
+
+def test_running_jobs_requeued_after_crash(orchestration, queue, tmp_path):
+    job_id = submit(queue, {"n": 1})["job_id"]
+    assert queue._claim()["id"] == job_id
+    restarted = orchestration.JobQueue(str(tmp_path / "jobs.db"), 1, 1, {}, 3)
+    assert restarted._recover() == 1
+    assert asyncio.run(restarted.get(job_id))["status"] == "queued"
+
+
+def test_worker_runs_submitted_job(queue):
+    async def main():
+        await queue.start()
+        try:
+            job = await queue.submit("ok", USER, {"n": 1})
+            deadline = time.time() + 5
+            while (await queue.get(job["job_id"]))["status"] != "succeeded" and time.time() < deadline:
+                await asyncio.sleep(0.02)
+            return await queue.get(job["job_id"])
+        finally:
+            await queue.close()
+
+    job = asyncio.run(main())
+    assert job["status"] == "succeeded" and job["result"] == {"echo": {"n": 1}}
+
+
+@pytest.fixture
+def n8n(orchestration, downstream, monkeypatch):
+    """Route n8n's workflow lookup and executions; returns the executions handler slot and call log."""
+    monkeypatch.setattr(orchestration, "N8N_API_KEY", "key")
+    routes, calls = downstream
+    executions = {}
+    routes["/api/v1/workflows/wf1/executions"] = lambda request: executions["handler"](request)
+    routes["/api/v1/workflows/wf1"] = lambda request: httpx.Response(200, json={"id": "wf1"})
+    return executions, calls
+
+
+def run_n8n(orchestration):
+    return asyncio.run(orchestration.run_n8n_workflow_job({"workflow_id": "wf1", "inputs": {"a": 1}}, USER))
+
+
+def test_n8n_execution_succeeds(orchestration, n8n):
+    executions, calls = n8n
+    executions["handler"] = lambda request: httpx.Response(200, json={"executionId": "e1"})
+    assert run_n8n(orchestration) == {"execution_data": {"executionId": "e1"}}
+    assert calls[-1].headers["X-N8N-API-Key"] == "key"
+
+
+@pytest.mark.parametrize("failure", [
+    httpx.ReadTimeout("timed out"),
+    httpx.RemoteProtocolError("connection closed"),
+    httpx.Response(500, text="boom"),
+    httpx.Response(504, text="gateway timeout"),
+])
+def test_n8n_execution_with_unknown_outcome_is_not_retried(orchestration, n8n, failure):
+    def handler(request):
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    n8n[0]["handler"] = handler
+    with pytest.raises(orchestration.PermanentJobError):
+        run_n8n(orchestration)
+
+
+@pytest.mark.parametrize("failure, error", [
+    (httpx.ConnectError("refused"), httpx.ConnectError),
+    (httpx.ConnectTimeout("connect timed out"), httpx.ConnectTimeout),
+    (httpx.Response(503, text="busy"), httpx.HTTPStatusError),
+    (httpx.Response(429, text="slow down"), httpx.HTTPStatusError),
+])
+def test_n8n_execution_not_started_is_retryable(orchestration, n8n, failure, error):
+    def handler(request):
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    n8n[0]["handler"] = handler
+    with pytest.raises(error) as raised:
+        run_n8n(orchestration)
+    assert not isinstance(raised.value, orchestration.PermanentJobError)
+
+
+def test_n8n_missing_workflow_is_permanent(orchestration, downstream, monkeypatch):
+    monkeypatch.setattr(orchestration, "N8N_API_KEY", "key")
+    with pytest.raises(orchestration.PermanentJobError, match="not found"):
+        run_n8n(orchestration)
@@ -0,0 +1,125 @@
+"""Prompt chains: validation, concurrent DAG execution, retries, failures and caching."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+USER = {"user_id": "demo", "tenant_id": "default", "role": "admin"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "step_cache", orchestration.StepResultCache(60, 100))
+    monkeypatch.setattr(orchestration, "CHAIN_RETRY_BACKOFF", 0)
+
+
+def llm_step(step_id, prompt, **fields):
+    return {"id": step_id, "type": "llm", "prompt": prompt, **fields}
+
+
+def echo(delay=0.0):
+    """/generate handler that answers with its prompt."""
+    async def handler(request):
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"text": json.loads(request.content)["prompt"]})
+    return handler
+
+
+def run(orchestration, definition, inputs):
+    return asyncio.run(orchestration.execute_chain(orchestration.validate_chain(definition), inputs, USER))
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([], "unique ids"),
+    ([llm_step("a", "x"), llm_step("a", "y")], "unique ids"),
+    ([{"id": "a", "type": "shell"}], "unknown type"),
+    ([{"id": "a", "type": "llm"}], "needs a prompt"),
+    ([llm_step("a", "{x}", inputs={"x": "missing.text"})], "unknown step"),
+    ([llm_step("a", "{x}", inputs={"x": "b.text"}), llm_step("b", "{x}", inputs={"x": "a.text"})], "cycle"),
+])
+def test_invalid_chains_rejected(orchestration, steps, message):
+    with pytest.raises(ValueError, match=message):
+        orchestration.validate_chain({"name": "bad", "steps": steps})
+
+
+def test_independent_steps_run_concurrently(orchestration, downstream):
+    downstream[0]["/generate"] = echo(delay=0.2)
+    definition = {
+        "steps": [
+            llm_step("left", "L:{text}", inputs={"text": "input.text"}),
+            llm_step("right", "R:{text}", inputs={"text": "input.text"}),
+            llm_step("join", "{a}+{b}", inputs={"a": "left.text", "b": "right.text"}),
+        ],
+        "outputs": {"answer": "join.text"},
+    }
+    result = run(orchestration, definition, {"text": "hi"})
+    assert result["status"] == "success"
+    assert result["outputs"] == {"answer": "L:hi+R:hi"}
+    timing = result["timing"]
+    assert timing["total_ms"] < timing["sum_of_steps_ms"]
+    assert timing["critical_path_ms"] < timing["sum_of_steps_ms"]
+    starts = {record["step"]: record["started_ms"] for record in result["chain_results"]}
+    assert abs(starts["left"] - starts["right"]) < 50
+
+
+def test_failed_step_skips_dependents_after_retries(orchestration, downstream):
+    attempts = []
+
+    def flaky(request):
+        attempts.append(1)
+        return httpx.Response(503, json={"detail": "overloaded"})
+
+    downstream[0]["/generate"] = flaky
+    definition = {
+        "steps": [
+            llm_step("first", "{text}", inputs={"text": "input.text"}, retries=2),
+            llm_step("second", "{text}", inputs={"text": "first.text"}),
+        ],
+    }
+    result = run(orchestration, definition, {"text": "hi"})
+    assert result["status"] == "failed"
+    records = {record["step"]: record for record in result["chain_results"]}
+    assert records["first"]["status"] == "failed" and records["first"]["attempts"] == 3
+    assert records["second"]["status"] == "skipped"
+    assert len(attempts) == 3
+
+
+def test_step_timeout(orchestration, downstream):
+    downstream[0]["/generate"] = echo(delay=0.5)
+    definition = {"steps": [llm_step("slow", "{text}", inputs={"text": "input.text"}, timeout_s=0.05, retries=0)]}
+    result = run(orchestration, definition, {"text": "hi"})
+    assert result["chain_results"][0]["error"] == "Step timed out"
+
+
+def test_results_cached_by_inputs(orchestration, downstream):
+    routes, calls = downstream
+    routes["/generate"] = echo()
+    definition = {"steps": [
+        llm_step("cached", "{text}", inputs={"text": "input.text"}),
+        llm_step("uncached", "{text}!", inputs={"text": "input.text"}, cache=False),
+    ]}
+    run(orchestration, definition, {"text": "hi"})
+    second = run(orchestration, definition, {"text": "hi"})
+    assert [record["cached"] for record in second["chain_results"]] == [True, False]
+    run(orchestration, definition, {"text": "other"})
+    assert len(calls) == 5
+
+
+def test_stored_chain_via_endpoint(orchestration, downstream):
+    routes, _ = downstream
+    routes["/generate"] = echo()
+    routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"content": "policy text", "score": 0.9}]})
+    assert "rag_enhanced_qa" in orchestration.prompt_chains
+    with TestClient(orchestration.app) as client:
+        response = client.post("/api/prompt-chains/execute", json={
+            "chain_type": "rag_enhanced_qa", "inputs": {"query": "what is the policy"}
+        })
+        assert response.status_code == 200, response.text
+        assert "policy text" in response.json()["outputs"]["answer"]
+        missing = client.post("/api/prompt-chains/execute", json={"chain_type": "rag_enhanced_qa", "inputs": {}})
+        assert missing.status_code == 400
+        unknown = client.post("/api/prompt-chains/execute", json={"chain_type": "nope", "inputs": {}})
+        assert unknown.status_code == 400
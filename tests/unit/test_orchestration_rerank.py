@@ -0,0 +1,103 @@
+"""Reranker: backend selection, per-backend budgets and fallbacks."""
+
+import asyncio
+import json
+import logging
+
+import httpx
+import pytest
+
+RESULTS = [{"id": str(i), "content": f"passage {i}"} for i in range(4)]
+
+
+def llm_scores(scores, delay=0.0):
+    async def handler(request):
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"text": json.dumps(scores)})
+    return handler
+
+
+@pytest.fixture
+def llm_backend(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "RERANK_BACKEND", "auto")
+    monkeypatch.setattr(orchestration, "CROSS_ENCODER_AVAILABLE", False)
+    return orchestration.Reranker()
+
+
+def test_llm_scores_reorder_results(llm_backend, downstream):
+    routes, calls = downstream
+    routes["/generate"] = llm_scores([1, 9, 3, 7])
+    results, report = asyncio.run(llm_backend.rerank("q", RESULTS, top_k=3))
+    assert [r["id"] for r in results] == ["1", "3", "2"]
+    assert results[0]["rerank_score"] == 9.0 and results[0]["vector_rank"] == 1
+    assert report["backend"] == "llm" and report["reranked"] and report["scored"] == 4
+    assert json.loads(calls[0].content)["temperature"] == 0.0
+
+
+def test_llm_backend_defaults_to_llm_budget(orchestration, llm_backend, downstream, monkeypatch):
+    monkeypatch.setattr(orchestration, "RERANK_BUDGET_MS", 50)
+    monkeypatch.setattr(orchestration, "RERANK_LLM_BUDGET_MS", 2000)
+    downstream[0]["/generate"] = llm_scores([1, 9, 3, 7], delay=0.2)
+    results, report = asyncio.run(llm_backend.rerank("q", RESULTS))
+    assert report["budget_ms"] == 2000
+    assert report["reranked"]
+    assert llm_backend.metrics()["budget_ms"] == 2000
+
+
+def test_budget_exceeded_falls_back_and_logs(llm_backend, downstream, caplog):
+    downstream[0]["/generate"] = llm_scores([1, 9, 3, 7], delay=0.5)
+    with caplog.at_level(logging.WARNING):
+        results, report = asyncio.run(llm_backend.rerank("q", RESULTS, budget_ms=50))
+    assert [r["id"] for r in results] == ["0", "1", "2", "3"]
+    assert report == {**report, "reranked": False, "reason": "budget_exceeded"}
+    assert llm_backend.metrics()["fallbacks"] == 1
+    assert "Rerank skipped (budget_exceeded)" in caplog.text
+
+
+def test_partial_batches_keep_vector_order(orchestration, llm_backend, downstream, monkeypatch):
+    monkeypatch.setattr(orchestration, "RERANK_BATCH_SIZE", 2)
+
+    async def handler(request):
+        if "passage 0" in json.loads(request.content)["prompt"]:
+            return httpx.Response(200, json={"text": "[2, 8]"})
+        await asyncio.sleep(0.5)
+        return httpx.Response(200, json={"text": "[9, 9]"})
+
+    downstream[0]["/generate"] = handler
+    results, report = asyncio.run(llm_backend.rerank("q", RESULTS, budget_ms=150))
+    assert [r["id"] for r in results][:4] == ["1", "0", "2", "3"]
+    assert report["scored"] == 2 and report["reason"] == "budget_exceeded"
+    assert llm_backend.metrics()["partial"] == 1
+
+
+def test_malformed_llm_reply_is_an_error(llm_backend, downstream):
+    downstream[0]["/generate"] = lambda request: httpx.Response(200, json={"text": "[1, 2]"})
+    results, report = asyncio.run(llm_backend.rerank("q", RESULTS))
+    assert report["reason"] == "error: ValueError"
+    assert [r["id"] for r in results] == ["0", "1", "2", "3"]
+    assert llm_backend.metrics()["errors"] == 1
+
+
+def test_cross_encoder_backend(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "RERANK_BACKEND", "auto")
+    monkeypatch.setattr(orchestration, "CROSS_ENCODER_AVAILABLE", True)
+    reranker = orchestration.Reranker()
+
+    class Model:
+        def predict(self, pairs):
+            return [float(passage[-1]) for _, passage in pairs]
+
+    reranker._model = Model()
+    results, report = asyncio.run(reranker.rerank("q", RESULTS, top_k=2))
+    assert report["backend"] == "cross_encoder"
+    assert report["budget_ms"] == orchestration.RERANK_BUDGET_MS
+    assert [r["id"] for r in results] == ["3", "2"]
+
+
+def test_disabled_and_single_candidate(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "RERANK_BACKEND", "none")
+    results, report = asyncio.run(orchestration.Reranker().rerank("q", RESULTS, top_k=2))
+    assert report["reason"] == "disabled" and len(results) == 2
+    monkeypatch.setattr(orchestration, "RERANK_BACKEND", "llm")
+    _, report = asyncio.run(orchestration.Reranker().rerank("q", RESULTS[:1]))
+    assert report["reason"] == "too_few_candidates"
@@ -0,0 +1,157 @@
+"""ResponseCache: scoping, similarity guards and bounds."""
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def cache(orchestration):
+    def make(semantic=True, max_entries=100, max_bytes=1_000_000, disabled=()):
+        return orchestration.ResponseCache(60, max_entries, max_bytes, semantic, 0.85, disabled)
+    return make
+
+
+SCOPE = ("hr", "llama3-70b", 3, True, 2048, False)
+
+
+def test_exact_hit_ignores_case_and_punctuation(cache):
+    c = cache(semantic=False)
+    c.put(SCOPE, "How many vacation days do I get?", {"answer": "25"})
+    response, kind, similarity = c.get(SCOPE, "how many vacation days do i get")
+    assert response == {"answer": "25"}
+    assert (kind, similarity) == ("exact", 1.0)
+
+
+def test_semantic_matching_is_off_by_default(orchestration):
+    assert orchestration.RESPONSE_CACHE_SEMANTIC is False
+    assert orchestration.response_cache.semantic is False
+
+
+def test_near_duplicate_served_when_enabled(cache):
+    c = cache()
+    c.put(SCOPE, "how many vacation days do employees get per year", {"answer": "25"})
+    response, kind, similarity = c.get(SCOPE, "how many vacation days do employees get each year")
+    assert kind == "semantic"
+    assert response == {"answer": "25"}
+    assert similarity >= 0.85
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("how many vacation days carry over in 2023", "how many vacation days carry over in 2024"),
+    ("what is the status of order 12345", "what is the status of order 12346"),
+    ("can I carry over unused vacation days", "can I not carry over unused vacation days"),
+    ("is remote work allowed for contractors", "isn't remote work allowed for contractors"),
+])
+def test_near_duplicate_refused_when_numbers_or_negation_differ(cache, stored, asked):
+    c = cache()
+    c.put(SCOPE, stored, {"answer": "stored"})
+    response, kind, _ = c.get(SCOPE, asked)
+    assert (response, kind) == (None, "miss")
+    assert c.metrics()["guard_rejections"] == 1
+
+
+@pytest.mark.parametrize("position, value", [(4, 512), (5, True), (0, "legal_docs"), (1, "mistral-7b")])
+def test_scope_fields_separate_entries(cache, position, value):
+    c = cache()
+    c.put(SCOPE, "what is the parental leave policy", {"answer": "stored"})
+    other = SCOPE[:position] + (value,) + SCOPE[position + 1:]
+    assert c.get(other, "what is the parental leave policy")[1] == "miss"
+
+
+def test_scope_includes_budget_and_cascade(orchestration, monkeypatch):
+    monkeypatch.setattr(orchestration, "cascade_policy", lambda domain, model, requested: {} if requested is not False else None)
+    base = orchestration.RAGRequest(query="q", domain="hr")
+    assert orchestration.response_cache_scope(base, "llama3-70b")[4] == orchestration.CONTEXT_TOKEN_BUDGET
+    smaller = orchestration.RAGRequest(query="q", domain="hr", context_token_budget=256)
+    no_cascade = orchestration.RAGRequest(query="q", domain="hr", cascade=False)
+    scopes = {orchestration.response_cache_scope(r, "llama3-70b") for r in (base, smaller, no_cascade)}
+    assert len(scopes) == 3
+
+
+def test_only_overlapping_entries_are_scored(cache, monkeypatch, orchestration):
+    c = cache()
+    for i in range(50):
+        c.put(SCOPE, f"unrelated topic {chr(97 + i % 26)}{chr(97 + i // 26)} zebra", {"i": i})
+    c.put(SCOPE, "what is the parental leave policy for new parents", {"answer": "leave"})
+    scored = []
+    cosine = orchestration._cosine
+    monkeypatch.setattr(orchestration, "_cosine", lambda a, b: scored.append(1) or cosine(a, b))
+    assert c.get(SCOPE, "what is the parental leave policy for new parent")[1] == "semantic"
+    assert len(scored) <= c.max_candidates
+    assert c.get(("other",) + SCOPE[1:], "what is the parental leave policy for new parent")[1] == "miss"
+
+
+def test_lru_eviction_keeps_index_consistent(cache):
+    c = cache(max_entries=2)
+    c.put(SCOPE, "first question about benefits", {"n": 1})
+    c.put(SCOPE, "second question about payroll", {"n": 2})
+    c.get(SCOPE, "first question about benefits")
+    c.put(SCOPE, "third question about travel", {"n": 3})
+    assert c.get(SCOPE, "second question about payroll")[1] == "miss"
+    assert c.get(SCOPE, "first question about benefits")[1] == "exact"
+    assert c.metrics()["evictions"] == 1
+    assert c.invalidate("hr") == 2
+    assert c.metrics()["entries"] == 0
+    assert c._index == {}
+
+
+def test_oversized_response_not_stored(cache):
+    c = cache(max_bytes=50)
+    c.put(SCOPE, "question", {"answer": "x" * 100})
+    assert c.metrics()["entries"] == 0
+
+
+def test_disabled_domains(cache):
+    c = cache(disabled={"legal"})
+    assert not c.enabled_for("legal")
+    assert c.enabled_for("hr")
+
+
+@pytest.fixture
+def cached_endpoints(orchestration, downstream, monkeypatch):
+    routes, calls = downstream
+
+    async def domain_config(domain):
+        return {"namespace": domain, "system_prompt": "Answer from the context.", "model": "llama3-70b"}
+
+    monkeypatch.setattr(orchestration, "get_domain_config", domain_config)
+    monkeypatch.setattr(orchestration, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(orchestration, "response_cache", orchestration.ResponseCache(60, 100, 1_000_000, False, 0.9, set()))
+    return routes, calls
+
+
+def test_search_errors_are_not_cached(orchestration, cached_endpoints):
+    routes, calls = cached_endpoints
+    routes["/search"] = lambda request: httpx.Response(404, json={"detail": "Namespace not found"})
+    with TestClient(orchestration.app) as client:
+        body = {"query": "leave policy", "domain": "hr_policy", "use_llm": False}
+        assert client.post("/api/rag/enhanced-query", json=body).status_code == 500
+        routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"content": "20 days", "score": 0.9}]})
+        first = client.post("/api/rag/enhanced-query", json=body).json()
+        second = client.post("/api/rag/enhanced-query", json=body).json()
+    assert first["cache"] == "miss" and second["cache"] == "exact"
+    assert second["results"]["results"][0]["content"] == "20 days"
+    assert len([call for call in calls if call.url.path == "/search"]) == 2
+
+
+def test_streamed_answer_is_cached_in_the_non_stream_shape(orchestration, cached_endpoints, monkeypatch):
+    routes, _ = cached_endpoints
+    monkeypatch.setattr(orchestration, "cascade_policy", lambda domain, model, requested: {})
+    routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"content": "20 days", "score": 0.9}]})
+    routes["/generate"] = lambda request: httpx.Response(
+        200, text='event: token\ndata: {"text": "20 days"}\n\nevent: done\ndata: {}\n\n',
+        headers={"content-type": "text/event-stream"}
+    )
+    body = {"query": "leave policy", "domain": "hr_policy"}
+    with TestClient(orchestration.app) as client:
+        client.post("/api/rag/enhanced-query/stream", json=body)
+    request = orchestration.RAGRequest(**body)
+    cascaded = orchestration.response_cache.get(orchestration.response_cache_scope(request, "llama3-70b"), request.query)
+    assert cascaded[0] is None  # a cascaded answer is never served from a stream's entry
+    streamed, kind, _ = orchestration.response_cache.get(
+        orchestration.response_cache_scope(request, "llama3-70b", stream=True), request.query
+    )
+    assert kind == "exact"
+    assert streamed["model"] == "llama3-70b" and streamed["cascade"] is None
+    assert streamed["enhanced_answer"] == "20 days"
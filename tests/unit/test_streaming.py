@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+
+def sse(events):
+    return "".join(f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in events)
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_vllm_stream_is_relayed_over_the_shared_client(inference, monkeypatch):
+    body = "".join(
+        f"data: {json.dumps({'choices': [{'index': 0, 'text': token}]})}\n\n" for token in ("Hel", "lo")
+    ) + f"data: {json.dumps({'choices': [], 'usage': {'prompt_tokens': 3, 'completion_tokens': 2}})}\n\ndata: [DONE]\n\n"
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(inference, "_vllm_client", client)
+
+    async def run():
+        request = inference.GenerateRequest(prompt="hi", model="llama3-70b", tenant_id="t1")
+        return [event async for event in inference.stream_generation(request)]
+
+    events = parse_sse("".join(asyncio.run(run())))
+    assert [data["text"] for event, data in events if event == "token"] == ["Hel", "lo"]
+    done = events[-1][1]
+    assert events[-1][0] == "done"
+    assert done["prompt_tokens"] == 3 and done["token_source"] == "upstream"
+    assert requests[0]["stream"] is True
+    assert inference.vllm_client() is client
+
+
+def test_enhanced_query_stream_sends_sources_before_tokens(orchestration, downstream):
+    routes, _ = downstream
+    routes["/search"] = lambda request: httpx.Response(200, json={"results": [{"id": "a", "content": "Policy text.", "score": 0.9}]})
+    routes["/generate"] = lambda request: httpx.Response(
+        200,
+        text=sse([("token", {"text": "Yes"}), ("token", {"text": "."}), ("done", {"tokens_used": 5})]),
+        headers={"content-type": "text/event-stream"}
+    )
+
+    response = TestClient(orchestration.app).post(
+        "/api/rag/enhanced-query/stream",
+        json={"query": "Can I carry over leave?", "domain": "hr_policy", "use_cache": False, "cascade": False},
+        headers={"X-Tenant-Id": "stream-test"}
+    )
+    events = parse_sse(response.text)
+    names = [event for event, _ in events]
+
+    assert names[0] == "sources"
+    assert names.index("context") < names.index("token")
+    assert "".join(data["text"] for event, data in events if event == "token") == "Yes."
+    assert names[-1] == "done" and events[-1][1]["ttft_ms"] is not None